@@ -13,6 +13,9 @@ from modules.metadata import MetadataExtractor
 from modules.migrator import FileMigrator
 from modules.audio_analysis import AudioAnalyzer
 from modules.classifier import AudioClassifier
+from modules.fingerprint import AudioFingerprinter
+from modules.enrichment import MetadataEnricher
+from utils.pagination import encode_cursor, decode_cursor
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +28,8 @@ metadata_extractor = MetadataExtractor()
 file_migrator = FileMigrator()
 audio_analyzer = AudioAnalyzer()
 audio_classifier = AudioClassifier()
+audio_fingerprinter = AudioFingerprinter()
+metadata_enricher = MetadataEnricher()
 
 # Request/Response models
 class ScanRequest(BaseModel):
@@ -45,6 +50,8 @@ progress_data = {
     'scan': {'status': 'idle', 'progress': 0, 'total': 0, 'message': ''},
     'duplicates': {'status': 'idle', 'progress': 0, 'total': 0, 'message': ''},
     'metadata': {'status': 'idle', 'progress': 0, 'total': 0, 'message': ''},
+    'enrichment': {'status': 'idle', 'progress': 0, 'total': 0, 'message': ''},
+    'fingerprint': {'status': 'idle', 'progress': 0, 'total': 0, 'message': ''},
     'migrate': {'status': 'idle', 'progress': 0, 'total': 0, 'message': ''},
     'audio': {'status': 'idle', 'progress': 0, 'total': 0, 'message': ''},
     'classification': {'status': 'idle', 'progress': 0, 'total': 0, 'message': ''}
@@ -77,6 +84,8 @@ async def start_scan(request: ScanRequest, background_tasks: BackgroundTasks):
             logger.error(f"Scan error: {e}")
             progress_data['scan']['status'] = 'error'
             progress_data['scan']['error'] = str(e)
+        finally:
+            db_manager.trim_change_log()
     
     background_tasks.add_task(run_scan)
     return {"message": "Scan started", "path": request.path}
@@ -111,6 +120,26 @@ async def start_analysis(background_tasks: BackgroundTasks):
             progress_data['metadata']['result'] = metadata_result
             logger.info(f"Metadata extraction complete: {metadata_result.get('extracted', 0)} extracted, {metadata_result.get('failed', 0)} failed")
             
+            # Fill missing tags from MusicBrainz/AcoustID (optional, needs network)
+            if metadata_enricher.enabled:
+                logger.info("Enriching metadata from online databases...")
+                progress_data['enrichment']['status'] = 'running'
+                metadata_enricher.set_progress_callback(lambda d: update_progress('enrichment', d))
+                enrichment_result = metadata_enricher.enrich_library()
+                progress_data['enrichment']['status'] = 'completed'
+                progress_data['enrichment']['result'] = enrichment_result
+                logger.info(f"Enrichment complete: {enrichment_result.get('matched', 0)} files matched")
+            
+            # Fingerprint audio so re-encodes can be matched (optional, decodes audio)
+            if audio_fingerprinter.enabled:
+                logger.info("Fingerprinting audio for near-duplicate detection...")
+                progress_data['fingerprint']['status'] = 'running'
+                audio_fingerprinter.set_progress_callback(lambda d: update_progress('fingerprint', d))
+                fingerprint_result = audio_fingerprinter.fingerprint_library()
+                progress_data['fingerprint']['status'] = 'completed'
+                progress_data['fingerprint']['result'] = fingerprint_result
+                logger.info(f"Fingerprinting complete: {fingerprint_result.get('fingerprinted', 0)} fingerprinted")
+            
             # Find duplicates (now for ALL files)
             logger.info("Step 2/3: Finding duplicate files...")
             progress_data['duplicates']['status'] = 'running'
@@ -135,6 +164,8 @@ async def start_analysis(background_tasks: BackgroundTasks):
             logger.error(f"Analysis error: {e}")
             progress_data['metadata']['status'] = 'error'
             progress_data['metadata']['error'] = str(e)
+        finally:
+            db_manager.trim_change_log()
     
     background_tasks.add_task(run_analysis)
     return {"message": "Analysis started"}
@@ -144,27 +175,35 @@ async def get_analysis_status():
     """Get analysis status"""
     return {
         'metadata': progress_data['metadata'],
+        'enrichment': progress_data['enrichment'],
+        'fingerprint': progress_data['fingerprint'],
         'duplicates': progress_data['duplicates'],
         'classification': progress_data['classification']
     }
 
 # Duplicate management
 @router.get("/duplicates")
-async def get_duplicates(limit: int = 100):
-    """Get duplicate groups"""
+async def get_duplicates(limit: int = 100, cursor: Optional[str] = None, sort_by: str = 'reclaimable',
+                         format: Optional[str] = None, directory: Optional[str] = None):
+    """Get a page of duplicate groups, largest reclaimable space first"""
     try:
-        duplicates = duplicate_detector.get_duplicate_groups(limit)
-        return {"duplicates": duplicates, "count": len(duplicates)}
+        page = duplicate_detector.get_duplicate_groups(limit, cursor, sort_by, format, directory)
+        return {"duplicates": page['groups'], "count": len(page['groups']), "next_cursor": page['next_cursor']}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Classification endpoints
 @router.get("/classifications")
-async def get_classifications(file_type: Optional[str] = None, limit: int = 100):
-    """Get classified files"""
+async def get_classifications(file_type: Optional[str] = None, limit: int = 100, cursor: Optional[str] = None):
+    """Get a page of classified files in file id order"""
     try:
-        classifications = audio_classifier.get_classifications(file_type, limit)
-        return {"classifications": classifications, "count": len(classifications)}
+        page = audio_classifier.get_classifications(file_type, limit, cursor)
+        return {"classifications": page['classifications'], "count": len(page['classifications']),
+                "next_cursor": page['next_cursor']}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -212,6 +251,8 @@ async def start_migration(request: MigrateRequest, background_tasks: BackgroundT
             logger.error(f"Migration error: {e}")
             progress_data['migrate']['status'] = 'error'
             progress_data['migrate']['error'] = str(e)
+        finally:
+            db_manager.trim_change_log()
     
     background_tasks.add_task(run_migration)
     return {"message": "Migration started"}
@@ -251,6 +292,8 @@ async def start_audio_analysis(request: AnalyzeRequest, background_tasks: Backgr
             logger.error(f"Audio analysis error: {e}")
             progress_data['audio']['status'] = 'error'
             progress_data['audio']['error'] = str(e)
+        finally:
+            db_manager.trim_change_log()
     
     background_tasks.add_task(run_audio_analysis)
     return {"message": "Audio analysis started"}
@@ -281,50 +324,73 @@ async def get_statistics():
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/files")
-async def get_files(limit: int = 100, offset: int = 0, file_type: Optional[str] = None):
-    """Get list of indexed files with optional classification filter"""
+async def get_files(limit: int = 100, offset: int = 0, file_type: Optional[str] = None,
+                    cursor: Optional[str] = None):
+    """Get a page of indexed files in id order with optional classification filter"""
     try:
         from database.models import File, Metadata, Classification
+        from database.library_stats import read_library_stats
+        
+        after = decode_cursor(cursor)
+        if after is not None and len(after) != 1:
+            raise ValueError("Invalid cursor")
         
         with db_manager.get_session() as session:
-            query = session.query(File)
+            # The whole page with its classification and metadata in one joined query
+            query = session.query(
+                File.id, File.source_path, File.file_size, File.status,
+                Classification.file_type, Classification.confidence,
+                Metadata.file_id.label('metadata_id'), Metadata.artist, Metadata.title, Metadata.album
+            ).outerjoin(
+                Classification, Classification.file_id == File.id
+            ).outerjoin(
+                Metadata, Metadata.file_id == File.id
+            )
             
-            # Apply classification filter if specified
+            # Apply classification filter if specified; the page then follows
+            # ix_classifications_type_file instead of the files table
+            page_id = File.id
             if file_type and file_type in ['song', 'sample', 'stem', 'unknown']:
-                query = query.join(Classification).filter(Classification.file_type == file_type)
+                query = query.filter(Classification.file_type == file_type)
+                page_id = Classification.file_id
             
-            files = query.limit(limit).offset(offset).all()
+            # Keyset on id; offset is still honoured for the first request
+            if after:
+                query = query.filter(page_id > after[0])
+            query = query.order_by(page_id).limit(limit)
+            if not after and offset:
+                query = query.offset(offset)
+            rows = query.all()
             
-            file_list = []
-            for file in files:
-                metadata = session.query(Metadata).filter_by(file_id=file.id).first()
-                classification = session.query(Classification).filter_by(file_id=file.id).first()
-                
-                file_list.append({
-                    'id': file.id,
-                    'path': file.source_path,
-                    'size': file.file_size,
-                    'status': file.status,
-                    'classification': {
-                        'type': classification.file_type if classification else 'unclassified',
-                        'confidence': classification.confidence if classification else 0
-                    },
-                    'metadata': {
-                        'artist': metadata.artist if metadata else None,
-                        'title': metadata.title if metadata else None,
-                        'album': metadata.album if metadata else None
-                    } if metadata else None
-                })
+            file_list = [{
+                'id': row.id,
+                'path': row.source_path,
+                'size': row.file_size,
+                'status': row.status,
+                'classification': {
+                    'type': row.file_type or 'unclassified',
+                    'confidence': row.confidence or 0
+                },
+                'metadata': {
+                    'artist': row.artist,
+                    'title': row.title,
+                    'album': row.album
+                } if row.metadata_id is not None else None
+            } for row in rows]
             
-            total = session.query(File).count()
+            # Trigger-maintained counter instead of counting the files table
+            total = read_library_stats(session).get('files', 0)
             
             return {
                 'files': file_list,
                 'total': total,
                 'limit': limit,
-                'offset': offset
+                'offset': offset,
+                'next_cursor': encode_cursor([rows[-1].id]) if len(rows) == limit else None
             }
     
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
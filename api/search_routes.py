@@ -1,19 +1,78 @@
 """Enhanced search and filter API routes for browsing the music library"""
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, List, Optional
-from sqlalchemy import func, or_, and_, distinct
-from sqlalchemy.orm import joinedload
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import Integer, cast, func, literal, or_, and_, select, tuple_, union_all
+from sqlalchemy.orm import joinedload, aliased
+from collections import OrderedDict
+from datetime import datetime
+import asyncio
+import base64
+import hashlib
+import json
 import logging
-from pathlib import Path
+import threading
 
 from database.db import db_manager
-from database.models import File, Metadata, Duplicate, AudioAnalysis, Migration
+from database.models import File, Metadata, Duplicate, AudioAnalysis, Migration, Directory, joined_path
+from database.directory_tree import TREE_COLUMNS
+from database.library_export import EXPORT_FORMATS, PYARROW_AVAILABLE, export_batches
+from database.library_stats import read_library_stats, read_top_artists
+from database.read_model import BPM_BUCKET, FACETS, LibraryReadModel
+from database.search_index import search_hits
+from utils.artwork import ArtworkStore
+from utils.normalize import SEARCH_KEY_COLUMNS, normalize_name, prefix_upper_bound
+from config import config
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/library")
 
+artwork_store = ArtworkStore(config.get('artwork.store_path', 'artwork'))
+
+# In-memory filter columns, loaded in the background at startup when library.read_model is on
+read_model = LibraryReadModel(db_manager.engine) if db_manager.read_model_enabled else None
+
+# Fields that select rows, as opposed to ordering or paging them
+FILTER_FIELDS = [
+    'search_query', 'artist', 'album', 'genre', 'year_from', 'year_to', 'bpm_min', 'bpm_max',
+    'key_signature', 'status', 'has_duplicates', 'size_min_mb', 'size_max_mb'
+]
+
+# Totals per filter signature, valid while the library generation is unchanged
+TOTAL_CACHE_SIZE = 256
+_total_cache: "OrderedDict[str, Tuple[int, int]]" = OrderedDict()
+_total_cache_lock = threading.Lock()
+
+# Whole search responses per normalized request, dropped together when the library generation moves
+SEARCH_CACHE_SIZE = config.get('library.search_cache_size', 256)
+_search_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_search_cache_generation: Optional[int] = None
+_search_cache_stats = {'hits': 0, 'misses': 0}
+_search_cache_lock = threading.Lock()
+
+# Statistics payload and its ETag, for the one library generation they were computed in
+_statistics_cache: Dict[int, Tuple[Dict[str, Any], str]] = {}
+_statistics_lock = threading.Lock()
+
+def key_prefix_filter(field: str, value: str):
+    """
+    Index range condition matching rows whose normalized field starts with value
+    
+    Args:
+        field: 'artist', 'album' or 'genre'
+        value: Text as typed by the user
+    
+    Returns:
+        SQLAlchemy condition on the field's search key column
+    """
+    key_column = getattr(Metadata, SEARCH_KEY_COLUMNS[field])
+    prefix = normalize_name(value)
+    if not prefix:
+        return key_column.isnot(None)
+    return and_(key_column >= prefix, key_column < prefix_upper_bound(prefix))
+
 class SearchFilters(BaseModel):
     search_query: Optional[str] = None
     artist: Optional[str] = None
@@ -32,120 +91,404 @@ class SearchFilters(BaseModel):
     sort_order: str = "asc"
     limit: int = 50
     offset: int = 0
+    cursor: Optional[str] = None  # next_cursor of the previous page; replaces offset
+    facets: bool = False  # Also count the matches per genre, key, decade, format and BPM bucket
+
+def normalized_filters(filters: SearchFilters) -> Dict[str, Any]:
+    """
+    The fields that decide which rows match, in a canonical form
+    
+    Artist, album and genre compare by search key, and a blank or zero value
+    of a filter that only applies when set becomes None, so spellings that
+    select the same rows normalize to the same dict.
+    """
+    selected = {}
+    for field in FILTER_FIELDS:
+        value = getattr(filters, field)
+        if field in SEARCH_KEY_COLUMNS and value:
+            value = normalize_name(value)
+        elif field != 'has_duplicates' and not value:
+            value = None
+        selected[field] = value
+    return selected
+
+def filter_signature(filters: SearchFilters) -> str:
+    """Stable hash of the fields that decide which rows match"""
+    return hashlib.sha1(json.dumps(normalized_filters(filters), sort_keys=True).encode('utf-8')).hexdigest()
+
+def request_key(filters: SearchFilters, signature: str) -> str:
+    """Cache key of a whole search request: its filter signature plus ordering, paging and facets"""
+    request = [
+        signature, filters.sort_by, filters.sort_order, filters.limit,
+        None if filters.cursor else filters.offset, filters.cursor, filters.facets
+    ]
+    return hashlib.sha1(json.dumps(request).encode('utf-8')).hexdigest()
+
+def encode_cursor(filters: SearchFilters, signature: str, value: Any, file_id: int) -> str:
+    """Opaque token holding the sort position of the last row on a page"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = [signature, filters.sort_by, filters.sort_order, value, file_id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+def decode_cursor(filters: SearchFilters, signature: str) -> Tuple[Any, int]:
+    """
+    Sort value and file id a cursor resumes after
+    
+    Raises:
+        HTTPException: 400 if the cursor is malformed or was issued for other filters or ordering
+    """
+    try:
+        cursor_signature, sort_by, sort_order, value, file_id = json.loads(
+            base64.urlsafe_b64decode(filters.cursor.encode('ascii'))
+        )
+        # A path position is [directory path, file name]
+        if sort_by == 'path' and not (isinstance(value, list) and len(value) == 2):
+            raise ValueError("path cursor needs a directory and a file name")
+        # Every other sort by a string value falls back to created_at
+        if isinstance(value, str) and sort_by not in ('artist', 'title', 'album', 'path'):
+            value = datetime.fromisoformat(value)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if (cursor_signature, sort_by, sort_order) != (signature, filters.sort_by, filters.sort_order):
+        raise HTTPException(status_code=400, detail="Cursor does not match these filters")
+    return value, int(file_id)
+
+def cached_total(signature: str, generation: int) -> Optional[int]:
+    """Total for a filter signature if it was counted in this library generation"""
+    with _total_cache_lock:
+        entry = _total_cache.get(signature)
+        if entry is None or entry[0] != generation:
+            return None
+        _total_cache.move_to_end(signature)
+        return entry[1]
+
+def store_total(signature: str, generation: int, total: int):
+    """Remember a total, evicting the least recently used signature when full"""
+    with _total_cache_lock:
+        _total_cache[signature] = (generation, total)
+        _total_cache.move_to_end(signature)
+        while len(_total_cache) > TOTAL_CACHE_SIZE:
+            _total_cache.popitem(last=False)
+
+def cached_search(key: str, generation: int) -> Optional[Dict[str, Any]]:
+    """Response for a request key if it was built in this library generation, counting the hit or miss"""
+    global _search_cache_generation
+    with _search_cache_lock:
+        if generation != _search_cache_generation:
+            _search_cache.clear()
+            _search_cache_generation = generation
+        
+        response = _search_cache.get(key)
+        if response is None:
+            _search_cache_stats['misses'] += 1
+            return None
+        _search_cache.move_to_end(key)
+        _search_cache_stats['hits'] += 1
+        return response
+
+def store_search(key: str, generation: int, response: Dict[str, Any]) -> Dict[str, Any]:
+    """Remember a response, evicting the least recently used request when full, and return it"""
+    with _search_cache_lock:
+        if generation == _search_cache_generation:
+            _search_cache[key] = response
+            _search_cache.move_to_end(key)
+            while len(_search_cache) > SEARCH_CACHE_SIZE:
+                _search_cache.popitem(last=False)
+    return response
+
+def _filtered(query, filters: SearchFilters):
+    """
+    Apply the search filters to a query over File, joining the tables they need
+    
+    Returns:
+        Tuple of (filtered query, FTS hits subquery or None, whether metadata
+        is joined, whether audio_analysis is joined), or None if the text
+        query matches nothing
+    """
+    # Metadata is already loaded via joinedload, no need for explicit join for sorting
+    # Only join if we need to filter
+    metadata_joined = False
+    if any([filters.artist, filters.album, filters.genre,
+           filters.year_from, filters.year_to]) or (filters.search_query and not db_manager.search_index_enabled):
+        query = query.join(Metadata, File.id == Metadata.file_id, isouter=True)
+        metadata_joined = True
+    
+    # Join with audio analysis if needed
+    analysis_joined = False
+    if any([filters.bpm_min, filters.bpm_max, filters.key_signature]):
+        query = query.join(AudioAnalysis, File.id == AudioAnalysis.file_id, isouter=True)
+        analysis_joined = True
+    
+    # Global search across tags and paths, through the FTS index when available
+    hits = None
+    if filters.search_query and db_manager.search_index_enabled:
+        hits = search_hits(filters.search_query)
+        if hits is None:
+            return None
+        query = query.join(hits, hits.c.file_id == File.id)
+    elif filters.search_query:
+        search_term = f"%{filters.search_query}%"
+        # Folders joined by id; the path properties would run a subquery per row
+        source_folder, target_folder = aliased(Directory), aliased(Directory)
+        query = query.join(source_folder, source_folder.id == File.directory_id).outerjoin(
+            Migration, Migration.file_id == File.id
+        ).outerjoin(target_folder, target_folder.id == Migration.target_directory_id).filter(
+            or_(
+                Metadata.artist.ilike(search_term),
+                Metadata.title.ilike(search_term),
+                Metadata.album.ilike(search_term),
+                *_path_matches(source_folder, File.filename, search_term),
+                *_path_matches(target_folder, Migration.target_filename, search_term)
+            )
+        )
+    
+    # Specific field filters
+    # Artist and album match as you type, genre comes from the genre list
+    if filters.artist:
+        query = query.filter(key_prefix_filter('artist', filters.artist))
+    if filters.album:
+        query = query.filter(key_prefix_filter('album', filters.album))
+    if filters.genre:
+        query = query.filter(Metadata.genre_key == (normalize_name(filters.genre) or None))
+    
+    # Year range filter
+    if filters.year_from:
+        query = query.filter(Metadata.year >= filters.year_from)
+    if filters.year_to:
+        query = query.filter(Metadata.year <= filters.year_to)
+    
+    # BPM range filter
+    if filters.bpm_min:
+        query = query.filter(AudioAnalysis.bpm >= filters.bpm_min)
+    if filters.bpm_max:
+        query = query.filter(AudioAnalysis.bpm <= filters.bpm_max)
+    
+    # Key signature filter
+    if filters.key_signature:
+        query = query.filter(AudioAnalysis.key_signature == filters.key_signature)
+    
+    # Status filter
+    if filters.status:
+        query = query.filter(File.status == filters.status)
+    
+    # File size filter (convert MB to bytes)
+    if filters.size_min_mb:
+        query = query.filter(File.file_size >= filters.size_min_mb * 1024 * 1024)
+    if filters.size_max_mb:
+        query = query.filter(File.file_size <= filters.size_max_mb * 1024 * 1024)
+    
+    # Duplicate filter, against the group sizes the duplicate detector stores on each file
+    if filters.has_duplicates is not None:
+        if filters.has_duplicates:
+            query = query.filter(File.dup_count > 0)
+        else:
+            query = query.filter(File.dup_count == 0)
+    
+    return query, hits, metadata_joined, analysis_joined
+
+def _path_matches(folder, filename, search_term: str) -> List[Any]:
+    """LIKE conditions for a term anywhere in a folder path plus file name, joining them only when the term spans a separator"""
+    if '/' in search_term or '\\' in search_term:
+        return [joined_path(folder.path, filename).ilike(search_term)]
+    return [folder.path.ilike(search_term), filename.ilike(search_term)]
+
+def _query_page(session, filters: SearchFilters, signature: str, after: Optional[Tuple[Any, int]],
+                generation: int) -> Optional[Tuple[List[Tuple[File, Any]], int]]:
+    """
+    Search in SQL, joining the tables the filters and sort need
+    
+    Returns:
+        Tuple of (up to limit + 1 (file, sort value) rows, total matches),
+        or None if the text query matches nothing
+    """
+    filtered = _filtered(session.query(File).options(
+        joinedload(File.file_metadata),
+        joinedload(File.audio_analysis),
+        joinedload(File.migration)
+    ), filters)
+    if filtered is None:
+        return None
+    query, hits, metadata_joined, analysis_joined = filtered
+    
+    # Total count, reused across pages until the library changes
+    total_count = cached_total(signature, generation)
+    if total_count is None:
+        total_count = query.count()
+        store_total(signature, generation, total_count)
+    
+    # Sorting - ensure metadata table is joined if sorting by metadata fields
+    if filters.sort_by in ['artist', 'title', 'album'] and not metadata_joined:
+        query = query.join(Metadata, File.id == Metadata.file_id, isouter=True)
+    if filters.sort_by == 'bpm' and not analysis_joined:
+        query = query.join(AudioAnalysis, File.id == AudioAnalysis.file_id, isouter=True)
+    
+    # Missing values sort as the lowest value, so the keyset comparison never meets NULL
+    sort_columns = [{
+        'artist': func.coalesce(Metadata.artist, ''),
+        'title': func.coalesce(Metadata.title, ''),
+        'album': func.coalesce(Metadata.album, ''),
+        'size': func.coalesce(File.file_size, -1),
+        'date_added': File.created_at,
+        'bpm': func.coalesce(AudioAnalysis.bpm, -1)
+    }.get(filters.sort_by, File.created_at)]  # Default to created_at instead of artist
+    
+    if filters.sort_by == 'path':
+        # Folder, then file name: the directories path index in order, and each folder's files from ix_files_location
+        query = query.join(Directory, Directory.id == File.directory_id)
+        sort_columns = [Directory.path, File.filename]
+    
+    descending = filters.sort_order == 'desc'
+    if filters.sort_by == 'relevance' and hits is not None:
+        # bm25() scores are lower for better matches
+        sort_columns = [hits.c.score]
+        descending = False
+    
+    # File id breaks ties so every row has a unique position
+    if descending:
+        query = query.order_by(*[column.desc() for column in sort_columns], File.id.desc())
+    else:
+        query = query.order_by(*[column.asc() for column in sort_columns], File.id.asc())
+    
+    # Pagination
+    query = query.add_columns(*sort_columns)
+    if after is not None:
+        value, file_id = after
+        position = tuple_(*sort_columns, File.id)
+        resume = tuple_(*(value if len(sort_columns) > 1 else [value]), file_id)
+        query = query.filter(position < resume if descending else position > resume)
+    else:
+        query = query.offset(filters.offset)
+    
+    # One extra row tells whether there is a next page
+    rows = query.limit(filters.limit + 1).all()
+    if len(sort_columns) > 1:
+        # The cursor carries a sort over several columns as a list
+        rows = [(row[0], list(row[1:])) for row in rows]
+    return rows, total_count
+
+def _facet_counts(session, filters: SearchFilters) -> Dict[str, Dict[Any, int]]:
+    """
+    Facet counts in SQL: the filtered rows are materialized once as a CTE,
+    then grouped by each facet in a UNION ALL (SQLite has no GROUPING SETS)
+    
+    Returns:
+        Dict of facet name to {value: count}
+    """
+    facets = {name: {} for name in FACETS}
+    filtered = _filtered(session.query(File.id), filters)
+    if filtered is None:
+        return facets
+    query, _, metadata_joined, analysis_joined = filtered
+    
+    if not metadata_joined:
+        query = query.join(Metadata, File.id == Metadata.file_id, isouter=True)
+    if not analysis_joined:
+        query = query.join(AudioAnalysis, File.id == AudioAnalysis.file_id, isouter=True)
+    matched = query.with_entities(
+        Metadata.genre, Metadata.genre_key, Metadata.year, Metadata.format,
+        AudioAnalysis.key_signature, AudioAnalysis.bpm
+    ).cte('matched')
+    
+    decade = matched.c.year // 10 * 10
+    bucket = cast(matched.c.bpm / BPM_BUCKET, Integer) * BPM_BUCKET
+    groups = [
+        # Genres group by search key under their lowest spelling, as in /genres
+        select(literal('genre'), func.min(matched.c.genre), func.count()).where(
+            matched.c.genre_key.isnot(None)).group_by(matched.c.genre_key),
+        select(literal('key'), matched.c.key_signature, func.count()).where(
+            matched.c.key_signature.isnot(None)).group_by(matched.c.key_signature),
+        select(literal('decade'), decade, func.count()).where(matched.c.year.isnot(None)).group_by(decade),
+        select(literal('format'), matched.c.format, func.count()).where(
+            matched.c.format.isnot(None)).group_by(matched.c.format),
+        select(literal('bpm'), bucket, func.count()).where(matched.c.bpm.isnot(None)).group_by(bucket)
+    ]
+    for name, value, count in session.execute(union_all(*groups)):
+        facets[name][value] = count
+    return facets
+
+def facet_lists(facets: Dict[str, Dict[Any, int]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Response form of facet counts: names by count, decades and BPM buckets in numeric order"""
+    return {
+        name: [
+            {'value': value, 'count': count}
+            for value, count in sorted(
+                facets[name].items(),
+                key=(lambda item: item[0]) if name in ('decade', 'bpm') else (lambda item: (-item[1], item[0]))
+            )
+        ]
+        for name in FACETS
+    }
 
 @router.post("/search")
 async def search_library(filters: SearchFilters):
-    """Advanced search with multiple filters"""
+    """
+    Advanced search with multiple filters
+    
+    Pages are fetched by keyset: pass the previous response's next_cursor
+    to continue after its last row, which costs the same at any depth.
+    offset is still honoured when no cursor is given.
+    
+    With the read model loaded, filters and ordering run over its arrays
+    and SQLite only loads the page; text queries and title or path order
+    still go through SQL.
+    
+    With facets set, the response also counts the matches per genre, key,
+    decade, format and BPM bucket: bincounts over the read model's filter
+    mask, or one grouped SQL query when the model cannot answer.
+    
+    Responses are cached per normalized request until the library
+    generation changes; see /search/cache for the hit rate.
+    """
+    signature = filter_signature(filters)
+    after = decode_cursor(filters, signature) if filters.cursor else None
+    
     try:
+        generation = db_manager.get_generation()
+        key = request_key(filters, signature)
+        cached = cached_search(key, generation)
+        if cached is not None:
+            return cached
+        
         with db_manager.get_session() as session:
-            query = session.query(File).options(
-                joinedload(File.file_metadata),
-                joinedload(File.audio_analysis),
-                joinedload(File.migration)
-            )
-            
-            # Metadata is already loaded via joinedload, no need for explicit join for sorting
-            # Only join if we need to filter
-            metadata_joined = False
-            if any([filters.search_query, filters.artist, filters.album, 
-                   filters.genre, filters.year_from, filters.year_to]):
-                query = query.join(Metadata, File.id == Metadata.file_id, isouter=True)
-                metadata_joined = True
-            
-            # Join with audio analysis if needed
-            if any([filters.bpm_min, filters.bpm_max, filters.key_signature]):
-                query = query.join(AudioAnalysis, File.id == AudioAnalysis.file_id, isouter=True)
-            
-            # Global search across multiple fields
-            if filters.search_query:
-                search_term = f"%{filters.search_query}%"
-                query = query.filter(
-                    or_(
-                        Metadata.artist.ilike(search_term),
-                        Metadata.title.ilike(search_term),
-                        Metadata.album.ilike(search_term),
-                        File.source_path.ilike(search_term),
-                        File.target_path.ilike(search_term)
-                    )
-                )
-            
-            # Specific field filters
-            if filters.artist:
-                query = query.filter(Metadata.artist.ilike(f"%{filters.artist}%"))
-            if filters.album:
-                query = query.filter(Metadata.album.ilike(f"%{filters.album}%"))
-            if filters.genre:
-                query = query.filter(Metadata.genre.ilike(f"%{filters.genre}%"))
-            
-            # Year range filter
-            if filters.year_from:
-                query = query.filter(Metadata.year >= filters.year_from)
-            if filters.year_to:
-                query = query.filter(Metadata.year <= filters.year_to)
-            
-            # BPM range filter
-            if filters.bpm_min:
-                query = query.filter(AudioAnalysis.bpm >= filters.bpm_min)
-            if filters.bpm_max:
-                query = query.filter(AudioAnalysis.bpm <= filters.bpm_max)
-            
-            # Key signature filter
-            if filters.key_signature:
-                query = query.filter(AudioAnalysis.key_signature == filters.key_signature)
-            
-            # Status filter
-            if filters.status:
-                query = query.filter(File.status == filters.status)
-            
-            # File size filter (convert MB to bytes)
-            if filters.size_min_mb:
-                query = query.filter(File.file_size >= filters.size_min_mb * 1024 * 1024)
-            if filters.size_max_mb:
-                query = query.filter(File.file_size <= filters.size_max_mb * 1024 * 1024)
-            
-            # Duplicate filter
-            if filters.has_duplicates is not None:
-                if filters.has_duplicates:
-                    query = query.filter(File.file_hash.in_(
-                        session.query(File.file_hash)
-                        .group_by(File.file_hash)
-                        .having(func.count(File.file_hash) > 1)
-                    ))
-                else:
-                    query = query.filter(File.file_hash.in_(
-                        session.query(File.file_hash)
-                        .group_by(File.file_hash)
-                        .having(func.count(File.file_hash) == 1)
-                    ))
-            
-            # Get total count before pagination
-            total_count = query.count()
-            
-            # Sorting - ensure metadata table is joined if sorting by metadata fields
-            if filters.sort_by in ['artist', 'title', 'album'] and not metadata_joined:
-                query = query.join(Metadata, File.id == Metadata.file_id, isouter=True)
-            
-            sort_column = {
-                'artist': Metadata.artist,
-                'title': Metadata.title,
-                'album': Metadata.album,
-                'size': File.file_size,
-                'date_added': File.created_at,
-                'bpm': AudioAnalysis.bpm,
-                'path': File.source_path
-            }.get(filters.sort_by, File.created_at)  # Default to created_at instead of artist
-            
-            if filters.sort_order == 'desc':
-                query = query.order_by(sort_column.desc().nullslast())
+            # The in-memory columns answer the filters when they can; only the page itself is read from SQLite.
+            # Catching up with the change log can mean a full reload, so it runs off the event loop
+            columnar = None
+            if read_model is not None:
+                columnar = await asyncio.to_thread(read_model.search, filters, after, generation)
+            if columnar is not None:
+                page_ids, total_count, values = columnar
+                files = {file.id: file for file in session.query(File).options(
+                    joinedload(File.file_metadata),
+                    joinedload(File.audio_analysis),
+                    joinedload(File.migration)
+                ).filter(File.id.in_(page_ids))}
+                rows = [(files[file_id], value) for file_id, value in zip(page_ids, values) if file_id in files]
             else:
-                query = query.order_by(sort_column.asc().nullsfirst())
-            
-            # Pagination
-            files = query.limit(filters.limit).offset(filters.offset).all()
+                page = _query_page(session, filters, signature, after, generation)
+                if page is None:
+                    return store_search(key, generation, _empty_page(filters))
+                rows, total_count = page
+            
+            facets = None
+            if filters.facets:
+                if read_model is not None:
+                    facets = await asyncio.to_thread(read_model.facets, filters, generation)
+                if facets is None:
+                    facets = _facet_counts(session, filters)
+            
+            has_more = len(rows) > filters.limit
+            rows = rows[:filters.limit]
+            
+            next_cursor = None
+            if has_more:
+                last_file, last_value = rows[-1]
+                next_cursor = encode_cursor(filters, signature, last_value, last_file.id)
             
             # Format response
             results = []
-            for file in files:
+            for file, _ in rows:
                 metadata = file.file_metadata
                 audio = file.audio_analysis
                 
@@ -165,7 +508,8 @@ async def search_library(filters: SearchFilters):
                         'genre': metadata.genre if metadata else None,
                         'year': metadata.year if metadata else None,
                         'track_number': metadata.track_number if metadata else None,
-                        'duration': metadata.duration_seconds if metadata else None
+                        'duration': metadata.duration_seconds if metadata else None,
+                        'art_hash': metadata.art_hash if metadata else None
                     },
                     'audio_analysis': {
                         'bpm': audio.bpm if audio else None,
@@ -174,34 +518,67 @@ async def search_library(filters: SearchFilters):
                     } if audio else None
                 })
             
-            return {
+            response = {
                 'results': results,
                 'total': total_count,
                 'limit': filters.limit,
-                'offset': filters.offset,
-                'page': (filters.offset // filters.limit) + 1,
-                'total_pages': (total_count + filters.limit - 1) // filters.limit
+                'offset': None if after is not None else filters.offset,
+                'page': None if after is not None else (filters.offset // filters.limit) + 1,
+                'total_pages': (total_count + filters.limit - 1) // filters.limit,
+                'next_cursor': next_cursor
             }
+            if facets is not None:
+                response['facets'] = facet_lists(facets)
+            return store_search(key, generation, response)
     
     except Exception as e:
         logger.error(f"Search error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _empty_page(filters: SearchFilters) -> Dict[str, Any]:
+    """Search response with no results"""
+    response = {
+        'results': [],
+        'total': 0,
+        'limit': filters.limit,
+        'offset': filters.offset,
+        'page': 1,
+        'total_pages': 0,
+        'next_cursor': None
+    }
+    if filters.facets:
+        response['facets'] = {name: [] for name in FACETS}
+    return response
+
+@router.get("/search/cache")
+async def get_search_cache_stats():
+    """Hit and miss counts of the search response cache since startup"""
+    with _search_cache_lock:
+        hits, misses = _search_cache_stats['hits'], _search_cache_stats['misses']
+        return {
+            'entries': len(_search_cache),
+            'capacity': SEARCH_CACHE_SIZE,
+            'generation': _search_cache_generation,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses) * 100, 1) if hits + misses else 0
+        }
+
 @router.get("/artists")
 async def get_artists():
     """Get list of unique artists with track counts"""
     try:
         with db_manager.get_session() as session:
+            # Spelling variants of an artist are one entry
             artists = session.query(
-                Metadata.artist,
+                func.min(Metadata.artist),
                 func.count(Metadata.file_id).label('track_count')
             ).filter(
-                Metadata.artist.isnot(None),
-                Metadata.artist != ''
+                Metadata.artist_key.isnot(None)
             ).group_by(
-                Metadata.artist
+                Metadata.artist_key
             ).order_by(
-                Metadata.artist.asc()
+                Metadata.artist_key.asc()
             ).all()
             
             return {
@@ -222,23 +599,23 @@ async def get_albums(artist: Optional[str] = None):
     try:
         with db_manager.get_session() as session:
             query = session.query(
-                Metadata.album,
-                Metadata.artist,
+                func.min(Metadata.album),
+                func.min(Metadata.artist),
                 func.count(Metadata.file_id).label('track_count'),
-                func.min(Metadata.year).label('year')
+                func.min(Metadata.year).label('year'),
+                func.max(Metadata.art_hash).label('art_hash')
             ).filter(
-                Metadata.album.isnot(None),
-                Metadata.album != ''
+                Metadata.album_key.isnot(None)
             )
             
             if artist:
-                query = query.filter(Metadata.artist.ilike(f"%{artist}%"))
+                query = query.filter(key_prefix_filter('artist', artist))
             
             albums = query.group_by(
-                Metadata.album,
-                Metadata.artist
+                Metadata.album_key,
+                Metadata.artist_key
             ).order_by(
-                Metadata.album.asc()
+                Metadata.album_key.asc()
             ).all()
             
             return {
@@ -247,9 +624,10 @@ async def get_albums(artist: Optional[str] = None):
                         'album': album,
                         'artist': artist,
                         'track_count': count,
-                        'year': year
+                        'year': year,
+                        'art_hash': art_hash
                     }
-                    for album, artist, count, year in albums
+                    for album, artist, count, year, art_hash in albums
                 ],
                 'total': len(albums)
             }
@@ -258,19 +636,76 @@ async def get_albums(artist: Optional[str] = None):
         logger.error(f"Error fetching albums: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/autocomplete")
+async def autocomplete(field: str, q: str = "", limit: int = Query(10, ge=1, le=50)):
+    """
+    Prefix suggestions for an artist, album or genre input
+    
+    Walks the (key, value) index from the normalized prefix, so the cost
+    depends on the number of suggestions returned, not the library size.
+    """
+    if field not in SEARCH_KEY_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Unsupported field: {field}")
+    
+    try:
+        with db_manager.get_session() as session:
+            key_column = getattr(Metadata, SEARCH_KEY_COLUMNS[field])
+            value_column = getattr(Metadata, field)
+            
+            suggestions = session.query(
+                func.min(value_column),
+                func.count().label('track_count')
+            ).filter(
+                key_prefix_filter(field, q)
+            ).group_by(
+                key_column
+            ).order_by(
+                key_column.asc()
+            ).limit(limit).all()
+            
+            return {
+                'field': field,
+                'query': q,
+                'suggestions': [
+                    {'value': value, 'track_count': count}
+                    for value, count in suggestions
+                ]
+            }
+    
+    except Exception as e:
+        logger.error(f"Autocomplete error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/art/{art_hash}")
+async def get_artwork(art_hash: str):
+    """Serve a cover art thumbnail from the content-addressed store"""
+    path = artwork_store.path_for(art_hash)
+    
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail="Artwork not found")
+    
+    # The name is the content hash, so the response never changes
+    return FileResponse(
+        path,
+        media_type='image/jpeg',
+        headers={
+            'Cache-Control': 'public, max-age=31536000, immutable',
+            'ETag': f'"{art_hash}"'
+        }
+    )
+
 @router.get("/genres")
 async def get_genres():
     """Get list of unique genres with track counts"""
     try:
         with db_manager.get_session() as session:
             genres = session.query(
-                Metadata.genre,
+                func.min(Metadata.genre),
                 func.count(Metadata.file_id).label('track_count')
             ).filter(
-                Metadata.genre.isnot(None),
-                Metadata.genre != ''
+                Metadata.genre_key.isnot(None)
             ).group_by(
-                Metadata.genre
+                Metadata.genre_key
             ).order_by(
                 func.count(Metadata.file_id).desc()
             ).all()
@@ -287,182 +722,180 @@ async def get_genres():
         logger.error(f"Error fetching genres: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names this entity tag (weak or strong)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+def compute_library_statistics(session) -> Dict[str, Any]:
+    """
+    Build the statistics payload from the trigger-maintained counters
+    
+    Nothing here aggregates the library: duplicate totals are counters fed
+    by the files' dup_count and the detector's groups, and the top artists
+    are read off the per-artist counters.
+    """
+    counters = read_library_stats(session)
+    total_files = counters.get('files', 0)
+    total_size = counters.get('bytes', 0)
+    files_with_metadata = counters.get('metadata', 0)
+    files_with_analysis = counters.get('analysis', 0)
+    bpm_count = counters.get('bpm_count', 0)
+    avg_bpm = counters.get('bpm_sum', 0) / bpm_count if bpm_count else None
+    
+    duplicate_groups = counters.get('duplicate_groups', 0)
+    
+    # Files in duplicate groups, the space they use, and what dropping all but the primaries saves
+    duplicate_files = counters.get('duplicate_files', 0)
+    duplicate_space = counters.get('duplicate_bytes', 0)
+    potential_savings = counters.get('reclaimable_bytes', 0)
+    
+    # Top artists by track count
+    top_artists = read_top_artists(session, 10)
+    
+    return {
+        'total_files': total_files,
+        'total_size_gb': round(total_size / (1024**3), 2),
+        'status_breakdown': {status or None: count for status, count in counters['status'].items()},
+        'files_with_metadata': files_with_metadata,
+        'metadata_coverage': round(files_with_metadata / total_files * 100, 2) if total_files > 0 else 0,
+        'files_with_analysis': files_with_analysis,
+        'analysis_coverage': round(files_with_analysis / total_files * 100, 2) if total_files > 0 else 0,
+        'duplicates': {
+            'groups': duplicate_groups,
+            'total_files': duplicate_files,
+            'space_used_gb': round(duplicate_space / (1024**3), 2),
+            'potential_savings_gb': round(potential_savings / (1024**3), 2)
+        },
+        'audio_stats': {
+            'average_bpm': round(avg_bpm, 1) if avg_bpm else None,
+            'key_distribution': counters['key']
+        },
+        'top_artists': [
+            {'artist': artist, 'track_count': count}
+            for artist, count in top_artists
+        ],
+        'format_distribution': counters['ext']
+    }
+
 @router.get("/statistics")
-async def get_library_statistics():
-    """Get comprehensive library statistics"""
+async def get_library_statistics(request: Request):
+    """
+    Get comprehensive library statistics
+    
+    The payload is built at most once per library generation and served
+    with an ETag, so an unchanged library answers If-None-Match with 304.
+    """
     try:
-        with db_manager.get_session() as session:
-            # Basic file stats
-            total_files = session.query(func.count(File.id)).scalar()
-            total_size = session.query(func.sum(File.file_size)).scalar() or 0
-            
-            # Status breakdown
-            status_counts = dict(
-                session.query(File.status, func.count(File.id))
-                .group_by(File.status)
-                .all()
-            )
-            
-            # Files with metadata
-            files_with_metadata = session.query(func.count(distinct(Metadata.file_id))).scalar()
-            
-            # Files with audio analysis
-            files_with_analysis = session.query(func.count(distinct(AudioAnalysis.file_id))).scalar()
-            
-            # Duplicate statistics
-            duplicate_groups = session.query(func.count(distinct(Duplicate.group_id))).scalar()
-            duplicate_files = session.query(
-                func.count(File.id)
-            ).filter(
-                File.file_hash.in_(
-                    session.query(File.file_hash)
-                    .group_by(File.file_hash)
-                    .having(func.count(File.file_hash) > 1)
-                )
-            ).scalar()
-            
-            # Space that could be saved by removing duplicates
-            duplicate_space = session.query(
-                func.sum(File.file_size)
-            ).filter(
-                File.file_hash.in_(
-                    session.query(File.file_hash)
-                    .group_by(File.file_hash)
-                    .having(func.count(File.file_hash) > 1)
-                )
-            ).scalar() or 0
-            
-            # Get unique duplicate hashes and calculate potential savings
-            unique_duplicate_sizes = session.query(
-                File.file_hash,
-                func.max(File.file_size).label('size'),
-                func.count(File.id).label('count')
-            ).group_by(
-                File.file_hash
-            ).having(
-                func.count(File.id) > 1
-            ).all()
-            
-            potential_savings = sum(
-                size * (count - 1) for _, size, count in unique_duplicate_sizes
-            )
-            
-            # Average BPM
-            avg_bpm = session.query(func.avg(AudioAnalysis.bpm)).scalar()
-            
-            # Key signature distribution
-            key_distribution = dict(
-                session.query(
-                    AudioAnalysis.key_signature,
-                    func.count(AudioAnalysis.file_id)
-                ).filter(
-                    AudioAnalysis.key_signature.isnot(None)
-                ).group_by(
-                    AudioAnalysis.key_signature
-                ).all()
-            )
-            
-            # Top artists by track count
-            top_artists = session.query(
-                Metadata.artist,
-                func.count(Metadata.file_id).label('count')
-            ).filter(
-                Metadata.artist.isnot(None),
-                Metadata.artist != ''
-            ).group_by(
-                Metadata.artist
-            ).order_by(
-                func.count(Metadata.file_id).desc()
-            ).limit(10).all()
-            
-            # File format distribution
-            format_distribution = {}
-            files = session.query(File.source_path).all()
-            for (path,) in files:
-                ext = Path(path).suffix.lower()
-                format_distribution[ext] = format_distribution.get(ext, 0) + 1
-            
-            return {
-                'total_files': total_files,
-                'total_size_gb': round(total_size / (1024**3), 2),
-                'status_breakdown': status_counts,
-                'files_with_metadata': files_with_metadata,
-                'metadata_coverage': round(files_with_metadata / total_files * 100, 2) if total_files > 0 else 0,
-                'files_with_analysis': files_with_analysis,
-                'analysis_coverage': round(files_with_analysis / total_files * 100, 2) if total_files > 0 else 0,
-                'duplicates': {
-                    'groups': duplicate_groups,
-                    'total_files': duplicate_files,
-                    'space_used_gb': round(duplicate_space / (1024**3), 2),
-                    'potential_savings_gb': round(potential_savings / (1024**3), 2)
-                },
-                'audio_stats': {
-                    'average_bpm': round(avg_bpm, 1) if avg_bpm else None,
-                    'key_distribution': key_distribution
-                },
-                'top_artists': [
-                    {'artist': artist, 'track_count': count}
-                    for artist, count in top_artists
-                ],
-                'format_distribution': format_distribution
-            }
+        generation = db_manager.get_generation()
+        with _statistics_lock:
+            cached = _statistics_cache.get(generation)
+        
+        if cached is None:
+            with db_manager.get_session() as session:
+                statistics = compute_library_statistics(session)
+            digest = hashlib.sha1(json.dumps(statistics, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+            cached = (statistics, f'"{digest}"')
+            with _statistics_lock:
+                _statistics_cache.clear()
+                _statistics_cache[generation] = cached
+        
+        statistics, etag = cached
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(request.headers.get('if-none-match'), etag):
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(content=statistics, headers=headers)
     
     except Exception as e:
         logger.error(f"Error fetching statistics: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/export")
+async def export_library(format: str = Query('ndjson', pattern='^(ndjson|csv|parquet)$')):
+    """
+    Stream every file with its metadata, classification, analysis and migration
+    
+    Rows are read in keyset batches by file id and written out as each batch
+    arrives, so memory use does not grow with the library. Parquet files get
+    one row group per batch.
+    """
+    if format == 'parquet' and not PYARROW_AVAILABLE:
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow")
+    
+    write, media_type = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        write(export_batches(db_manager.engine)),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="music_library.{format}"'}
+    )
+
 @router.get("/folders")
-async def get_folder_structure(base_path: Optional[str] = None):
-    """Get folder structure of migrated files"""
+async def get_folder_structure(
+    parent_id: Optional[int] = None,
+    base_path: Optional[str] = None,
+    tree: str = Query('target', pattern='^(source|target)$')
+):
+    """
+    Get one level of the folder tree with rolled-up totals
+    
+    Args:
+        parent_id: Folder to list the children of; the filesystem roots when omitted
+        base_path: Folder path to list the children of, instead of parent_id
+        tree: 'target' for migrated files, 'source' for the indexed library
+    """
     try:
+        if base_path is not None:
+            with db_manager.get_session() as session:
+                parent = session.query(Directory.id).filter(Directory.path == base_path).first()
+            if parent is None:
+                raise HTTPException(status_code=404, detail="Folder not found")
+            parent_id = parent.id
+        
         with db_manager.get_session() as session:
-            query = session.query(Migration.target_path).join(
-                File, Migration.file_id == File.id
+            count_column, bytes_column = (getattr(Directory, column) for column in TREE_COLUMNS[tree])
+            
+            child = aliased(Directory)
+            has_children = session.query(child.id).filter(
+                child.parent_id == Directory.id,
+                getattr(child, TREE_COLUMNS[tree][0]) > 0
+            ).exists()
+            
+            folders = session.query(
+                Directory.id,
+                Directory.name,
+                Directory.path,
+                count_column,
+                bytes_column,
+                has_children
             ).filter(
-                Migration.target_path.isnot(None),
-                Migration.status == 'completed'
-            )
-            
-            if base_path:
-                query = query.filter(Migration.target_path.like(f"{base_path}%"))
-            
-            paths = query.all()
-            
-            # Build folder structure
-            folder_tree = {}
-            for (path,) in paths:
-                if not path:
-                    continue
-                    
-                path_obj = Path(path)
-                parts = path_obj.parts
-                
-                current = folder_tree
-                for part in parts[:-1]:  # Exclude the file name
-                    if part not in current:
-                        current[part] = {}
-                    current = current[part]
+                Directory.parent_id == parent_id if parent_id is not None else Directory.parent_id.is_(None),
+                count_column > 0
+            ).order_by(
+                func.lower(Directory.name)
+            ).all()
             
-            # Convert to list format for frontend
-            def build_tree_list(tree, parent_path=""):
-                items = []
-                for name, subtree in tree.items():
-                    full_path = f"{parent_path}/{name}" if parent_path else name
-                    item = {
+            return {
+                'parent_id': parent_id,
+                'tree': tree,
+                'folders': [
+                    {
+                        'id': folder_id,
                         'name': name,
-                        'path': full_path,
-                        'type': 'folder'
+                        'path': path,
+                        'type': 'folder',
+                        'file_count': count,
+                        'size_mb': round((size or 0) / (1024 * 1024), 2),
+                        'has_children': children
                     }
-                    if subtree:
-                        item['children'] = build_tree_list(subtree, full_path)
-                    items.append(item)
-                return sorted(items, key=lambda x: x['name'].lower())
-            
-            return {
-                'folders': build_tree_list(folder_tree),
-                'total_files': len(paths)
+                    for folder_id, name, path, count, size, children in folders
+                ],
+                'total_files': sum(count for _, _, _, count, _, _ in folders)
             }
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching folder structure: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -9,7 +9,7 @@ import logging
 from pathlib import Path
 
 from api.routes import router as api_router
-from api.search_routes import router as search_router
+from api.search_routes import router as search_router, read_model
 from api.websocket import websocket_endpoint, broadcast_progress_task
 from config import config
 from utils.logger import logger
@@ -27,6 +27,10 @@ async def lifespan(app: FastAPI):
     task = asyncio.create_task(broadcast_progress_task())
     background_tasks.add(task)
     
+    # Searches use SQL until the in-memory columns are filled
+    if read_model is not None:
+        background_tasks.add(asyncio.create_task(asyncio.to_thread(read_model.load)))
+    
     yield
     
     # Shutdown
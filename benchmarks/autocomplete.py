@@ -0,0 +1,120 @@
+"""
+Benchmark artist/album prefix autocomplete on a large synthetic library
+
+Usage:
+    python -m benchmarks.autocomplete [--artists 50000] [--tracks 250000] [--queries 200]
+
+Fills a throwaway database with tracks spread over --artists distinct
+artists, then times the autocomplete endpoint for random one to four
+letter prefixes, next to the substring ILIKE scan it replaces.
+"""
+import argparse
+import logging
+import random
+import shutil
+import string
+import tempfile
+import time
+from pathlib import Path
+
+from config import config
+
+# Point the global database at a scratch file before database.db is imported
+_scratch_dir = Path(tempfile.mkdtemp(prefix='autocomplete_bench_'))
+config.config.setdefault('database', {})['path'] = str(_scratch_dir / 'bench.db')
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func
+
+from database.db import db_manager
+from database.models import File, Metadata
+from database.directory_tree import locate_paths
+from utils.normalize import add_search_keys
+from app import app
+
+def random_name(rng: random.Random) -> str:
+    """Two or three capitalized pseudo-words"""
+    return ' '.join(
+        ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))).capitalize()
+        for _ in range(rng.randint(2, 3))
+    )
+
+def load_library(artists: int, tracks: int):
+    """Insert tracks with artist, album and genre tags"""
+    rng = random.Random(0)
+    artist_names = [random_name(rng) for _ in range(artists)]
+    genres = ['Rock', 'Pop', 'Jazz', 'Electronic', 'Hip Hop', 'Classical', 'Folk', 'Metal']
+    
+    with db_manager.get_session() as session:
+        directory_id = locate_paths(session, ['/bench/0.mp3'])['/bench/0.mp3'][0]
+        session.bulk_insert_mappings(File, [
+            {'id': i + 1, 'directory_id': directory_id, 'filename': f'{i:07d}.mp3', 'file_size': 1, 'status': 'analyzed'}
+            for i in range(tracks)
+        ])
+        session.bulk_insert_mappings(Metadata, [
+            add_search_keys({
+                'file_id': i + 1,
+                'artist': artist_names[i % artists],
+                'album': f'{artist_names[i % artists]} Vol {i // artists % 5 + 1}',
+                'genre': genres[i % len(genres)],
+                'title': f'Track {i}'
+            })
+            for i in range(tracks)
+        ])
+
+def time_calls(calls) -> list:
+    """Milliseconds per call"""
+    timings = []
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)
+
+def report(label: str, timings: list):
+    p50 = timings[len(timings) // 2]
+    p95 = timings[int(len(timings) * 0.95)]
+    print(f"{label:>28} {p50:>8.2f} {p95:>8.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--artists', type=int, default=50000)
+    parser.add_argument('--tracks', type=int, default=250000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+    
+    try:
+        load_library(args.artists, args.tracks)
+        print(f"{args.tracks} tracks, {args.artists} artists")
+        
+        rng = random.Random(1)
+        prefixes = [
+            ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(1, 4)))
+            for _ in range(args.queries)
+        ]
+        
+        client = TestClient(app)
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+        print(f"{'ms per query':>28} {'p50':>8} {'p95':>8}")
+        
+        for field in ('artist', 'album'):
+            report(f'autocomplete {field}', time_calls(
+                lambda p=p: client.get('/api/library/autocomplete', params={'field': field, 'q': p})
+                for p in prefixes
+            ))
+        
+        # What a typeahead had to do before the key columns existed
+        with db_manager.get_session() as session:
+            report('ILIKE scan artist', time_calls(
+                lambda p=p: session.query(Metadata.artist, func.count()).filter(
+                    Metadata.artist.ilike(f'%{p}%')
+                ).group_by(Metadata.artist).order_by(Metadata.artist).limit(10).all()
+                for p in prefixes[:20]
+            ))
+    
+    finally:
+        db_manager.close()
+        shutil.rmtree(_scratch_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark metadata enrichment against the local lookup stub server
+
+Usage:
+    python -m benchmarks.enrichment [--files 300] [--songs 60] [--latency 0.3] [--rate 10]
+
+Fills a throwaway database with tracks (several spelling variants per
+song), then enriches it at different concurrency levels with a cold cache
+and once more with a warm cache. --rate is the stub's limit; the client is
+configured with the same rate, so no request should be rejected.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from config import config
+
+# Point the global database at a scratch file before database.db is imported
+_scratch_dir = Path(tempfile.mkdtemp(prefix='enrichment_bench_'))
+config.config.setdefault('database', {})['path'] = str(_scratch_dir / 'bench.db')
+
+from database.db import db_manager
+from database.models import File, Metadata
+from database.directory_tree import locate_paths
+from modules.enrichment import MetadataEnricher
+from benchmarks.lookup_stub_server import start_stub_server
+
+SPELLINGS = ['{artist}', '{artist}', '{upper}', 'The {artist}']
+
+def load_library(files: int, songs: int):
+    """Insert tracks, spreading each song across differently spelled copies"""
+    with db_manager.get_session() as session:
+        directory_id = locate_paths(session, ['/bench/0.mp3'])['/bench/0.mp3'][0]
+        session.bulk_insert_mappings(File, [
+            {'id': i + 1, 'directory_id': directory_id, 'filename': f'{i:06d}.mp3', 'file_size': 1, 'status': 'analyzed'}
+            for i in range(files)
+        ])
+        session.bulk_insert_mappings(Metadata, [
+            {
+                'file_id': i + 1,
+                'artist': SPELLINGS[i // songs % len(SPELLINGS)].format(
+                    artist=f'Artist {i % songs % 25}', upper=f'ARTIST {i % songs % 25}'
+                ),
+                'title': f'Song {i % songs}',
+                'duration_seconds': 200.0
+            }
+            for i in range(files)
+        ])
+
+def reset_matches():
+    """Forget previous matches so every track is looked up again"""
+    with db_manager.get_session() as session:
+        session.query(Metadata).update({'musicbrainz_id': None, 'album': None, 'year': None})
+
+def run(base_url: str, rate: float, concurrency: int, cache_path: Path) -> dict:
+    config.config['enrichment'] = {
+        'musicbrainz_url': base_url,
+        'musicbrainz_rate': rate,
+        'concurrency': concurrency,
+        'cache_path': str(cache_path)
+    }
+    start = time.perf_counter()
+    result = MetadataEnricher().enrich_library()
+    result['elapsed'] = time.perf_counter() - start
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=300)
+    parser.add_argument('--songs', type=int, default=60, help='Distinct songs among the files')
+    parser.add_argument('--latency', type=float, default=0.3, help='Stub seconds per response')
+    parser.add_argument('--rate', type=float, default=10.0, help='Requests per second allowed by the stub')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4])
+    args = parser.parse_args()
+    
+    server, base_url = start_stub_server(latency=args.latency, rate=args.rate)
+    
+    try:
+        load_library(args.files, args.songs)
+        print(f"{args.files} files, {args.songs} songs, stub latency {args.latency}s, limit {args.rate}/s")
+        print(f"{'run':>16} {'seconds':>8} {'lookups':>8} {'requests':>9} {'cached':>7} {'matched':>8}")
+        
+        runs = [(f'cold x{c}', c, _scratch_dir / f'cache_{c}.db') for c in args.concurrency]
+        runs.append((f'warm x{args.concurrency[-1]}', args.concurrency[-1], runs[-1][2]))
+        
+        for label, concurrency, cache_path in runs:
+            reset_matches()
+            result = run(base_url, args.rate, concurrency, cache_path)
+            stats = result['musicbrainz']
+            print(f"{label:>16} {result['elapsed']:>8.2f} {result['lookups']:>8} {stats['requests']:>9} "
+                  f"{stats['cache_hits']:>7} {result['matched']:>8}")
+        
+        rejected = server.RequestHandlerClass.state.rejected
+        print(f"Stub rejected {rejected} requests for exceeding the rate limit")
+    
+    finally:
+        server.shutdown()
+        db_manager.close()
+        shutil.rmtree(_scratch_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
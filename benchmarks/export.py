@@ -0,0 +1,96 @@
+"""
+Compare paging through /api/files with the streaming library export
+
+Usage:
+    python -m benchmarks.export [--files 1000000] [--pages 50]
+
+Builds the same synthetic library as benchmarks.query_plans. Times the
+first pages of /api/files at 100 rows each, the way notebooks used to pull
+the library, and extrapolates to the whole library. Then streams the full
+export in each format to a file, reporting time, size and rows per second,
+checks every format holds one row per file, then streams it once more to
+measure the peak of Python allocations.
+"""
+import argparse
+import asyncio
+import csv
+import shutil
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.query_plans import _scratch_dir, build_library, db_manager
+
+from api.routes import get_files
+from database.library_export import EXPORT_FORMATS, PYARROW_AVAILABLE, export_batches
+
+def page_files(pages: int) -> float:
+    """Seconds to fetch the first pages of /api/files, 100 rows at a time"""
+    start = time.perf_counter()
+    for page in range(pages):
+        asyncio.run(get_files(limit=100, offset=page * 100))
+    return time.perf_counter() - start
+
+def stream(format: str, path: Path) -> float:
+    """Seconds to write one full export to a file, as a client would receive it"""
+    write, _ = EXPORT_FORMATS[format]
+    start = time.perf_counter()
+    with open(path, 'wb') as output:
+        for chunk in write(export_batches(db_manager.engine)):
+            output.write(chunk)
+    return time.perf_counter() - start
+
+def peak_memory(format: str) -> int:
+    """Peak bytes of Python allocations during a second export that discards its output"""
+    write, _ = EXPORT_FORMATS[format]
+    tracemalloc.start()
+    for _ in write(export_batches(db_manager.engine)):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def count_rows(format: str, path: Path) -> int:
+    """Rows in an exported file"""
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    with open(path, newline='', encoding='utf-8') as exported:
+        if format == 'csv':
+            return sum(1 for _ in csv.reader(exported)) - 1
+        return sum(1 for _ in exported)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=1000000)
+    parser.add_argument('--pages', type=int, default=50, help='/api/files pages to time')
+    args = parser.parse_args()
+    
+    try:
+        start = time.perf_counter()
+        build_library(args.files)
+        print(f"Built {args.files} file library in {time.perf_counter() - start:.1f}s")
+        
+        pages = min(args.pages, (args.files + 99) // 100)
+        elapsed = page_files(pages)
+        print(f"\n/api/files: {pages} pages of 100 in {elapsed:.1f}s, "
+              f"{pages * 100 / elapsed:,.0f} rows/s, at least {elapsed / pages * args.files / 100 / 60:.0f} min for the library")
+        
+        print(f"\n{'format':>8} {'seconds':>8} {'MB':>8} {'rows/s':>10} {'peak MB':>8}")
+        for format in EXPORT_FORMATS:
+            if format == 'parquet' and not PYARROW_AVAILABLE:
+                print(f"{format:>8} skipped, pyarrow is not installed")
+                continue
+            path = _scratch_dir / f'export.{format}'
+            elapsed = stream(format, path)
+            rows = count_rows(format, path)
+            if rows != args.files:
+                raise SystemExit(f"{format}: exported {rows} rows for {args.files} files")
+            print(f"{format:>8} {elapsed:>8.1f} {path.stat().st_size / 1024 / 1024:>8.1f} "
+                  f"{args.files / elapsed:>10,.0f} {peak_memory(format) / 1024 / 1024:>8.1f}")
+    finally:
+        db_manager.close()
+        shutil.rmtree(_scratch_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
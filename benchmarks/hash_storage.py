@@ -0,0 +1,214 @@
+"""
+Compare hex-text hashes and UUID group ids with raw digests and integer ids
+
+Usage:
+    python -m benchmarks.hash_storage [--files 1000000] [--copy-every 25] [--repeat 5]
+
+Builds the files and duplicate tables twice in throwaway databases: once as
+older versions stored them, with file_hash and audio_hash as hex strings and
+group ids as UUID strings, and once in the current layout, with BLOB digests
+and integer group ids. Both get the same rows and indexes. Reports the size
+of every table and index after VACUUM, then times the dedup queries: the
+repeated-hash GROUP BY behind exact matching and the has-duplicates filter,
+the sorted member scan that turns repeats into edges, and the joins from
+group summaries to their members.
+"""
+import argparse
+import hashlib
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+
+from database.models import Base, File, Duplicate, DuplicateGroup, DuplicateMatch
+
+# The tables as they were before the conversion, with the same indexes
+OLD_SCHEMA = [
+    """CREATE TABLE files (
+        id INTEGER PRIMARY KEY,
+        directory_id INTEGER,
+        filename TEXT NOT NULL,
+        file_size INTEGER,
+        modified_date DATETIME,
+        file_hash VARCHAR(32),
+        audio_hash VARCHAR(64),
+        status VARCHAR(20),
+        error_message TEXT,
+        created_at DATETIME
+    )""",
+    'CREATE INDEX ix_files_file_hash ON files (file_hash, file_size)',
+    'CREATE INDEX ix_files_audio_hash ON files (audio_hash) WHERE audio_hash IS NOT NULL',
+    'CREATE INDEX ix_files_status ON files (status, file_size)',
+    'CREATE INDEX ix_files_created_at ON files (created_at)',
+    'CREATE INDEX ix_files_file_size ON files (file_size)',
+    'CREATE UNIQUE INDEX ix_files_location ON files (directory_id, filename)',
+    """CREATE TABLE duplicates (
+        id INTEGER PRIMARY KEY,
+        group_id VARCHAR(36),
+        file_id INTEGER,
+        is_primary BOOLEAN,
+        quality_score INTEGER
+    )""",
+    'CREATE INDEX ix_duplicates_group_id ON duplicates (group_id)',
+    'CREATE INDEX ix_duplicates_file_id ON duplicates (file_id, group_id)',
+    'CREATE INDEX ix_duplicates_primary ON duplicates (file_id) WHERE is_primary = 1',
+    """CREATE TABLE duplicate_groups (
+        group_id VARCHAR(36) PRIMARY KEY,
+        file_count INTEGER,
+        total_bytes INTEGER,
+        reclaimable_bytes INTEGER,
+        primary_file_id INTEGER,
+        reasons VARCHAR(100)
+    )""",
+    'CREATE INDEX ix_duplicate_groups_reclaimable ON duplicate_groups (reclaimable_bytes, group_id)',
+    'CREATE INDEX ix_duplicate_groups_count ON duplicate_groups (file_count, group_id)',
+    """CREATE TABLE duplicate_matches (
+        id INTEGER PRIMARY KEY,
+        group_id VARCHAR(36),
+        file_id_a INTEGER,
+        file_id_b INTEGER,
+        reason VARCHAR(30),
+        confidence FLOAT
+    )""",
+    'CREATE INDEX ix_duplicate_matches_group_id ON duplicate_matches (group_id)',
+]
+
+QUERIES = [
+    ('repeated file hashes', 'SELECT file_hash FROM files WHERE file_hash IS NOT NULL '
+                             'GROUP BY file_hash HAVING count(*) > 1'),
+    ('repeated audio hashes', 'SELECT audio_hash FROM files WHERE audio_hash IS NOT NULL '
+                              'GROUP BY audio_hash HAVING count(*) > 1'),
+    ('exact-match edge scan', 'SELECT id, file_hash FROM files WHERE file_hash IN ('
+                              'SELECT file_hash FROM files WHERE file_hash IS NOT NULL '
+                              'GROUP BY file_hash HAVING count(*) > 1) ORDER BY file_hash, id'),
+    ('files sharing a hash count', 'SELECT count(*) FROM files WHERE file_hash IN ('
+                                   'SELECT file_hash FROM files GROUP BY file_hash HAVING count(file_hash) > 1)'),
+    ('members of every group', 'SELECT count(*), sum(duplicate_groups.primary_file_id = duplicates.file_id) '
+                               'FROM duplicate_groups JOIN duplicates ON duplicates.group_id = duplicate_groups.group_id'),
+    ('members of a 100-group page', 'SELECT duplicates.file_id, files.file_size FROM duplicates '
+                                    'JOIN files ON files.id = duplicates.file_id WHERE duplicates.group_id IN ('
+                                    'SELECT group_id FROM duplicate_groups ORDER BY reclaimable_bytes DESC, group_id DESC '
+                                    'LIMIT 100)'),
+]
+
+def library_rows(files: int, copy_every: int):
+    """(id, size, md5 digest, sha256 digest or None) per file; every copy_every-th file repeats the one before"""
+    for i in range(1, files + 1):
+        content = i - 1 if i % copy_every == 0 else i
+        yield (
+            i, 20 * 1024 * 1024 + content,
+            hashlib.md5(content.to_bytes(8, 'big')).digest(),
+            hashlib.sha256(content.to_bytes(8, 'big')).digest() if i % 2 == 0 or i % copy_every == 0 else None
+        )
+
+def insert_chunks(conn, sql: str, rows, chunk_size: int = 50000):
+    """executemany in chunks so the generator is never fully materialized"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            conn.exec_driver_sql(sql, chunk)
+            chunk = []
+    if chunk:
+        conn.exec_driver_sql(sql, chunk)
+
+def create_old(engine):
+    """Tables as older versions created them"""
+    with engine.begin() as conn:
+        for statement in OLD_SCHEMA:
+            conn.execute(text(statement))
+
+def create_new(engine):
+    """Tables from the current models"""
+    Base.metadata.create_all(engine, tables=[
+        File.__table__, Duplicate.__table__, DuplicateGroup.__table__, DuplicateMatch.__table__
+    ])
+
+def fill(engine, files: int, copy_every: int, digest, group_id):
+    """Insert the same library, storing digests and group numbers through the given encoders"""
+    with engine.begin() as conn:
+        insert_chunks(conn, "INSERT INTO files (id, directory_id, filename, file_size, file_hash, audio_hash, status) "
+                            "VALUES (?, 1, ?, ?, ?, ?, 'analyzed')", (
+            (i, f'{i:07d}.flac', size, digest(md5), digest(sha256) if sha256 else None)
+            for i, size, md5, sha256 in library_rows(files, copy_every)
+        ))
+        
+        copies = range(copy_every, files + 1, copy_every)
+        insert_chunks(conn, "INSERT INTO duplicate_groups (group_id, file_count, total_bytes, reclaimable_bytes, "
+                            "primary_file_id, reasons) VALUES (?, 2, ?, ?, ?, 'file_hash')", (
+            (group_id(i // copy_every), 2 * (20 * 1024 * 1024 + i), 20 * 1024 * 1024 + i, i - 1) for i in copies
+        ))
+        insert_chunks(conn, 'INSERT INTO duplicates (group_id, file_id, is_primary, quality_score) VALUES (?, ?, ?, ?)', (
+            row for i in copies
+            for row in ((group_id(i // copy_every), i - 1, 1, 80), (group_id(i // copy_every), i, 0, 60))
+        ))
+        insert_chunks(conn, "INSERT INTO duplicate_matches (group_id, file_id_a, file_id_b, reason, confidence) "
+                            "VALUES (?, ?, ?, 'file_hash', 1.0)", (
+            (group_id(i // copy_every), i - 1, i) for i in copies
+        ))
+        conn.execute(text('ANALYZE'))
+
+def storage(engine, path: Path) -> tuple:
+    """(file size in bytes, {table or index: bytes}) after VACUUM"""
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text('VACUUM'))
+        objects = dict(conn.execute(text(
+            "SELECT name, sum(pgsize) FROM dbstat WHERE name NOT IN ('sqlite_schema', 'sqlite_master') "
+            "AND name NOT LIKE 'sqlite_stat%' GROUP BY name ORDER BY 2 DESC"
+        )).fetchall())
+    return path.stat().st_size, objects
+
+def timed(engine, sql: str, repeat: int) -> float:
+    """Median milliseconds to run a query and fetch every row"""
+    samples = []
+    with engine.connect() as conn:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(text(sql)).fetchall()
+            samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=1000000)
+    parser.add_argument('--copy-every', type=int, default=25, help='Every Nth file duplicates the one before it')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query; the median is reported')
+    args = parser.parse_args()
+    
+    # Layout: (schema, how a digest is stored, how group number n is stored)
+    layouts = {
+        'hex and UUIDs': (create_old, bytes.hex, lambda number: str(uuid.UUID(int=number))),
+        'blobs and ints': (create_new, bytes, int)
+    }
+    
+    scratch = Path(tempfile.mkdtemp(prefix='hash_storage_bench_'))
+    engines = {}
+    try:
+        for layout, (create, digest, group_id) in layouts.items():
+            path = scratch / f"{layout.replace(' ', '_')}.db"
+            engines[layout] = create_engine(f'sqlite:///{path}')
+            start = time.perf_counter()
+            create(engines[layout])
+            fill(engines[layout], args.files, args.copy_every, digest, group_id)
+            size, objects = storage(engines[layout], path)
+            print(f"\n{layout}: built {args.files} files in {time.perf_counter() - start:.1f}s, "
+                  f"{size / 1024 / 1024:.1f} MB after VACUUM")
+            for name, pages in objects.items():
+                print(f"  {name:>34} {pages / 1024 / 1024:>9.1f} MB")
+        
+        print(f"\n{'query':>30} " + ' '.join(f'{layout + " ms":>17}' for layout in layouts))
+        for label, sql in QUERIES:
+            print(f"{label:>30} " + ' '.join(
+                f'{timed(engines[layout], sql, args.repeat):>17.1f}' for layout in layouts
+            ))
+    finally:
+        for engine in engines.values():
+            engine.dispose()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
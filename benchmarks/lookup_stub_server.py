@@ -0,0 +1,153 @@
+"""
+Local stand-in for the MusicBrainz and AcoustID web services
+
+Usage:
+    python -m benchmarks.lookup_stub_server [--port 8765] [--latency 0.2] [--rate 1]
+
+Answers /ws/2/recording searches and /v2/lookup requests with deterministic
+fake recordings, adds artificial latency and, like the real services,
+replies 503 when requests arrive faster than --rate per second. Point
+enrichment.musicbrainz_url and enrichment.acoustid_url at it to develop or
+benchmark enrichment without network access.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+QUERY_FIELD = re.compile(r'(\w+):"((?:[^"\\]|\\.)*)"')
+
+class StubState:
+    """Request counters and the sliding window used to enforce the rate limit"""
+    
+    def __init__(self, latency: float, rate: Optional[float]):
+        self.latency = latency
+        self.rate = rate
+        self.requests = 0
+        self.rejected = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+    
+    def admit(self) -> bool:
+        """Count a request and decide whether it is within the rate limit"""
+        with self._lock:
+            self.requests += 1
+            if not self.rate:
+                return True
+            
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            
+            # Allow a small burst, as the real services do
+            if len(self._recent) >= max(1, round(self.rate)) + 1:
+                self.rejected += 1
+                return False
+            
+            self._recent.append(now)
+            return True
+
+def _recording(title: str, artist: str) -> dict:
+    """Deterministic fake recording for a title and artist"""
+    mbid = str(uuid.uuid5(uuid.NAMESPACE_URL, f"recording:{artist}:{title}"))
+    return {
+        'id': mbid,
+        'score': 100,
+        'title': title,
+        'length': 200000,
+        'artist-credit': [{'name': artist}],
+        'releases': [{'title': f"{artist} Greatest Hits", 'date': '2001-05-01'}]
+    }
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState = None
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        
+        if url.path == '/stats':
+            return self._send(200, {'requests': self.state.requests, 'rejected': self.state.rejected})
+        
+        if not self.state.admit():
+            return self._send(503, {'error': 'Your requests are exceeding the allowable rate limit'})
+        
+        time.sleep(self.state.latency)
+        
+        if url.path == '/ws/2/recording':
+            fields = {name: value.replace('\\"', '"').replace('\\\\', '\\')
+                      for name, value in QUERY_FIELD.findall(params.get('query', ''))}
+            if 'recording' not in fields:
+                return self._send(400, {'error': 'Invalid query'})
+            recordings = [_recording(fields['recording'], fields.get('artist', 'Unknown Artist'))]
+            return self._send(200, {'count': 1, 'offset': 0, 'recordings': recordings})
+        
+        if url.path == '/v2/lookup':
+            fingerprint = params.get('fingerprint', '')
+            recording = _recording(f"Track {fingerprint[:8]}", 'Fingerprinted Artist')
+            return self._send(200, {'status': 'ok', 'results': [{
+                'id': str(uuid.uuid5(uuid.NAMESPACE_URL, f"acoustid:{fingerprint}")),
+                'score': 0.98,
+                'recordings': [{
+                    'id': recording['id'],
+                    'title': recording['title'],
+                    'duration': 200,
+                    'artists': [{'name': 'Fingerprinted Artist'}],
+                    'releases': [{'title': 'Fingerprinted Album', 'date': {'year': 2001}}]
+                }]
+            }]})
+        
+        self._send(404, {'error': 'Not found'})
+    
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(port: int = 0, latency: float = 0.0, rate: Optional[float] = None) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Run the stub server on a background thread
+    
+    Args:
+        port: Port to listen on (0 picks a free one)
+        latency: Seconds to wait before answering each request
+        rate: Requests per second before answering 503, None for no limit
+    
+    Returns:
+        Tuple of (server, base URL); call server.shutdown() when done
+    """
+    handler = type('BoundStubHandler', (StubHandler,), {'state': StubState(latency, rate)})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds per response')
+    parser.add_argument('--rate', type=float, default=1.0, help='Requests per second before 503 (0 = unlimited)')
+    args = parser.parse_args()
+    
+    server, base_url = start_stub_server(args.port, args.latency, args.rate or None)
+    print(f"Stub lookup server listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark metadata extraction throughput at different worker counts
+
+Usage:
+    python -m benchmarks.metadata_extraction [--files 2000] [--source DIR] [--workers 1 4 8]
+
+Without --source a synthetic library of tagged FLAC and MP3 files is
+generated in a temporary directory. The benchmark always runs against a
+throwaway database, never the configured library.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from config import config
+
+# Point the global database at a scratch file before database.db is imported
+_scratch_dir = Path(tempfile.mkdtemp(prefix='metadata_bench_'))
+config.config.setdefault('database', {})['path'] = str(_scratch_dir / 'bench.db')
+
+import numpy as np
+import soundfile as sf
+from mutagen.flac import FLAC
+from mutagen.id3 import ID3, TIT2, TPE1, TALB, TRCK
+
+from database.db import db_manager
+from database.models import File, Metadata
+from database.directory_tree import locate_paths
+from modules.metadata import MetadataExtractor, FORMAT_PARSERS
+
+def generate_library(target: Path, count: int) -> list:
+    """Write count short tagged audio files, alternating FLAC and MP3"""
+    target.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(0)
+    samples = (rng.standard_normal(44100 * 2) * 0.1).astype(np.float32)
+    
+    templates = {}
+    for suffix, fmt in (('.flac', 'FLAC'), ('.mp3', 'MP3')):
+        templates[suffix] = target / f'template{suffix}'
+        sf.write(str(templates[suffix]), samples, 44100, format=fmt)
+    
+    paths = []
+    for i in range(count):
+        suffix = '.flac' if i % 2 == 0 else '.mp3'
+        path = target / f'Artist {i % 97:02d} - Track {i:05d}{suffix}'
+        shutil.copyfile(templates[suffix], path)
+        
+        if suffix == '.flac':
+            audio = FLAC(str(path))
+            audio['artist'] = f'Artist {i % 97:02d}'
+            audio['album'] = f'Album {i % 500:03d}'
+            audio['title'] = f'Track {i:05d}'
+            audio['tracknumber'] = str(i % 12 + 1)
+            audio.save()
+        else:
+            tags = ID3()
+            tags.add(TPE1(encoding=3, text=f'Artist {i % 97:02d}'))
+            tags.add(TALB(encoding=3, text=f'Album {i % 500:03d}'))
+            tags.add(TIT2(encoding=3, text=f'Track {i:05d}'))
+            tags.add(TRCK(encoding=3, text=str(i % 12 + 1)))
+            tags.save(str(path))
+        
+        paths.append(path)
+    
+    for template in templates.values():
+        template.unlink()
+    
+    return paths
+
+def load_files(paths: list):
+    """Insert file rows directly, skipping hashing so only extraction is timed"""
+    with db_manager.get_session() as session:
+        locations = locate_paths(session, [str(path) for path in paths])
+        session.bulk_insert_mappings(File, [
+            {
+                'directory_id': locations[str(path)][0], 'filename': locations[str(path)][1],
+                'file_size': path.stat().st_size, 'status': 'indexed'
+            }
+            for path in paths
+        ])
+
+def reset_metadata():
+    """Forget extracted metadata so the next run starts from scratch"""
+    with db_manager.get_session() as session:
+        session.query(Metadata).delete()
+        session.query(File).update({'status': 'indexed'})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=2000, help='Synthetic files to generate')
+    parser.add_argument('--source', help='Use the audio files under this directory instead')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    args = parser.parse_args()
+    
+    try:
+        if args.source:
+            paths = [p for p in Path(args.source).rglob('*') if p.suffix.lower() in FORMAT_PARSERS]
+        else:
+            print(f"Generating {args.files} synthetic files...")
+            paths = generate_library(_scratch_dir / 'library', args.files)
+        
+        load_files(paths)
+        print(f"Benchmarking {len(paths)} files")
+        print(f"{'workers':>8} {'seconds':>9} {'files/s':>9} {'speedup':>8}")
+        
+        baseline = None
+        extractor = MetadataExtractor()
+        for workers in args.workers:
+            reset_metadata()
+            start = time.perf_counter()
+            result = extractor.extract_all_metadata(workers=workers)
+            elapsed = time.perf_counter() - start
+            
+            rate = len(paths) / elapsed
+            baseline = baseline or rate
+            failed = f"  ({result['failed']} failed)" if result['failed'] else ''
+            print(f"{workers:>8} {elapsed:>9.2f} {rate:>9.1f} {rate / baseline:>7.2f}x{failed}")
+    
+    finally:
+        db_manager.close()
+        shutil.rmtree(_scratch_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Check that list endpoints issue the same number of queries whatever the page size
+
+Usage:
+    python -m benchmarks.page_queries [--files 100000] [--limits 10 100 500]
+
+Builds the same synthetic library as benchmarks.query_plans, then fetches
+the first and a following page of each list endpoint at every --limits
+page size while counting the SELECT statements it runs. A page that loads
+its rows one at a time issues more queries as the page grows; that, or any
+error response, makes the script exit non-zero.
+"""
+import argparse
+import logging
+import shutil
+import time
+
+from benchmarks.query_plans import _scratch_dir, app, build_library, capture_statements, db_manager
+from fastapi.testclient import TestClient
+
+# List endpoints that load a page of rows: (label, path, query params, key holding the rows)
+PAGED_ENDPOINTS = [
+    ('files', '/api/files', {}, 'files'),
+    ('files by type', '/api/files', {'file_type': 'sample'}, 'files'),
+    ('classifications', '/api/classifications', {}, 'classifications'),
+    ('classifications by type', '/api/classifications', {'file_type': 'stem'}, 'classifications'),
+    ('duplicates', '/api/duplicates', {}, 'duplicates'),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--limits', type=int, nargs='+', default=[10, 100, 500], help='Page sizes to compare')
+    args = parser.parse_args()
+    
+    failures = 0
+    
+    try:
+        start = time.perf_counter()
+        build_library(args.files)
+        print(f"Built {args.files} file library in {time.perf_counter() - start:.1f}s")
+        
+        client = TestClient(app)
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+        print(f"{'endpoint':>24} {'limit':>6} {'rows':>6} {'queries':>8} {'ms':>8} {'next rows':>10} {'next queries':>13} {'next ms':>8}")
+        
+        for label, path, params, key in PAGED_ENDPOINTS:
+            counts = set()
+            for limit in args.limits:
+                line = f"{label:>24} {limit:>6}"
+                cursor = None
+                for rows_width, queries_width in ((6, 8), (10, 13)):
+                    payload = dict(params, limit=limit, cursor=cursor)
+                    elapsed, response, statements = capture_statements(client, 'GET', path, payload)
+                    if response.status_code != 200:
+                        line += f"  status {response.status_code}"
+                        failures += 1
+                        break
+                    
+                    body = response.json()
+                    counts.add(len(statements))
+                    line += f" {len(body[key]):>{rows_width}} {len(statements):>{queries_width}} {elapsed:>8.1f}"
+                    cursor = body.get('next_cursor')
+                    if not cursor:
+                        break
+                print(line)
+            
+            if len(counts) > 1:
+                print(f"{'':>24} query count depends on page size: {sorted(counts)}")
+                failures += 1
+    
+    finally:
+        db_manager.close()
+        shutil.rmtree(_scratch_dir, ignore_errors=True)
+    
+    if failures:
+        raise SystemExit(f"{failures} endpoint(s) failed or issue more queries for larger pages")
+    print("\nQuery count is independent of page size")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Compare full-path storage with the directories table on a synthetic library
+
+Usage:
+    python -m benchmarks.path_storage [--files 1000000] [--repeat 5]
+
+Builds the files and migrations tables twice in throwaway databases: once in
+the old layout, with full absolute paths in files.source_path (UNIQUE),
+migrations.source_path and migrations.target_path, and once in the current
+layout, where each path is a directory id plus a file name. Reports the
+database size after VACUUM with a per-table and per-index breakdown, then
+times the path queries the app runs: exact path lookup (the indexer's
+existence check), subtree totals (the duplicate directory filter), listing
+one folder, and resolving full paths for a page of results.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import bindparam, create_engine, func, select, text
+
+from database.models import Base, Directory, File, Migration
+from database.directory_tree import locate_paths, rebuild_directories, subtree_ids
+from utils.normalize import prefix_upper_bound
+
+SOURCE_ROOT = '/mnt/storage/Music Library/Collection'
+TARGET_ROOT = '/mnt/storage/Music Library/Sorted'
+
+# The tables as they were before paths were normalized, with the same other columns and indexes
+OLD_SCHEMA = [
+    """CREATE TABLE files (
+        id INTEGER PRIMARY KEY,
+        source_path TEXT NOT NULL UNIQUE,
+        file_size INTEGER,
+        modified_date DATETIME,
+        file_hash VARCHAR(32),
+        audio_hash VARCHAR(64),
+        status VARCHAR(20),
+        error_message TEXT,
+        created_at DATETIME
+    )""",
+    'CREATE INDEX ix_files_file_hash ON files (file_hash, file_size)',
+    'CREATE INDEX ix_files_audio_hash ON files (audio_hash) WHERE audio_hash IS NOT NULL',
+    'CREATE INDEX ix_files_status ON files (status, file_size)',
+    'CREATE INDEX ix_files_created_at ON files (created_at)',
+    'CREATE INDEX ix_files_file_size ON files (file_size)',
+    """CREATE TABLE migrations (
+        id INTEGER PRIMARY KEY,
+        file_id INTEGER REFERENCES files (id),
+        source_path TEXT,
+        target_path TEXT,
+        status VARCHAR(20),
+        started_at DATETIME,
+        completed_at DATETIME,
+        error TEXT
+    )""",
+    'CREATE INDEX ix_migrations_file_status ON migrations (file_id, status)',
+    'CREATE INDEX ix_migrations_status ON migrations (status, completed_at)',
+    "CREATE INDEX ix_migrations_completed_path ON migrations (target_path) WHERE status = 'completed'",
+]
+
+def library_paths(files: int):
+    """(source path, target path, size) per file: ten tracks an album, ten albums an artist"""
+    for i in range(files):
+        artist, album, track = i // 100, i // 10 % 10, i % 10
+        name = f'{track + 1:02d} - Track Title {i:07d}.flac'
+        yield (
+            f'{SOURCE_ROOT}/Artist {artist:05d}/Album {album} ({1970 + album})/{name}',
+            f'{TARGET_ROOT}/Artist {artist:05d}/Album {album}/{name}',
+            20 * 1024 * 1024 + i
+        )
+
+def insert_chunks(conn, sql: str, rows, chunk_size: int = 50000):
+    """executemany in chunks so the generator is never fully materialized"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            conn.exec_driver_sql(sql, chunk)
+            chunk = []
+    if chunk:
+        conn.exec_driver_sql(sql, chunk)
+
+def build_old(engine, files: int):
+    """Fill the old layout"""
+    with engine.begin() as conn:
+        for statement in OLD_SCHEMA:
+            conn.execute(text(statement))
+        insert_chunks(conn, "INSERT INTO files (id, source_path, file_size, status) VALUES (?, ?, ?, 'migrated')", (
+            (i + 1, source, size) for i, (source, _, size) in enumerate(library_paths(files))
+        ))
+        insert_chunks(conn, "INSERT INTO migrations (file_id, source_path, target_path, status) "
+                            "VALUES (?, ?, ?, 'completed')", (
+            (i + 1, source, target) for i, (source, target, _) in enumerate(library_paths(files))
+        ))
+
+def build_new(engine, files: int):
+    """Fill the current layout through the same helpers the indexer and migrator use"""
+    Base.metadata.create_all(engine, tables=[Directory.__table__, File.__table__, Migration.__table__])
+    with engine.begin() as conn:
+        paths = list(library_paths(files))
+        sources = locate_paths(conn, [source for source, _, _ in paths])
+        insert_chunks(conn, "INSERT INTO files (id, directory_id, filename, file_size, status) "
+                            "VALUES (?, ?, ?, ?, 'migrated')", (
+            (i + 1, *sources[source], size) for i, (source, _, size) in enumerate(paths)
+        ))
+        del sources
+        targets = locate_paths(conn, [target for _, target, _ in paths])
+        insert_chunks(conn, "INSERT INTO migrations (file_id, target_directory_id, target_filename, status) "
+                            "VALUES (?, ?, ?, 'completed')", (
+            (i + 1, *targets[target]) for i, (_, target, _) in enumerate(paths)
+        ))
+        rebuild_directories(conn)
+
+def storage(engine, path: Path) -> tuple:
+    """(file size in bytes, {table or index: bytes}) after VACUUM"""
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text('VACUUM'))
+        objects = dict(conn.execute(text(
+            "SELECT name, sum(pgsize) FROM dbstat WHERE name NOT IN ('sqlite_schema', 'sqlite_master') "
+            "GROUP BY name ORDER BY 2 DESC"
+        )).fetchall())
+    return path.stat().st_size, objects
+
+def timed(conn, statement, params_list, repeat: int) -> float:
+    """Median milliseconds to run statement once per params entry"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for params in params_list:
+            conn.execute(statement, params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def query_times(old, new, files: int, repeat: int) -> list:
+    """(label, old ms, new ms) for each path query"""
+    sample = [paths for i, paths in enumerate(library_paths(files)) if i % max(files // 1000, 1) == 0]
+    artist_dir = os.path.dirname(os.path.dirname(sample[len(sample) // 2][0]))
+    album_dir = os.path.dirname(sample[len(sample) // 2][0])
+    page = list(range(files // 2, files // 2 + 100))
+    
+    old_conn, new_conn = old.connect(), new.connect()
+    results = []
+    try:
+        results.append((
+            f'exact path lookup x{len(sample)}',
+            timed(old_conn, text('SELECT id FROM files WHERE source_path = :path'),
+                  [{'path': source} for source, _, _ in sample], repeat),
+            timed(new_conn, select(File.id).join(Directory, Directory.id == File.directory_id).where(
+                      Directory.path == bindparam('directory'), File.filename == bindparam('name')
+                  ), [{'directory': os.path.dirname(source), 'name': os.path.basename(source)}
+                      for source, _, _ in sample], repeat)
+        ))
+        
+        for label, directory in (('artist subtree totals', artist_dir), ('root subtree totals', SOURCE_ROOT)):
+            prefix = directory + '/'
+            results.append((
+                f'{label}: LIKE / subtree ids',
+                timed(old_conn, text("SELECT count(*), sum(file_size) FROM files WHERE source_path LIKE :pattern ESCAPE '/'"),
+                      [{'pattern': prefix.replace('/', '//').replace('%', '/%').replace('_', '/_') + '%'}], repeat),
+                timed(new_conn, select(func.count(), func.sum(File.file_size)).where(
+                      File.directory_id.in_(subtree_ids(directory))), [{}], repeat)
+            ))
+            results.append((
+                f'{label}: path range / rolled-up',
+                timed(old_conn, text('SELECT count(*), sum(file_size) FROM files '
+                                     'WHERE source_path >= :low AND source_path < :high'),
+                      [{'low': prefix, 'high': prefix_upper_bound(prefix)}], repeat),
+                timed(new_conn, select(Directory.file_count, Directory.total_bytes).where(
+                      Directory.path == directory), [{}], repeat)
+            ))
+        
+        prefix = album_dir + '/'
+        results.append((
+            'list one folder',
+            timed(old_conn, text("SELECT id, source_path FROM files WHERE source_path >= :low AND source_path < :high "
+                                 "AND instr(substr(source_path, length(:low) + 1), '/') = 0"),
+                  [{'low': prefix, 'high': prefix_upper_bound(prefix)}], repeat),
+            timed(new_conn, select(File.id, File.source_path).join(Directory, Directory.id == File.directory_id).where(
+                      Directory.path == album_dir), [{}], repeat)
+        ))
+        
+        results.append((
+            'full paths for a page of 100',
+            timed(old_conn, text('SELECT f.source_path, m.target_path FROM files f '
+                                 'LEFT JOIN migrations m ON m.file_id = f.id '
+                                 'WHERE f.id IN (SELECT value FROM json_each(:ids))'),
+                  [{'ids': str(page)}], repeat),
+            timed(new_conn, select(File.source_path, Migration.target_path).outerjoin(
+                      Migration, Migration.file_id == File.id
+                  ).where(File.id.in_(page)), [{}], repeat)
+        ))
+    finally:
+        old_conn.close()
+        new_conn.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query; the median is reported')
+    args = parser.parse_args()
+    
+    scratch = Path(tempfile.mkdtemp(prefix='path_storage_bench_'))
+    engines = {}
+    try:
+        for layout, build in (('full paths', build_old), ('directories', build_new)):
+            path = scratch / f"{layout.replace(' ', '_')}.db"
+            engines[layout] = create_engine(f'sqlite:///{path}')
+            start = time.perf_counter()
+            build(engines[layout], args.files)
+            size, objects = storage(engines[layout], path)
+            print(f"\n{layout}: built {args.files} files in {time.perf_counter() - start:.1f}s, "
+                  f"{size / 1024 / 1024:.1f} MB after VACUUM")
+            for name, pages in objects.items():
+                print(f"  {name:>36} {pages / 1024 / 1024:>9.1f} MB")
+        
+        print(f"\n{'query':>44} {'full paths ms':>14} {'directories ms':>15}")
+        for label, old_ms, new_ms in query_times(engines['full paths'], engines['directories'], args.files, args.repeat):
+            print(f"{label:>44} {old_ms:>14.2f} {new_ms:>15.2f}")
+    finally:
+        for engine in engines.values():
+            engine.dispose()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""
+Check that every library query is index-backed on a large synthetic database
+
+Usage:
+    python -m benchmarks.query_plans [--files 1000000] [--show-plans]
+
+Builds a throwaway library of --files tracks (with metadata, analysis,
+classifications, duplicates and migrations), calls each read endpoint
+through the API while capturing the SQL it issues, and runs EXPLAIN QUERY
+PLAN on every statement. A statement that scans a table row by row, or
+walks a whole index only to sort the result afterwards, is reported with
+its plan and makes the script exit non-zero. Full passes over a covering
+index are counted but allowed: they are how whole-library aggregates are
+meant to run. Known exceptions are listed in ALLOWED_SCANS with the
+reason they cannot be index-driven yet.
+"""
+import argparse
+import logging
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from config import config
+
+# Point the global database at a scratch file before database.db is imported
+_scratch_dir = Path(tempfile.mkdtemp(prefix='query_plan_bench_'))
+config.config.setdefault('database', {})['path'] = str(_scratch_dir / 'bench.db')
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+from database.db import db_manager
+from database.directory_tree import locate_paths, rebuild_directories
+from utils.normalize import normalize_name
+from app import app
+
+GENRES = ['Rock', 'Pop', 'Jazz', 'Electronic', 'Hip Hop', 'Classical', 'Folk', 'Metal', 'Ambient', 'Soul']
+KEYS = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+FORMATS = ['mp3', 'flac', 'wav', 'm4a']
+FILE_TYPES = ['song', 'sample', 'stem', 'unknown']
+
+# Read endpoints as the UI calls them: (label, method, path, query params or JSON body)
+ENDPOINTS = [
+    ('search default page', 'POST', '/api/library/search', {}),
+    ('search text', 'POST', '/api/library/search', {'search_query': 'golden river'}),
+    ('search text by relevance', 'POST', '/api/library/search', {'search_query': 'golden', 'sort_by': 'relevance'}),
+    ('search artist filter', 'POST', '/api/library/search', {'artist': 'artist 12'}),
+    ('search album filter', 'POST', '/api/library/search', {'album': 'album 3'}),
+    ('search genre filter', 'POST', '/api/library/search', {'genre': 'Jazz'}),
+    ('search year range', 'POST', '/api/library/search', {'year_from': 1990, 'year_to': 1992}),
+    ('search bpm range', 'POST', '/api/library/search', {'bpm_min': 126, 'bpm_max': 128}),
+    ('search key', 'POST', '/api/library/search', {'key_signature': 'F#', 'sort_by': 'bpm'}),
+    ('search status', 'POST', '/api/library/search', {'status': 'error'}),
+    ('search size range', 'POST', '/api/library/search', {'size_min_mb': 40, 'sort_by': 'size'}),
+    ('search has duplicates', 'POST', '/api/library/search', {'has_duplicates': True}),
+    ('search newest first', 'POST', '/api/library/search', {'sort_by': 'date_added', 'sort_order': 'desc'}),
+    ('search path order', 'POST', '/api/library/search', {'sort_by': 'path'}),
+    ('artists', 'GET', '/api/library/artists', None),
+    ('albums', 'GET', '/api/library/albums', None),
+    ('albums by artist', 'GET', '/api/library/albums', {'artist': 'artist 7'}),
+    ('genres', 'GET', '/api/library/genres', None),
+    ('autocomplete', 'GET', '/api/library/autocomplete', {'field': 'artist', 'q': 'artist 4'}),
+    ('statistics', 'GET', '/api/library/statistics', None),
+    ('folders', 'GET', '/api/library/folders', None),
+    ('folder children', 'GET', '/api/library/folders', {'base_path': '/target/Artist 1'}),
+    ('recent', 'GET', '/api/library/recent', None),
+    ('stats', 'GET', '/api/stats', None),
+    ('files', 'GET', '/api/files', None),
+    ('files by type', 'GET', '/api/files', {'file_type': 'sample'}),
+    ('classifications', 'GET', '/api/classifications', {'file_type': 'stem'}),
+    ('classification stats', 'GET', '/api/classifications/stats', None),
+    ('duplicates', 'GET', '/api/duplicates', None),
+    ('duplicates by format', 'GET', '/api/duplicates', {'format': 'flac', 'sort_by': 'count'}),
+    ('migration status', 'GET', '/api/migrate/status', None),
+]
+
+# Endpoints allowed to make a full pass, and why
+ALLOWED_SCANS = {
+    'search default page': 'artist order spans files without metadata, so it cannot follow a metadata index',
+    'files': 'the unfiltered page walks the files table in id order and stops at the limit',
+}
+
+# Tables whose size does not grow with the library, so reading them whole is fine
+SUMMARY_TABLES = {'library_stats'}
+
+TABLE_SCAN = re.compile(r'^SCAN (\w+)$')
+INDEX_SCAN = re.compile(r'^SCAN (\w+) USING INDEX (\w+)')
+COVERING_SCAN = re.compile(r'^SCAN (\w+) USING COVERING INDEX (\w+)')
+SORTED_AFTERWARDS = 'USE TEMP B-TREE FOR ORDER BY'
+
+def insert_chunks(conn, sql: str, rows, chunk_size: int = 50000):
+    """executemany in chunks so the generator is never fully materialized"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            conn.exec_driver_sql(sql, chunk)
+            chunk = []
+    if chunk:
+        conn.exec_driver_sql(sql, chunk)
+
+def build_library(files: int):
+    """Fill every table the read endpoints touch"""
+    rng = random.Random(0)
+    artists = max(files // 20, 1)
+    start = datetime(2020, 1, 1)
+    
+    def source_path(i):
+        return f'/music/Artist {i % artists}/Album {i % 7}/{i:07d} Track.{FORMATS[i % 4]}'
+    
+    def target_path(i):
+        return f'/target/Artist {i % artists}/Album {i % 7}/{i:07d} Track.mp3'
+    
+    def file_rows(locations):
+        for i in range(1, files + 1):
+            # Every 25th file is a copy of the one before it
+            content = i - 1 if i % 25 == 0 else i
+            yield (
+                i, *locations[source_path(i)],
+                rng.randint(2, 60) * 1024 * 1024, content.to_bytes(16, 'big'),
+                'error' if i % 997 == 0 else 'analyzed', start + timedelta(seconds=i)
+            )
+    
+    def metadata_rows():
+        for i in range(1, files + 1):
+            artist = f'Artist {i % artists}'
+            album = f'Album {i % 7}'
+            genre = GENRES[i % len(GENRES)]
+            title = f'{rng.choice(["Golden", "River", "Night", "Blue", "Fire"])} {rng.choice(["Road", "Light", "River", "Song"])} {i}'
+            yield (
+                i, artist, album, title, 1960 + i % 60, genre, FORMATS[i % 4], 180.0 + i % 120,
+                normalize_name(artist), normalize_name(album), normalize_name(genre)
+            )
+    
+    with db_manager.engine.begin() as conn:
+        insert_chunks(conn, 'INSERT INTO files (id, directory_id, filename, file_size, file_hash, status, created_at) '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                      file_rows(locate_paths(conn, [source_path(i) for i in range(1, files + 1)])))
+        insert_chunks(conn, 'INSERT INTO metadata (file_id, artist, album, title, year, genre, format, duration_seconds, '
+                            'artist_key, album_key, genre_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', metadata_rows())
+        insert_chunks(conn, 'INSERT INTO audio_analysis (file_id, bpm, key_signature, energy) VALUES (?, ?, ?, ?)', (
+            (i, round(rng.uniform(60, 180), 1), KEYS[i % 12], rng.random()) for i in range(1, files + 1, 2)
+        ))
+        insert_chunks(conn, 'INSERT INTO classifications (file_id, file_type, confidence) VALUES (?, ?, ?)', (
+            (i, FILE_TYPES[i % 4], rng.random()) for i in range(1, files + 1)
+        ))
+        
+        group_ids = {i: i // 25 for i in range(25, files + 1, 25)}
+        insert_chunks(conn, 'INSERT INTO duplicate_groups (group_id, file_count, total_bytes, reclaimable_bytes, '
+                            'primary_file_id, reasons) VALUES (?, 2, ?, ?, ?, ?)', (
+            (group_id, 2 * 1024 * 1024 * (i % 50 + 1), 1024 * 1024 * (i % 50 + 1), i - 1, 'file_hash')
+            for i, group_id in group_ids.items()
+        ))
+        insert_chunks(conn, 'INSERT INTO duplicates (group_id, file_id, is_primary, quality_score) VALUES (?, ?, ?, ?)', (
+            row for i, group_id in group_ids.items()
+            for row in ((group_id, i - 1, 1, 80), (group_id, i, 0, 60))
+        ))
+        conn.execute(text('UPDATE files SET dup_count = 2, is_primary = duplicates.is_primary '
+                          'FROM duplicates WHERE duplicates.file_id = files.id'))
+        targets = locate_paths(conn, [target_path(i) for i in range(1, files + 1, 3)])
+        insert_chunks(conn, 'INSERT INTO migrations (file_id, target_directory_id, target_filename, status, completed_at) '
+                            'VALUES (?, ?, ?, ?, ?)', (
+            (i, *targets[target_path(i)], 'completed', start + timedelta(seconds=i))
+            for i in range(1, files + 1, 3)
+        ))
+        
+        rebuild_directories(conn)
+        
+        conn.execute(text('PRAGMA analysis_limit=1000'))
+        conn.execute(text('ANALYZE'))
+
+def capture_statements(client: TestClient, method: str, path: str, payload) -> tuple:
+    """Call an endpoint and return (elapsed ms, response, SELECT statements it ran)"""
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append((statement, parameters))
+    
+    event.listen(db_manager.engine, 'before_cursor_execute', record)
+    try:
+        start = time.perf_counter()
+        if method == 'GET':
+            response = client.get(path, params=payload)
+        else:
+            response = client.post(path, json=payload)
+        elapsed = (time.perf_counter() - start) * 1000
+    finally:
+        event.remove(db_manager.engine, 'before_cursor_execute', record)
+    
+    return elapsed, response, statements
+
+def explain(statement: str, parameters) -> list:
+    """EXPLAIN QUERY PLAN detail lines for a captured statement"""
+    with db_manager.engine.connect() as conn:
+        return [row[3] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+
+def full_passes(plan: list, tables: set) -> tuple:
+    """
+    Classify the scans in a plan
+    
+    Returns:
+        (covering index passes, offending plan lines)
+    """
+    covering = 0
+    offending = []
+    for detail in plan:
+        table_scan = TABLE_SCAN.match(detail)
+        index_scan = INDEX_SCAN.match(detail)
+        if table_scan and table_scan.group(1) in tables:
+            offending.append(detail)
+        elif index_scan and SORTED_AFTERWARDS in plan:
+            # The index supplied neither the filter nor the order, so every row is visited
+            offending.append(detail)
+        elif COVERING_SCAN.match(detail):
+            covering += 1
+    return covering, offending
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=1000000)
+    parser.add_argument('--show-plans', action='store_true', help='Print the plan of every statement')
+    args = parser.parse_args()
+    
+    failures = 0
+    
+    try:
+        start = time.perf_counter()
+        build_library(args.files)
+        print(f"Built {args.files} file library in {time.perf_counter() - start:.1f}s")
+        
+        tables = {name for (name,) in db_manager.engine.connect().exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )} - SUMMARY_TABLES
+        
+        client = TestClient(app)
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+        print(f"{'endpoint':>28} {'ms':>9} {'queries':>8} {'index passes':>13} {'full passes':>12}")
+        
+        for label, method, path, payload in ENDPOINTS:
+            elapsed, response, statements = capture_statements(client, method, path, payload)
+            index_passes = 0
+            scans = []
+            
+            for statement, parameters in statements:
+                plan = explain(statement, parameters)
+                covering, offending = full_passes(plan, tables)
+                index_passes += covering
+                if offending:
+                    scans.append((statement, plan))
+                
+                if args.show_plans:
+                    print(f"\n{statement}\n  " + "\n  ".join(plan))
+            
+            flag = '' if response.status_code == 200 else f'  HTTP {response.status_code}'
+            if scans and label in ALLOWED_SCANS:
+                flag += f'  allowed: {ALLOWED_SCANS[label]}'
+            print(f"{label:>28} {elapsed:>9.1f} {len(statements):>8} {index_passes:>13} {len(scans):>12}{flag}")
+            
+            if label not in ALLOWED_SCANS:
+                for statement, plan in scans:
+                    failures += 1
+                    print(f"    full pass in:\n      {' '.join(statement.split())}")
+                    print("      plan: " + "\n            ".join(plan))
+            if response.status_code != 200:
+                failures += 1
+    
+    finally:
+        db_manager.close()
+        shutil.rmtree(_scratch_dir, ignore_errors=True)
+    
+    if failures:
+        print(f"{failures} statements fell back to full scans or failed")
+        sys.exit(1)
+    print("No unexpected full scans")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Compare library searches through SQL with the in-memory columnar read model
+
+Usage:
+    python -m benchmarks.read_model [--files 1000000] [--repeat 5]
+
+Builds the same synthetic library as benchmarks.query_plans, loads the read
+model and reports its load time and memory. Then runs each library-browser
+search three ways: the SQL search the endpoint falls back to, the read
+model's filter and page selection alone, and the whole endpoint with the
+read model (which still loads the page of rows from SQLite), plus a
+repeat of the same request answered from the search response cache. Every
+search is checked to return the same page and total both ways. The facet counts
+are compared and timed the same way, grouped SQL against bincounts over the
+mask. Finally it updates a batch of files and times the incremental refresh
+from the change log.
+"""
+import argparse
+import asyncio
+import shutil
+import statistics
+import time
+
+from benchmarks.query_plans import _scratch_dir, build_library, db_manager
+from sqlalchemy import text
+
+from api import search_routes
+from api.search_routes import SearchFilters, search_library
+
+SEARCHES = [
+    ('default page', {}),
+    ('artist filter', {'artist': 'artist 12'}),
+    ('album filter', {'album': 'album 3'}),
+    ('genre filter', {'genre': 'Jazz'}),
+    ('year range', {'year_from': 1990, 'year_to': 1992}),
+    ('bpm range', {'bpm_min': 126, 'bpm_max': 128}),
+    ('key by bpm', {'key_signature': 'F', 'sort_by': 'bpm'}),
+    ('size by size', {'size_min_mb': 40, 'sort_by': 'size'}),
+    ('has duplicates', {'has_duplicates': True}),
+    ('newest first', {'sort_by': 'date_added', 'sort_order': 'desc'}),
+    ('genre, decade, bpm', {'genre': 'Pop', 'year_from': 1970, 'year_to': 1979, 'bpm_min': 100, 'bpm_max': 140}),
+]
+
+def run_search(payload: dict, use_model: bool, cached: bool = False) -> dict:
+    """Call the search endpoint with or without the read model, bypassing the total and response caches unless cached"""
+    saved = search_routes.read_model
+    search_routes.read_model = saved if use_model else None
+    if not cached:
+        search_routes._total_cache.clear()
+        search_routes._search_cache.clear()
+    try:
+        return asyncio.run(search_library(SearchFilters(**payload)))
+    finally:
+        search_routes.read_model = saved
+
+def timed(function, repeat: int) -> float:
+    """Median milliseconds of repeat calls"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per search; the median is reported')
+    args = parser.parse_args()
+    
+    model = search_routes.read_model
+    if model is None:
+        raise SystemExit("library.read_model is off in config.yaml")
+    
+    try:
+        start = time.perf_counter()
+        build_library(args.files)
+        print(f"Built {args.files} file library in {time.perf_counter() - start:.1f}s")
+        
+        start = time.perf_counter()
+        model.load()
+        memory = sum(column.nbytes for column in model.columns.values())
+        print(f"Loaded read model in {time.perf_counter() - start:.1f}s, {memory / 1024 / 1024:.1f} MB of arrays")
+        
+        generation = db_manager.get_generation()
+        print(f"\n{'search':>20} {'matches':>9} {'SQL ms':>9} {'mask+page ms':>13} {'endpoint ms':>12} {'cached ms':>10}")
+        for label, payload in SEARCHES:
+            sql_page, model_page = run_search(payload, False), run_search(payload, True)
+            if ([row['id'] for row in sql_page['results']], sql_page['total']) != \
+                    ([row['id'] for row in model_page['results']], model_page['total']):
+                raise SystemExit(f"{label}: read model page differs from SQL")
+            
+            filters = SearchFilters(**payload)
+            print(f"{label:>20} {model_page['total']:>9} "
+                  f"{timed(lambda: run_search(payload, False), args.repeat):>9.1f} "
+                  f"{timed(lambda: model.search(filters, None, generation), args.repeat):>13.2f} "
+                  f"{timed(lambda: run_search(payload, True), args.repeat):>12.1f} "
+                  f"{timed(lambda: run_search(payload, True, cached=True), args.repeat):>10.2f}")
+        
+        print(f"\n{'facets':>20} {'SQL ms':>9} {'bincount ms':>12}")
+        with db_manager.get_session() as session:
+            for label, payload in SEARCHES:
+                filters = SearchFilters(**payload)
+                if search_routes._facet_counts(session, filters) != model.facets(filters, generation):
+                    raise SystemExit(f"{label}: read model facets differ from SQL")
+                print(f"{label:>20} "
+                      f"{timed(lambda: search_routes._facet_counts(session, filters), args.repeat):>9.1f} "
+                      f"{timed(lambda: model.facets(filters, generation), args.repeat):>12.2f}")
+        
+        # Incremental refresh: re-tag a batch of files, then search once
+        changed = min(10000, args.files)
+        with db_manager.engine.begin() as conn:
+            conn.execute(text('UPDATE audio_analysis SET bpm = bpm + 1 WHERE file_id <= :n'), {'n': changed})
+            conn.execute(text("UPDATE metadata SET genre = 'Jazz', genre_key = 'jazz' WHERE file_id <= :n"), {'n': changed})
+        start = time.perf_counter()
+        model.search(SearchFilters(), None, db_manager.get_generation())
+        print(f"\nRefreshed {changed} changed files from the change log in {(time.perf_counter() - start) * 1000:.1f} ms")
+    
+    finally:
+        db_manager.close()
+        shutil.rmtree(_scratch_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
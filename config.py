@@ -22,7 +22,9 @@ class Config:
         return {
             "source": {
                 "batch_size": 100,
-                "io_threads": 1
+                "io_threads": 1,
+                "index_tags": False,
+                "tail_read_kb": 128
             },
             "target": {
                 "io_threads": 4,
@@ -50,12 +52,57 @@ class Config:
                     "feature_extractors": ["duration", "file_size", "path_keywords", "filename_patterns"]
                 }
             },
+            "metadata": {
+                "workers": 4,
+                "write_batch_size": 1000,
+                "folder_inference": True,
+                "tag_cache": True,
+                "tag_cache_path": "tag_cache.db"
+            },
+            "artwork": {
+                "enabled": True,
+                "store_path": "artwork",
+                "thumbnail_size": 300
+            },
+            "fingerprint": {
+                "enabled": False,
+                "sample_rate": 11025,
+                "max_seconds": 60,
+                "num_hashes": 32,
+                "rows_per_band": 1,
+                "max_bucket_size": 50,
+                "ber_threshold": 0.25
+            },
+            "fuzzy_matching": {
+                "enabled": True,
+                "prefix_length": 4,
+                "duration_tolerance_seconds": 2,
+                "min_similarity": 0.85,
+                "max_block_size": 200
+            },
+            "migration": {
+                "verify": True,
+                "verify_mode": "full"
+            },
             "audio_analysis": {
                 "enabled": True,
                 "bpm_detection": True,
                 "key_detection": True,
                 "batch_size": 10
             },
+            "enrichment": {
+                "enabled": False,
+                "concurrency": 4,
+                "musicbrainz_url": "https://musicbrainz.org",
+                "musicbrainz_rate": 1.0,
+                "acoustid_url": "https://api.acoustid.org",
+                "acoustid_rate": 3.0,
+                "use_acoustid": False,
+                "min_score": 90,
+                "duration_tolerance_seconds": 5,
+                "cache_path": "lookup_cache.db",
+                "cache_ttl_days": 30
+            },
             "api_keys": {
                 "acoustid": "",
                 "musicbrainz_user_agent": "MusicSorter/1.0"
@@ -63,6 +110,11 @@ class Config:
             "database": {
                 "path": "music_library.db"
             },
+            "library": {
+                "read_model": True,
+                "change_log_keep": 100000,
+                "search_cache_size": 256
+            },
             "logging": {
                 "level": "INFO",
                 "file": "music_sorter.log"
@@ -0,0 +1,107 @@
+"""Log of changed file ids, kept by SQLite triggers for the in-memory read model"""
+from typing import List, Tuple
+import logging
+import time
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Columns the read model holds, per table, with the column naming the file
+WATCHED_COLUMNS = {
+    'files': ('id', ['file_size', 'status', 'dup_count', 'created_at']),
+    'metadata': ('file_id', ['artist', 'album', 'genre', 'year', 'format']),
+    'audio_analysis': ('file_id', ['bpm', 'key_signature'])
+}
+
+def _triggers(table: str, file_id: str, columns: List[str]) -> List[str]:
+    """Insert, delete and update triggers logging the file id of every changed row of a table"""
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS library_changes_{table}_insert AFTER INSERT ON {table} BEGIN
+        INSERT INTO library_changes(file_id) VALUES (new.{file_id});
+    END""",
+        f"""CREATE TRIGGER IF NOT EXISTS library_changes_{table}_delete AFTER DELETE ON {table} BEGIN
+        INSERT INTO library_changes(file_id) VALUES (old.{file_id});
+    END""",
+        f"""CREATE TRIGGER IF NOT EXISTS library_changes_{table}_update AFTER UPDATE OF {', '.join(columns)} ON {table} BEGIN
+        INSERT INTO library_changes(file_id) VALUES (new.{file_id});
+    END"""
+    ]
+
+# AUTOINCREMENT keeps sequence numbers gap-free and never reused, so a reader can tell whether it missed any
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS library_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        file_id INTEGER NOT NULL
+    )"""
+] + [
+    statement
+    for table, (file_id, columns) in WATCHED_COLUMNS.items()
+    for statement in _triggers(table, file_id, columns)
+]
+
+TRIGGERS = [
+    f'library_changes_{table}_{event}'
+    for table in WATCHED_COLUMNS for event in ('insert', 'delete', 'update')
+]
+
+DROP = [f'DROP TRIGGER IF EXISTS {name}' for name in TRIGGERS] + ['DROP TABLE IF EXISTS library_changes']
+
+def create_change_log(conn):
+    """
+    Create the change log table and its triggers
+    
+    A new table starts numbering at the current time in microseconds, so a
+    log dropped and created again (a reset) never reuses the numbers of the
+    old one and readers notice the gap.
+    
+    Args:
+        conn: Connection inside a transaction
+    """
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'library_changes'"
+    )).first() is not None
+    
+    for statement in SCHEMA:
+        conn.execute(text(statement))
+    
+    if not exists:
+        conn.execute(text(
+            "INSERT INTO sqlite_sequence(name, seq) VALUES ('library_changes', :start)"
+        ), {'start': int(time.time() * 1000000)})
+
+def drop_change_log(conn):
+    """Drop the change log and the triggers that feed it"""
+    for statement in DROP:
+        conn.execute(text(statement))
+
+def last_change(conn) -> int:
+    """Sequence number of the newest change ever logged, 0 if none"""
+    return conn.execute(text(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'library_changes'"
+    )).scalar() or 0
+
+def read_changes(conn, after: int, upto: int) -> Tuple[List[int], bool]:
+    """
+    Files changed between two sequence numbers
+    
+    Args:
+        conn: Connection or session
+        after: Last sequence number already applied
+        upto: Newest sequence number to read, from last_change()
+    
+    Returns:
+        Tuple of (distinct file ids, whether every change in the range was
+        still in the log); a reader that finds changes pruned or the log
+        recreated has to reload from the tables
+    """
+    if upto < after:
+        return [], False
+    rows = conn.execute(text(
+        'SELECT file_id FROM library_changes WHERE seq > :after AND seq <= :upto'
+    ), {'after': after, 'upto': upto}).fetchall()
+    return list({file_id for (file_id,) in rows}), len(rows) == upto - after
+
+def prune_changes(conn, upto: int):
+    """Delete changes up to and including a sequence number"""
+    conn.execute(text('DELETE FROM library_changes WHERE seq <= :upto'), {'upto': upto})
@@ -1,21 +1,50 @@
 """Database connection and session management"""
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, Session
 from contextlib import contextmanager
 from pathlib import Path
+import sqlite3
+import threading
 import logging
 from typing import Generator
 
 from database.models import Base
+from database.search_index import create_search_index, drop_search_index
+from database.library_stats import create_library_stats, drop_library_stats
+from database.change_log import create_change_log, drop_change_log, last_change, prune_changes
+from database.directory_tree import locate_paths, rebuild_directories
+from utils.normalize import SEARCH_KEY_COLUMNS, normalize_name
 from config import config
 
 logger = logging.getLogger(__name__)
 
+# Columns stored in a different form than older versions used, and the SQL converting an old value
+GROUP_NUMBER = '(SELECT number FROM temp.group_numbers WHERE uuid = old.group_id)'
+RETYPED_COLUMNS = {
+    ('files', 'file_hash'): 'hex_to_blob(old.file_hash)',
+    ('files', 'audio_hash'): 'hex_to_blob(old.audio_hash)',
+    ('duplicates', 'group_id'): GROUP_NUMBER,
+    ('duplicate_groups', 'group_id'): GROUP_NUMBER,
+    ('duplicate_matches', 'group_id'): GROUP_NUMBER
+}
+
+def _hex_to_blob(value):
+    """Raw bytes of a hex digest, for converting old hash columns"""
+    try:
+        return bytes.fromhex(value) if isinstance(value, str) else value
+    except ValueError:
+        return None
+
 class DatabaseManager:
     def __init__(self):
         self.db_path = config.get('database.path', 'music_library.db')
         self.engine = None
         self.SessionLocal = None
+        self.search_index_enabled = False
+        self.read_model_enabled = config.get('library.read_model', True)
+        self.change_log_keep = config.get('library.change_log_keep', 100000)
+        self._generation_conn = None
+        self._generation_lock = threading.Lock()
         self.init_database()
     
     def init_database(self):
@@ -34,11 +63,258 @@ class DatabaseManager:
         # Create tables
         Base.metadata.create_all(bind=self.engine)
         
+        # Bring tables created by older versions up to date
+        self.upgrade_schema()
+        
+        # Full-text index for library search, maintained by triggers
+        with self.engine.begin() as conn:
+            self.search_index_enabled = create_search_index(conn)
+        
+        # Running totals for the statistics endpoint, also maintained by triggers
+        with self.engine.begin() as conn:
+            create_library_stats(conn)
+        
+        # Change log the in-memory search read model catches up from; not kept when the model is off
+        with self.engine.begin() as conn:
+            if self.read_model_enabled:
+                create_change_log(conn)
+            else:
+                drop_change_log(conn)
+        
         # Create session factory
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
         
         logger.info(f"Database initialized at {self.db_path}")
     
+    def upgrade_schema(self):
+        """Add columns and indexes that are missing from existing tables, and convert retyped ones"""
+        inspector = inspect(self.engine)
+        added = set()
+        
+        # SQLite cannot change a column's type, so tables with a retyped column are rebuilt
+        rebuilt = self.retyped_tables(inspector)
+        
+        with self.engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                existing = {col['name'] for col in inspector.get_columns(table.name)}
+                
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    
+                    # SQLite can only add nullable columns without constraints; a constant default fills existing rows
+                    column_type = column.type.compile(dialect=self.engine.dialect)
+                    if column.server_default is not None:
+                        column_type += f' DEFAULT {column.server_default.arg.text}'
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    logger.info(f"Added column {table.name}.{column.name}")
+                    added.add(f"{table.name}.{column.name}")
+                
+                existing_indexes = {ix['name'] for ix in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in existing_indexes:
+                        index.create(bind=conn, checkfirst=True)
+                        added.add(index.name)
+            
+            new_keys = [key for key in SEARCH_KEY_COLUMNS.values() if f"metadata.{key}" in added]
+            if new_keys:
+                self.backfill_search_keys(conn, new_keys)
+            
+            if 'files.dup_count' in added:
+                # Duplicate groups found before the columns existed; duplicate_groups may still be empty then
+                conn.execute(text(
+                    "UPDATE files SET dup_count = sizes.file_count, is_primary = duplicates.is_primary "
+                    "FROM duplicates JOIN ("
+                    "SELECT group_id, count(*) AS file_count FROM duplicates GROUP BY group_id"
+                    ") AS sizes ON sizes.group_id = duplicates.group_id "
+                    "WHERE duplicates.file_id = files.id"
+                ))
+            
+            if 'fingerprints.pcm_frames' in added:
+                # Earlier audio hashes were taken from the fingerprint of the first minute only;
+                # dropping those fingerprints makes the next run hash every file's whole audio
+                conn.execute(text('UPDATE files SET audio_hash = NULL WHERE audio_hash IS NOT NULL'))
+                conn.execute(text('DELETE FROM fingerprints'))
+            
+            normalized = 'files.directory_id' in added
+            if normalized:
+                # files.source_path is UNIQUE, which SQLite cannot drop either
+                rebuilt.setdefault('files', {})
+            
+            if rebuilt:
+                # Their triggers read the old columns; both are rebuilt from the new layout after the upgrade
+                drop_search_index(conn)
+                drop_library_stats(conn)
+                drop_change_log(conn)
+            
+            if normalized:
+                self.normalize_paths(conn)
+            
+            if rebuilt:
+                self.rebuild_tables(conn, rebuilt)
+            
+            # Duplicate groups found before their summaries were materialized
+            self.backfill_duplicate_groups(conn)
+            
+            # Give the planner statistics for new indexes; the sampling limit keeps this fast on big libraries
+            if rebuilt or any(name.startswith('ix_') for name in added):
+                conn.execute(text('PRAGMA analysis_limit=1000'))
+                conn.execute(text('ANALYZE'))
+                logger.info("Updated query planner statistics")
+        
+        # Hand the space the old column forms took back to the filesystem
+        if rebuilt:
+            with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                conn.execute(text('VACUUM'))
+            logger.info("Compacted database after converting stored columns")
+    
+    def retyped_tables(self, inspector) -> dict:
+        """
+        Tables holding a column of RETYPED_COLUMNS in its old form
+        
+        Args:
+            inspector: Inspector taken before any upgrade step ran
+        
+        Returns:
+            Mapping of table name to {column: SQL converting the old value}
+        """
+        existing = set(inspector.get_table_names())
+        rebuilt = {}
+        for (table_name, column_name), conversion in RETYPED_COLUMNS.items():
+            if table_name not in existing:
+                continue
+            stored = {col['name']: col['type'] for col in inspector.get_columns(table_name)}.get(column_name)
+            wanted = Base.metadata.tables[table_name].columns[column_name].type
+            if stored is not None and stored._type_affinity is not wanted._type_affinity:
+                rebuilt.setdefault(table_name, {})[column_name] = conversion
+        return rebuilt
+    
+    def rebuild_tables(self, conn, rebuilt: dict):
+        """
+        Recreate tables from their models, converting old column values on the way
+        
+        Hex digests become raw bytes through hex_to_blob(), and UUID group ids
+        are numbered from 1 through a temporary lookup table.
+        
+        Args:
+            conn: Connection inside the upgrade transaction
+            rebuilt: Mapping of table name to {column: SQL converting the old value}
+        """
+        conn.connection.driver_connection.create_function('hex_to_blob', 1, _hex_to_blob, deterministic=True)
+        
+        if any(GROUP_NUMBER in conversions.values() for conversions in rebuilt.values()):
+            conn.execute(text('CREATE TEMP TABLE group_numbers (number INTEGER PRIMARY KEY, uuid TEXT UNIQUE)'))
+            conn.execute(text(
+                'INSERT INTO temp.group_numbers (uuid) SELECT group_id FROM duplicate_groups '
+                'UNION SELECT group_id FROM duplicates UNION SELECT group_id FROM duplicate_matches'
+            ))
+        
+        for table in Base.metadata.sorted_tables:
+            if table.name not in rebuilt:
+                continue
+            
+            # Legacy mode keeps other tables' references to this one as they are
+            for index in inspect(conn).get_indexes(table.name):
+                conn.execute(text(f'DROP INDEX IF EXISTS {index["name"]}'))
+            conn.execute(text('PRAGMA legacy_alter_table = ON'))
+            conn.execute(text(f'ALTER TABLE {table.name} RENAME TO {table.name}_old'))
+            conn.execute(text('PRAGMA legacy_alter_table = OFF'))
+            table.create(bind=conn)
+            
+            columns = [column.name for column in table.columns]
+            values = ', '.join(rebuilt[table.name].get(name, f'old.{name}') for name in columns)
+            conn.execute(text(
+                f"INSERT INTO {table.name} ({', '.join(columns)}) SELECT {values} FROM {table.name}_old AS old"
+            ))
+            conn.execute(text(f'DROP TABLE {table.name}_old'))
+            logger.info(f"Rebuilt table {table.name}")
+        
+        conn.execute(text('DROP TABLE IF EXISTS temp.group_numbers'))
+    
+    def backfill_duplicate_groups(self, conn):
+        """
+        Summarize duplicate groups saved before duplicate_groups existed
+        
+        Only runs while duplicate_groups is empty and duplicates is not, which
+        after an upgrade is once: every detection run rewrites both tables.
+        
+        Args:
+            conn: Connection inside the upgrade transaction
+        """
+        if conn.execute(text('SELECT 1 FROM duplicate_groups LIMIT 1')).first() is not None:
+            return
+        if conn.execute(text('SELECT 1 FROM duplicates LIMIT 1')).first() is None:
+            return
+        
+        result = conn.execute(text(
+            "INSERT INTO duplicate_groups "
+            "(group_id, file_count, total_bytes, reclaimable_bytes, primary_file_id, reasons, suggested, confidence) "
+            "SELECT duplicates.group_id, count(*), sum(ifnull(files.file_size, 0)), "
+            "sum(CASE WHEN duplicates.is_primary THEN 0 ELSE ifnull(files.file_size, 0) END), "
+            "max(CASE WHEN duplicates.is_primary THEN duplicates.file_id END), 'legacy', 0, 1.0 "
+            "FROM duplicates JOIN files ON files.id = duplicates.file_id "
+            "GROUP BY duplicates.group_id"
+        ))
+        logger.info(f"Summarized {result.rowcount} duplicate groups from earlier detection runs")
+    
+    def backfill_search_keys(self, conn, key_columns):
+        """
+        Fill newly added search key columns from the existing tag values
+        
+        Args:
+            conn: Connection inside the upgrade transaction
+            key_columns: Key columns to compute, e.g. ['artist_key']
+        """
+        fields = {key: field for field, key in SEARCH_KEY_COLUMNS.items() if key in key_columns}
+        rows = conn.execute(text(f"SELECT file_id, {', '.join(fields.values())} FROM metadata")).fetchall()
+        
+        updates = []
+        for row in rows:
+            update = {'file_id': row[0]}
+            for i, key in enumerate(fields):
+                update[key] = normalize_name(row[i + 1]) or None
+            updates.append(update)
+        
+        if updates:
+            assignments = ', '.join(f"{key} = :{key}" for key in fields)
+            conn.execute(text(f"UPDATE metadata SET {assignments} WHERE file_id = :file_id"), updates)
+        logger.info(f"Computed {', '.join(fields)} for {len(updates)} metadata rows")
+    
+    def normalize_paths(self, conn, batch_size: int = 50000):
+        """
+        Move full path columns into the directories table
+        
+        files.source_path becomes directory_id + filename, and migrations.target_path
+        becomes target_directory_id + target_filename. The migration path columns are
+        then dropped; files loses source_path when upgrade_schema rebuilds it.
+        
+        Args:
+            conn: Connection inside the upgrade transaction
+            batch_size: Rows converted per round trip
+        """
+        conversions = [
+            ("SELECT id, source_path FROM files WHERE id > :after ORDER BY id LIMIT :limit",
+             "UPDATE files SET directory_id = ?, filename = ? WHERE id = ?"),
+            ("SELECT id, target_path FROM migrations WHERE target_path IS NOT NULL AND id > :after ORDER BY id LIMIT :limit",
+             "UPDATE migrations SET target_directory_id = ?, target_filename = ? WHERE id = ?")
+        ]
+        for select_sql, update_sql in conversions:
+            after = 0
+            while True:
+                rows = conn.execute(text(select_sql), {'after': after, 'limit': batch_size}).fetchall()
+                if not rows:
+                    break
+                locations = locate_paths(conn, [path for _, path in rows])
+                conn.exec_driver_sql(update_sql, [(*locations[path], row_id) for row_id, path in rows])
+                after = rows[-1][0]
+        
+        conn.execute(text('DROP INDEX IF EXISTS ix_migrations_completed_path'))
+        conn.execute(text('ALTER TABLE migrations DROP COLUMN target_path'))
+        conn.execute(text('ALTER TABLE migrations DROP COLUMN source_path'))
+        
+        rebuild_directories(conn)
+        logger.info("Normalized file and migration paths into the directories table")
+    
     @contextmanager
     def get_session(self) -> Generator[Session, None, None]:
         """Get database session context manager"""
@@ -53,6 +329,40 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def get_generation(self) -> int:
+        """
+        Number that changes whenever a commit to the library database lands
+        
+        Read from PRAGMA data_version on a connection that never writes, so
+        commits from every other connection and process are seen. Caches of
+        query results stay valid for as long as this number is unchanged.
+        
+        Returns:
+            Current library generation
+        """
+        with self._generation_lock:
+            if self._generation_conn is None:
+                self._generation_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            return self._generation_conn.execute('PRAGMA data_version').fetchone()[0]
+    
+    def trim_change_log(self):
+        """
+        Drop all but the newest library.change_log_keep entries of the change log
+        
+        Called when a pipeline run ends, so runs without a read model to
+        prune it (scripts, or a server nobody searches) do not grow it without
+        bound. A read model further behind than that reloads from the tables.
+        """
+        if not self.read_model_enabled:
+            return
+        
+        try:
+            with self.engine.begin() as conn:
+                prune_changes(conn, last_change(conn) - self.change_log_keep)
+        except Exception as e:
+            # A writer holding the database only delays this to the next run
+            logger.error(f"Error trimming library change log: {e}")
+    
     def get_db(self) -> Session:
         """Get database session for FastAPI dependency injection"""
         session = self.SessionLocal()
@@ -63,12 +373,24 @@ class DatabaseManager:
     
     def reset_database(self):
         """Drop all tables and recreate them"""
+        with self.engine.begin() as conn:
+            drop_search_index(conn)
+            drop_library_stats(conn)
+            drop_change_log(conn)
         Base.metadata.drop_all(bind=self.engine)
         Base.metadata.create_all(bind=self.engine)
+        with self.engine.begin() as conn:
+            self.search_index_enabled = create_search_index(conn)
+            create_library_stats(conn)
+            if self.read_model_enabled:
+                create_change_log(conn)
         logger.info("Database reset complete")
     
     def close(self):
         """Close database connection"""
+        if self._generation_conn is not None:
+            self._generation_conn.close()
+            self._generation_conn = None
         if self.engine:
             self.engine.dispose()
             logger.info("Database connection closed")
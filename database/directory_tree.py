@@ -0,0 +1,194 @@
+"""Directory tree of indexed and migrated files with per-subtree totals"""
+from functools import lru_cache
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from sqlalchemy import and_, or_, select, text
+from sqlalchemy.orm import Session
+
+from database.models import Directory
+from utils.normalize import prefix_upper_bound
+
+logger = logging.getLogger(__name__)
+
+# Which pair of counters a file adds to: its source location, or where it was migrated to
+TREE_COLUMNS = {
+    'source': ('file_count', 'total_bytes'),
+    'target': ('migrated_count', 'migrated_bytes')
+}
+
+LOOKUP_CHUNK = 5000
+
+@lru_cache(maxsize=1 << 18)
+def _split(directory: str) -> Tuple[Optional[str], str]:
+    """(parent path or None for a root, name) of a directory"""
+    parent, name = os.path.split(directory)
+    if not name:
+        return None, directory
+    return parent, name
+
+@lru_cache(maxsize=1 << 18)
+def _chain(directory: str) -> Tuple[str, ...]:
+    """A directory and every directory above it, from the root down"""
+    parent, _ = _split(directory)
+    return (_chain(parent) if parent is not None else ()) + (directory,)
+
+def _connection(conn):
+    """The Connection behind a Session, for driver-level executemany"""
+    return conn.connection() if isinstance(conn, Session) else conn
+
+def _lookup(conn, paths: List[str]) -> Dict[str, int]:
+    """Ids of the directories that already exist among paths"""
+    ids = {}
+    for start in range(0, len(paths), LOOKUP_CHUNK):
+        # The chunk travels as one JSON parameter, so the statement text never changes
+        rows = conn.execute(
+            text("SELECT path, id FROM directories WHERE path IN (SELECT value FROM json_each(:paths))"),
+            {'paths': json.dumps(paths[start:start + LOOKUP_CHUNK])}
+        )
+        ids.update(rows.fetchall())
+    return ids
+
+def ensure_directories(conn, paths: Iterable[str]) -> Dict[str, int]:
+    """
+    Ids for directory paths, inserting the ones not seen before
+    
+    Paths are made absolute first, and every ancestor is inserted as well.
+    A relative "music/a" would otherwise become a second tree under a root
+    named "music" for a folder that is already stored.
+    
+    Args:
+        conn: Connection or session inside a transaction
+        paths: Directory paths, absolute or relative to the working directory
+    
+    Returns:
+        Mapping of each given path to its directory id
+    """
+    absolute = {path: os.path.abspath(path) for path in set(paths)}
+    paths = list({ancestor for path in absolute.values() for ancestor in _chain(path)})
+    ids = _lookup(conn, paths)
+    
+    # One insert per depth, parents first, so every row knows its parent id
+    levels: Dict[int, List[str]] = {}
+    for path in paths:
+        if path not in ids:
+            levels.setdefault(len(_chain(path)), []).append(path)
+    
+    for depth in sorted(levels):
+        level = levels[depth]
+        _connection(conn).exec_driver_sql(
+            "INSERT INTO directories (parent_id, name, path, file_count, total_bytes, migrated_count, migrated_bytes) "
+            "VALUES (?, ?, ?, 0, 0, 0, 0) ON CONFLICT(path) DO NOTHING",
+            [(ids.get(_split(path)[0]), _split(path)[1], path) for path in level]
+        )
+        ids.update(_lookup(conn, level))
+    
+    return {path: ids[resolved] for path, resolved in absolute.items()}
+
+def locate_paths(conn, paths: Iterable[str]) -> Dict[str, Tuple[int, str]]:
+    """
+    Where each file path is stored: its directory id and file name
+    
+    Args:
+        conn: Connection or session inside a transaction
+        paths: File paths, absolute or relative; directories not seen before are created
+    
+    Returns:
+        Mapping of each given path to (directory id, file name)
+    """
+    split = {path: os.path.split(os.path.abspath(path)) for path in paths}
+    ids = ensure_directories(conn, {directory for directory, _ in split.values()})
+    return {path: (ids[directory], name) for path, (directory, name) in split.items()}
+
+def add_files(conn, files: Iterable[Tuple[str, Optional[int]]], tree: str = 'source', sign: int = 1):
+    """
+    Count files into the totals of every directory above them
+    
+    Args:
+        conn: Connection or session inside a transaction
+        files: (file path, size in bytes) pairs
+        tree: 'source' for indexed files, 'target' for completed migrations
+        sign: -1 to take the files back out
+    """
+    # Sum per containing directory first; a batch usually shares most of its directories
+    direct: Dict[str, List[int]] = {}
+    for file_path, size in files:
+        delta = direct.setdefault(os.path.dirname(os.path.abspath(file_path)), [0, 0])
+        delta[0] += sign
+        delta[1] += sign * (size or 0)
+    _add_totals(conn, direct, tree)
+
+def _add_totals(conn, direct: Dict[str, List[int]], tree: str):
+    """Add per-directory [count, bytes] to each directory and everything above it"""
+    count_column, bytes_column = TREE_COLUMNS[tree]
+    
+    deltas: Dict[str, List[int]] = {}
+    for directory, (count, size) in direct.items():
+        for ancestor in _chain(directory):
+            delta = deltas.setdefault(ancestor, [0, 0])
+            delta[0] += count
+            delta[1] += size
+    
+    if not deltas:
+        return
+    
+    ids = ensure_directories(conn, deltas)
+    _connection(conn).exec_driver_sql(
+        f"UPDATE directories SET {count_column} = {count_column} + ?, {bytes_column} = {bytes_column} + ? WHERE id = ?",
+        [(count, size, ids[path]) for path, (count, size) in deltas.items()]
+    )
+
+def rebuild_directories(conn):
+    """
+    Recompute every directory's totals from the files and completed migrations
+    
+    Args:
+        conn: Connection or session inside a transaction
+    """
+    conn.execute(text(
+        "UPDATE directories SET file_count = 0, total_bytes = 0, migrated_count = 0, migrated_bytes = 0"
+    ))
+    
+    # Files already point at their directory, so the direct totals are one grouped pass each
+    queries = {
+        'source': ("SELECT directories.path, count(*), ifnull(sum(files.file_size), 0) FROM files "
+                   "JOIN directories ON directories.id = files.directory_id GROUP BY files.directory_id"),
+        'target': ("SELECT directories.path, count(*), ifnull(sum(files.file_size), 0) FROM migrations "
+                   "JOIN files ON files.id = migrations.file_id "
+                   "JOIN directories ON directories.id = migrations.target_directory_id "
+                   "WHERE migrations.status = 'completed' GROUP BY migrations.target_directory_id")
+    }
+    for tree, query in queries.items():
+        direct = {path: [count, size] for path, count, size in conn.execute(text(query))}
+        _add_totals(conn, direct, tree)
+    
+    logger.info("Built directory tree totals")
+
+def joined_path_sql(directory_path: str, filename: str) -> str:
+    """Raw SQL counterpart of database.models.joined_path, for triggers"""
+    return (
+        f"CASE WHEN substr({directory_path}, -1) IN ('/', '\\') THEN {directory_path} || {filename} "
+        f"ELSE {directory_path} || '{os.sep}' || {filename} END"
+    )
+
+def subtree_ids(path: str):
+    """
+    Ids of a directory and everything below it, as a subquery
+    
+    The materialized path makes the subtree one range of the unique path index.
+    
+    Args:
+        path: Directory path
+    
+    Returns:
+        SQLAlchemy select of Directory.id
+    """
+    # Directories are stored without a trailing separator, except for roots
+    stripped = path.rstrip('/\\') or path
+    prefix = path if path.endswith(('/', '\\')) else path + os.sep
+    return select(Directory.id).where(or_(
+        Directory.path.in_({path, stripped}),
+        and_(Directory.path >= prefix, Directory.path < prefix_upper_bound(prefix))
+    ))
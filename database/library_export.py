@@ -0,0 +1,179 @@
+"""Every file with its metadata, classification, analysis and migration, streamed as NDJSON, CSV or Parquet"""
+from typing import Iterator, List
+import csv
+import io
+import json
+import logging
+
+from database.directory_tree import joined_path_sql
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# (output column, SQL expression, Parquet type); dates go out as ISO 8601 text
+EXPORT_COLUMNS = [
+    ('id', 'files.id', 'int64'),
+    ('source_path', joined_path_sql('source.path', 'files.filename'), 'string'),
+    ('file_size', 'files.file_size', 'int64'),
+    ('status', 'files.status', 'string'),
+    ('indexed_at', "replace(files.created_at, ' ', 'T')", 'timestamp'),
+    ('modified_at', "replace(files.modified_date, ' ', 'T')", 'timestamp'),
+    ('duplicate_group_size', 'files.dup_count', 'int64'),
+    ('is_primary', 'files.is_primary', 'bool'),
+    ('artist', 'metadata.artist', 'string'),
+    ('album', 'metadata.album', 'string'),
+    ('title', 'metadata.title', 'string'),
+    ('track_number', 'metadata.track_number', 'int64'),
+    ('year', 'metadata.year', 'int64'),
+    ('genre', 'metadata.genre', 'string'),
+    ('duration_seconds', 'metadata.duration_seconds', 'double'),
+    ('bitrate', 'metadata.bitrate', 'int64'),
+    ('sample_rate', 'metadata.sample_rate', 'int64'),
+    ('format', 'metadata.format', 'string'),
+    ('musicbrainz_id', 'metadata.musicbrainz_id', 'string'),
+    ('file_type', 'classifications.file_type', 'string'),
+    ('classification_confidence', 'classifications.confidence', 'double'),
+    ('classification_method', 'classifications.classification_method', 'string'),
+    ('bpm', 'audio_analysis.bpm', 'double'),
+    ('key_signature', 'audio_analysis.key_signature', 'string'),
+    ('energy', 'audio_analysis.energy', 'double'),
+    ('danceability', 'audio_analysis.danceability', 'double'),
+    ('loudness_db', 'audio_analysis.loudness_db', 'double'),
+    ('dynamic_range', 'audio_analysis.dynamic_range', 'double'),
+    ('target_path', joined_path_sql('target.path', 'migrations.target_filename'), 'string'),
+    ('migrated_at', "replace(migrations.completed_at, ' ', 'T')", 'timestamp'),
+]
+
+COLUMN_NAMES = [name for name, _, _ in EXPORT_COLUMNS]
+
+# One keyset batch: the files after an id, with a single row from each related table
+BATCH_SQL = f"""
+    SELECT {', '.join(expression for _, expression, _ in EXPORT_COLUMNS)}
+    FROM files
+    LEFT JOIN directories AS source ON source.id = files.directory_id
+    LEFT JOIN metadata ON metadata.file_id = files.id
+    LEFT JOIN classifications ON classifications.file_id = files.id
+    LEFT JOIN audio_analysis ON audio_analysis.file_id = files.id
+    LEFT JOIN migrations ON migrations.file_id = files.id AND migrations.status = 'completed'
+    LEFT JOIN directories AS target ON target.id = migrations.target_directory_id
+    WHERE files.id > ?
+    ORDER BY files.id
+    LIMIT ?
+"""
+
+# Rows per batch, and per Parquet row group
+EXPORT_BATCH = 20000
+
+def export_batches(engine, batch_size: int = EXPORT_BATCH) -> Iterator[List[tuple]]:
+    """
+    Every file in id order, one list of EXPORT_COLUMNS rows at a time
+    
+    Each batch is its own short read that resumes after the last id of the
+    one before, so a slow client never holds a read lock that would keep the
+    indexer or migrator from committing, and memory stays at one batch.
+    
+    Args:
+        engine: SQLAlchemy engine of the library database
+        batch_size: Rows per batch
+    """
+    after = 0
+    while True:
+        try:
+            with engine.connect() as conn:
+                # Plain DB-API tuples; result rows would double the read time
+                rows = conn.connection.driver_connection.execute(BATCH_SQL, (after, batch_size)).fetchall()
+        except Exception as e:
+            logger.error(f"Error reading export batch after file {after}: {e}")
+            raise
+        
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        after = rows[-1][0]
+
+def ndjson_chunks(batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """One JSON object per line, encoded with orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        dumps = orjson.dumps
+    else:
+        dumps = lambda row: json.dumps(row, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    for rows in batches:
+        yield b''.join(dumps(dict(zip(COLUMN_NAMES, row))) + b'\n' for row in rows)
+
+def csv_chunks(batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """Header line, then the rows of each batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMN_NAMES)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands its bytes out as they are written, while tell() keeps counting for the Parquet footer"""
+    
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self.position
+    
+    def take(self) -> bytes:
+        """Bytes written since the last call"""
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def parquet_chunks(batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """A Parquet file with one row group per batch, streamed as each group is written"""
+    types = {
+        'int64': pa.int64(), 'double': pa.float64(), 'string': pa.string(),
+        'bool': pa.bool_(), 'timestamp': pa.timestamp('us')
+    }
+    schema = pa.schema([(name, types[kind]) for name, _, kind in EXPORT_COLUMNS])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for rows in batches:
+            columns = []
+            for values, field in zip(zip(*rows), schema):
+                # Dates come as text and flags as 0/1, so those are read as-is and converted
+                if pa.types.is_timestamp(field.type) or pa.types.is_boolean(field.type):
+                    columns.append(pa.array(values).cast(field.type))
+                else:
+                    columns.append(pa.array(values, type=field.type))
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+# Format name: (chunk writer, media type)
+EXPORT_FORMATS = {
+    'ndjson': (ndjson_chunks, 'application/x-ndjson'),
+    'csv': (csv_chunks, 'text/csv'),
+    'parquet': (parquet_chunks, 'application/vnd.apache.parquet')
+}
@@ -0,0 +1,245 @@
+"""Running library totals kept in a summary table by SQLite triggers"""
+from typing import Any, Dict, List, Tuple
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+def _extension_sql(name: str) -> str:
+    """
+    SQL expression for the lowercased suffix of a file name, matching Path(name).suffix.lower()
+    
+    rtrim(x, replace(x, '.', '')) strips everything after the last dot,
+    which gives the suffix without needing reverse() or a CTE (neither
+    works in a trigger).
+    """
+    suffix = f"substr({name}, length(rtrim({name}, replace({name}, '.', ''))) + 1)"
+    return (
+        f"CASE WHEN instr(substr({name}, 2), '.') > 0 AND {suffix} != '' "
+        f"THEN '.' || lower({suffix}) ELSE '' END"
+    )
+
+def _bump(name: str, delta: str, when: str = 'true') -> str:
+    """Trigger statement adding delta to a counter, creating it at zero"""
+    # An upsert from a SELECT needs a WHERE clause to parse unambiguously
+    return (
+        f"INSERT INTO library_stats(name, value) SELECT {name}, {delta} WHERE {when} "
+        f"ON CONFLICT(name) DO UPDATE SET value = value + excluded.value;"
+    )
+
+def _duplicate_bumps(row: str, sign: str) -> str:
+    """Trigger statements adding (sign '+') or removing (sign '-') a file's share of the duplicate totals"""
+    return '\n        '.join([
+        _bump("'duplicate_files'", f'{sign}1', f'{row}.dup_count > 0'),
+        _bump("'duplicate_bytes'", f'{sign}ifnull({row}.file_size, 0)', f'{row}.dup_count > 0'),
+        # Everything but the copy to keep could be deleted
+        _bump("'reclaimable_bytes'", f'{sign}ifnull({row}.file_size, 0)', f'{row}.dup_count > 0 AND NOT {row}.is_primary')
+    ])
+
+def _artist_bump(key: str, delta: str) -> str:
+    """Trigger statement adding delta to an artist's track count, creating it at zero"""
+    return (
+        f"INSERT INTO library_artist_stats(artist_key, tracks) SELECT {key}, {delta} WHERE {key} IS NOT NULL "
+        f"ON CONFLICT(artist_key) DO UPDATE SET tracks = tracks + excluded.tracks;"
+    )
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS library_stats (
+        name TEXT PRIMARY KEY,
+        value NUMERIC NOT NULL DEFAULT 0
+    )""",
+    # Tracks per artist key; the index hands out the top artists without reading the rest
+    """CREATE TABLE IF NOT EXISTS library_artist_stats (
+        artist_key TEXT PRIMARY KEY,
+        tracks INTEGER NOT NULL DEFAULT 0
+    )""",
+    'CREATE INDEX IF NOT EXISTS ix_library_artist_stats_tracks ON library_artist_stats (tracks, artist_key)',
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_file_insert AFTER INSERT ON files BEGIN
+        {_bump("'files'", '1')}
+        {_bump("'bytes'", 'ifnull(new.file_size, 0)')}
+        {_bump("'status:' || ifnull(new.status, '')", '1')}
+        {_bump("'ext:' || " + _extension_sql('new.filename'), '1')}
+        {_duplicate_bumps('new', '')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_file_delete AFTER DELETE ON files BEGIN
+        {_bump("'files'", '-1')}
+        {_bump("'bytes'", '-ifnull(old.file_size, 0)')}
+        {_bump("'status:' || ifnull(old.status, '')", '-1')}
+        {_bump("'ext:' || " + _extension_sql('old.filename'), '-1')}
+        {_duplicate_bumps('old', '-')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_file_size AFTER UPDATE OF file_size ON files BEGIN
+        {_bump("'bytes'", 'ifnull(new.file_size, 0) - ifnull(old.file_size, 0)')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_file_status AFTER UPDATE OF status ON files
+    WHEN old.status IS NOT new.status BEGIN
+        {_bump("'status:' || ifnull(old.status, '')", '-1')}
+        {_bump("'status:' || ifnull(new.status, '')", '1')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_file_name AFTER UPDATE OF filename ON files BEGIN
+        {_bump("'ext:' || " + _extension_sql('old.filename'), '-1')}
+        {_bump("'ext:' || " + _extension_sql('new.filename'), '1')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_file_duplicates AFTER UPDATE OF dup_count, is_primary, file_size ON files
+    WHEN old.dup_count > 0 OR new.dup_count > 0 BEGIN
+        {_duplicate_bumps('old', '-')}
+        {_duplicate_bumps('new', '')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_metadata_insert AFTER INSERT ON metadata BEGIN
+        {_bump("'metadata'", '1')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_metadata_delete AFTER DELETE ON metadata BEGIN
+        {_bump("'metadata'", '-1')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_analysis_insert AFTER INSERT ON audio_analysis BEGIN
+        {_bump("'analysis'", '1')}
+        {_bump("'bpm_count'", '1', 'new.bpm IS NOT NULL')}
+        {_bump("'bpm_sum'", 'new.bpm', 'new.bpm IS NOT NULL')}
+        {_bump("'key:' || new.key_signature", '1', 'new.key_signature IS NOT NULL')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_analysis_delete AFTER DELETE ON audio_analysis BEGIN
+        {_bump("'analysis'", '-1')}
+        {_bump("'bpm_count'", '-1', 'old.bpm IS NOT NULL')}
+        {_bump("'bpm_sum'", '-old.bpm', 'old.bpm IS NOT NULL')}
+        {_bump("'key:' || old.key_signature", '-1', 'old.key_signature IS NOT NULL')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_analysis_update AFTER UPDATE OF bpm, key_signature ON audio_analysis BEGIN
+        {_bump("'bpm_count'", '-1', 'old.bpm IS NOT NULL')}
+        {_bump("'bpm_sum'", '-old.bpm', 'old.bpm IS NOT NULL')}
+        {_bump("'key:' || old.key_signature", '-1', 'old.key_signature IS NOT NULL')}
+        {_bump("'bpm_count'", '1', 'new.bpm IS NOT NULL')}
+        {_bump("'bpm_sum'", 'new.bpm', 'new.bpm IS NOT NULL')}
+        {_bump("'key:' || new.key_signature", '1', 'new.key_signature IS NOT NULL')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_artist_insert AFTER INSERT ON metadata BEGIN
+        {_artist_bump('new.artist_key', '1')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_artist_delete AFTER DELETE ON metadata BEGIN
+        {_artist_bump('old.artist_key', '-1')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_artist_update AFTER UPDATE OF artist_key ON metadata
+    WHEN old.artist_key IS NOT new.artist_key BEGIN
+        {_artist_bump('old.artist_key', '-1')}
+        {_artist_bump('new.artist_key', '1')}
+    END""",
+    # Suggested near-duplicate pairs are not counted as groups
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_group_insert AFTER INSERT ON duplicate_groups BEGIN
+        {_bump("'duplicate_groups'", '1', 'NOT new.suggested')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS library_stats_group_delete AFTER DELETE ON duplicate_groups BEGIN
+        {_bump("'duplicate_groups'", '-1', 'NOT old.suggested')}
+    END"""
+]
+
+# The same counters computed from scratch, for a new table or a repair
+REBUILD = [
+    'DELETE FROM library_stats',
+    """INSERT INTO library_stats(name, value)
+        SELECT 'files', count(*) FROM files
+        UNION ALL SELECT 'bytes', ifnull(sum(file_size), 0) FROM files
+        UNION ALL SELECT 'metadata', count(*) FROM metadata
+        UNION ALL SELECT 'analysis', count(*) FROM audio_analysis
+        UNION ALL SELECT 'bpm_count', count(bpm) FROM audio_analysis
+        UNION ALL SELECT 'bpm_sum', ifnull(sum(bpm), 0) FROM audio_analysis
+        UNION ALL SELECT 'duplicate_files', count(*) FROM files WHERE dup_count > 0
+        UNION ALL SELECT 'duplicate_bytes', ifnull(sum(file_size), 0) FROM files WHERE dup_count > 0
+        UNION ALL SELECT 'reclaimable_bytes', ifnull(sum(file_size), 0) FROM files WHERE dup_count > 0 AND NOT is_primary
+        UNION ALL SELECT 'duplicate_groups', count(*) FROM duplicate_groups WHERE NOT suggested""",
+    """INSERT INTO library_stats(name, value)
+        SELECT 'status:' || ifnull(status, ''), count(*) FROM files GROUP BY 1""",
+    f"""INSERT INTO library_stats(name, value)
+        SELECT 'ext:' || {_extension_sql('filename')}, count(*) FROM files GROUP BY 1""",
+    """INSERT INTO library_stats(name, value)
+        SELECT 'key:' || key_signature, count(*) FROM audio_analysis
+        WHERE key_signature IS NOT NULL GROUP BY 1""",
+    'DELETE FROM library_artist_stats',
+    """INSERT INTO library_artist_stats(artist_key, tracks)
+        SELECT artist_key, count(*) FROM metadata
+        WHERE artist_key IS NOT NULL GROUP BY artist_key"""
+]
+
+TRIGGERS = [
+    'library_stats_file_insert', 'library_stats_file_delete', 'library_stats_file_size',
+    'library_stats_file_status', 'library_stats_file_name', 'library_stats_file_duplicates', 'library_stats_metadata_insert',
+    'library_stats_metadata_delete', 'library_stats_analysis_insert', 'library_stats_analysis_delete',
+    'library_stats_analysis_update', 'library_stats_artist_insert', 'library_stats_artist_delete',
+    'library_stats_artist_update', 'library_stats_group_insert', 'library_stats_group_delete'
+]
+
+DROP = [f'DROP TRIGGER IF EXISTS {name}' for name in TRIGGERS] + [
+    'DROP TABLE IF EXISTS library_stats', 'DROP TABLE IF EXISTS library_artist_stats'
+]
+
+def create_library_stats(conn):
+    """
+    Create the summary table and its triggers, filling the table if it is new
+    
+    A trigger that did not exist yet means its counters were never kept,
+    so the table is recounted then as well.
+    
+    Args:
+        conn: Connection inside a transaction
+    """
+    existing = {name for (name,) in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE 'library_%stats%'"
+    ))}
+    
+    for statement in SCHEMA:
+        conn.execute(text(statement))
+    
+    if not existing.issuperset(['library_stats', 'library_artist_stats', *TRIGGERS]):
+        rebuild_library_stats(conn)
+
+def rebuild_library_stats(conn):
+    """Recount every counter from the library tables"""
+    for statement in REBUILD:
+        conn.execute(text(statement))
+    logger.info("Built library statistics summary")
+
+def drop_library_stats(conn):
+    """Drop the summary table and the triggers that feed it"""
+    for statement in DROP:
+        conn.execute(text(statement))
+
+def read_library_stats(conn) -> Dict[str, Any]:
+    """
+    Current counters, grouped the way the statistics endpoint reports them
+    
+    Args:
+        conn: Connection or session
+    
+    Returns:
+        Dictionary with files, bytes, metadata, analysis, bpm_count, bpm_sum,
+        duplicate_groups, duplicate_files, duplicate_bytes and reclaimable_bytes totals plus
+        status, extension and key_signature breakdowns
+    """
+    stats = {'status': {}, 'ext': {}, 'key': {}}
+    for name, value in conn.execute(text('SELECT name, value FROM library_stats')):
+        group, separator, member = name.partition(':')
+        if separator and group in stats:
+            # Keep zero rows out of the breakdowns; they only mark values that once existed
+            if value:
+                stats[group][member] = value
+        else:
+            stats[name] = value
+    return stats
+
+def read_top_artists(conn, limit: int = 10) -> List[Tuple[str, int]]:
+    """
+    Artists with the most tracks, from the per-artist counters
+    
+    Walks the tracks index from the top, and each display name is one seek
+    on the artist key index, so the cost does not grow with the library.
+    
+    Args:
+        conn: Connection or session
+        limit: Number of artists
+    
+    Returns:
+        (artist, track count) pairs, most tracks first
+    """
+    return [tuple(row) for row in conn.execute(text(
+        "SELECT (SELECT min(artist) FROM metadata WHERE metadata.artist_key = library_artist_stats.artist_key), tracks "
+        "FROM library_artist_stats WHERE tracks > 0 ORDER BY tracks DESC, artist_key DESC LIMIT :limit"
+    ), {'limit': limit})]
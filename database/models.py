@@ -1,23 +1,74 @@
 """SQLAlchemy database models for Music Sorter"""
-from sqlalchemy import create_engine, Column, Integer, String, Text, Float, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Text, Float, Boolean, DateTime, ForeignKey, JSON, LargeBinary, Index, text, select, case, or_, func
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import relationship, sessionmaker, column_property
 from datetime import datetime
+import os
 
 Base = declarative_base()
 
+def joined_path(directory_path, filename):
+    """SQL expression joining a directory path and a file name the way os.path.join does"""
+    # A root such as '/' or 'C:\\' already ends in a separator
+    last = func.substr(directory_path, -1)
+    return case(
+        (or_(last == '/', last == '\\'), directory_path + filename),
+        else_=directory_path + os.sep + filename
+    )
+
+class Directory(Base):
+    __tablename__ = 'directories'
+    __table_args__ = (
+        Index('ix_directories_parent', 'parent_id', 'name'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    parent_id = Column(Integer, ForeignKey('directories.id'))  # NULL for a filesystem root
+    name = Column(Text)  # Last path component
+    path = Column(Text, unique=True, nullable=False)  # Materialized path; a subtree is one range of it
+    # Rolled-up totals for the whole subtree: indexed source files, and completed migrations into it
+    file_count = Column(Integer, default=0)
+    total_bytes = Column(Integer, default=0)
+    migrated_count = Column(Integer, default=0)
+    migrated_bytes = Column(Integer, default=0)
+
 class File(Base):
     __tablename__ = 'files'
+    __table_args__ = (
+        # Hash grouping for dedup and duplicate stats; size rides along so sums stay in the index
+        Index('ix_files_file_hash', 'file_hash', 'file_size'),
+        Index('ix_files_audio_hash', 'audio_hash', sqlite_where=text('audio_hash IS NOT NULL')),
+        Index('ix_files_status', 'status', 'file_size'),
+        Index('ix_files_created_at', 'created_at'),
+        Index('ix_files_file_size', 'file_size'),
+        Index('ix_files_location', 'directory_id', 'filename', unique=True),
+        # Duplicate filters are ranges on this instead of a GROUP BY over every hash
+        Index('ix_files_duplicates', 'dup_count', 'is_primary'),
+    )
     
     id = Column(Integer, primary_key=True)
-    source_path = Column(Text, unique=True, nullable=False)
+    # The path is stored once per directory; files keep only their own name
+    directory_id = Column(Integer, ForeignKey('directories.id'))
+    filename = Column(Text, nullable=False)
     file_size = Column(Integer)
     modified_date = Column(DateTime)
-    file_hash = Column(String(32))  # MD5 hash
-    audio_hash = Column(String(64))  # Audio fingerprint
+    # Raw digests rather than hex text: half the bytes to store, index and compare
+    file_hash = Column(LargeBinary(16))  # MD5 of the file head and size
+    audio_hash = Column(LargeBinary(32))  # SHA-256 of the whole decoded PCM
     status = Column(String(20), default='indexed')  # indexed, analyzed, migrated, error
     error_message = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Written by DuplicateDetector: size of the file's duplicate group (0 if none), and whether it is the copy to keep
+    dup_count = Column(Integer, default=0, server_default=text('0'))
+    is_primary = Column(Boolean, default=False, server_default=text('0'))
+    
+    # Full source path, joined in on load (read-only; write directory_id and filename)
+    source_path = column_property(
+        select(joined_path(Directory.path, filename))
+        .where(Directory.id == directory_id)
+        .correlate_except(Directory)
+        .scalar_subquery()
+    )
     
     # Relationships
     file_metadata = relationship("Metadata", back_populates="file", uselist=False, cascade="all, delete-orphan")
@@ -25,6 +76,7 @@ class File(Base):
     migration = relationship("Migration", back_populates="file", uselist=False, cascade="all, delete-orphan")
     audio_analysis = relationship("AudioAnalysis", back_populates="file", uselist=False, cascade="all, delete-orphan")
     classification = relationship("Classification", back_populates="file", uselist=False, cascade="all, delete-orphan")
+    fingerprint = relationship("Fingerprint", back_populates="file", uselist=False, cascade="all, delete-orphan")
 
 class Metadata(Base):
     __tablename__ = 'metadata'
@@ -41,15 +93,39 @@ class Metadata(Base):
     sample_rate = Column(Integer)
     format = Column(String(10))  # mp3, wav, flac, etc.
     fingerprint_id = Column(String(64))  # AcoustID fingerprint
+    musicbrainz_id = Column(String(36), index=True)  # Matched MusicBrainz recording
+    native_checksum = Column(String(64), index=True)  # FLAC STREAMINFO MD5 or LAME music CRC
+    art_hash = Column(String(40), index=True)  # SHA-1 of embedded cover art, names the thumbnail
+    inferred_fields = Column(String(60))  # Comma-separated fields filled from folder and file names, not tags
+    
+    # Normalized search keys (see utils.normalize), kept in sync by every writer
+    artist_key = Column(String(255))
+    album_key = Column(String(255))
+    genre_key = Column(String(100))
     
     # Relationship
     file = relationship("File", back_populates="file_metadata")
+    
+    # Key first, then the display value, so prefix lookups are answered from the index
+    __table_args__ = (
+        Index('ix_metadata_artist_key', 'artist_key', 'artist'),
+        Index('ix_metadata_album_key', 'album_key', 'album'),
+        Index('ix_metadata_genre_key', 'genre_key', 'genre'),
+        Index('ix_metadata_year', 'year'),
+        # Everything the album listing reads, so it never visits the table
+        Index('ix_metadata_album_listing', 'album_key', 'artist_key', 'album', 'artist', 'year', 'art_hash'),
+    )
 
 class Duplicate(Base):
     __tablename__ = 'duplicates'
+    __table_args__ = (
+        Index('ix_duplicates_file_id', 'file_id', 'group_id'),
+        # Primary copies are what migration and classification walk
+        Index('ix_duplicates_primary', 'file_id', sqlite_where=text('is_primary = 1')),
+    )
     
     id = Column(Integer, primary_key=True)
-    group_id = Column(String(36))  # UUID for duplicate group
+    group_id = Column(Integer, index=True)  # Duplicate group, numbered from 1 on every detection run
     file_id = Column(Integer, ForeignKey('files.id'))
     is_primary = Column(Boolean, default=False)  # Best quality in group
     quality_score = Column(Integer)  # Calculated quality score
@@ -57,23 +133,74 @@ class Duplicate(Base):
     # Relationship
     file = relationship("File", back_populates="duplicates")
 
+class DuplicateGroup(Base):
+    __tablename__ = 'duplicate_groups'
+    __table_args__ = (
+        Index('ix_duplicate_groups_reclaimable', 'reclaimable_bytes', 'group_id'),
+        Index('ix_duplicate_groups_count', 'file_count', 'group_id'),
+    )
+    
+    group_id = Column(Integer, primary_key=True)
+    file_count = Column(Integer)
+    total_bytes = Column(Integer)
+    reclaimable_bytes = Column(Integer)  # Size of all non-primary members
+    primary_file_id = Column(Integer, ForeignKey('files.id'))
+    reasons = Column(String(100))  # Comma-separated match reasons seen in the group
+    # Pairs only fingerprint or fuzzy tag evidence links; shown for review, never skipped
+    suggested = Column(Boolean, default=False, server_default=text('0'))
+    confidence = Column(Float)  # Lowest edge confidence, 1.0 for exact groups
+
+class DuplicateMatch(Base):
+    __tablename__ = 'duplicate_matches'
+    
+    id = Column(Integer, primary_key=True)
+    group_id = Column(Integer, index=True)  # Duplicate group the edge was merged into
+    file_id_a = Column(Integer, ForeignKey('files.id'))
+    file_id_b = Column(Integer, ForeignKey('files.id'))
+    reason = Column(String(30))  # file_hash, native_checksum, audio_hash, fingerprint, fuzzy_tags
+    confidence = Column(Float)  # 0.0 to 1.0
+
 class Migration(Base):
     __tablename__ = 'migrations'
+    __table_args__ = (
+        Index('ix_migrations_file_status', 'file_id', 'status'),
+        Index('ix_migrations_status', 'status', 'completed_at'),
+        Index('ix_migrations_completed_directory', 'target_directory_id', sqlite_where=text("status = 'completed'")),
+    )
     
     id = Column(Integer, primary_key=True)
     file_id = Column(Integer, ForeignKey('files.id'))
-    source_path = Column(Text)
-    target_path = Column(Text)
+    target_directory_id = Column(Integer, ForeignKey('directories.id'))
+    target_filename = Column(Text)
     status = Column(String(20), default='pending')  # pending, in_progress, completed, failed
     started_at = Column(DateTime)
     completed_at = Column(DateTime)
     error = Column(Text)
     
+    # Paths joined in on load (read-only); the source is the file's own
+    target_path = column_property(
+        select(joined_path(Directory.path, target_filename))
+        .where(Directory.id == target_directory_id)
+        .correlate_except(Directory)
+        .scalar_subquery()
+    )
+    source_path = column_property(
+        select(File.source_path)
+        .where(File.id == file_id)
+        .correlate_except(File)
+        .scalar_subquery()
+    )
+    
     # Relationship
     file = relationship("File", back_populates="migration")
 
 class AudioAnalysis(Base):
     __tablename__ = 'audio_analysis'
+    __table_args__ = (
+        # Range filter on bpm; energy and danceability make the averages index-only
+        Index('ix_audio_analysis_bpm', 'bpm', 'energy', 'danceability'),
+        Index('ix_audio_analysis_key', 'key_signature', 'bpm'),
+    )
     
     file_id = Column(Integer, ForeignKey('files.id'), primary_key=True)
     bpm = Column(Float)
@@ -89,6 +216,11 @@ class AudioAnalysis(Base):
 
 class Classification(Base):
     __tablename__ = 'classifications'
+    __table_args__ = (
+        Index('ix_classifications_type', 'file_type', 'confidence'),
+        # Pages of one type in file id order
+        Index('ix_classifications_type_file', 'file_type', 'file_id'),
+    )
     
     file_id = Column(Integer, ForeignKey('files.id'), primary_key=True)
     file_type = Column(String(20))  # song, sample, unknown
@@ -100,6 +232,19 @@ class Classification(Base):
     # Relationship
     file = relationship("File", back_populates="classification")
 
+class Fingerprint(Base):
+    __tablename__ = 'fingerprints'
+    
+    file_id = Column(Integer, ForeignKey('files.id'), primary_key=True)
+    sub_fingerprints = Column(LargeBinary)  # Packed little-endian uint32, one per frame
+    frame_count = Column(Integer)
+    minhash = Column(LargeBinary)  # Packed uint32 MinHash signature for LSH banding
+    pcm_frames = Column(Integer)  # Decoded length covered by files.audio_hash; NULL when it could not be hashed
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationship
+    file = relationship("File", back_populates="fingerprint")
+
 class Checkpoint(Base):
     __tablename__ = 'checkpoints'
     
@@ -0,0 +1,501 @@
+"""In-memory columnar copy of the library's filter columns, for searching without SQL joins"""
+from bisect import bisect_left
+from datetime import datetime
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+from sqlalchemy import text
+
+from database.change_log import last_change, prune_changes, read_changes
+from utils.normalize import normalize_name, prefix_upper_bound
+
+logger = logging.getLogger(__name__)
+
+# One row per file with every column the search filters and sorts read; NULL size and
+# duplicate count come back as -1, which no size or count filter accepts
+ROWS_SQL = """
+    SELECT files.id, ifnull(files.file_size, -1), files.status, ifnull(files.dup_count, -1), files.created_at,
+           metadata.artist, metadata.album, metadata.genre, metadata.year, metadata.format,
+           audio_analysis.bpm, audio_analysis.key_signature
+    FROM files
+    LEFT JOIN metadata ON metadata.file_id = files.id
+    LEFT JOIN audio_analysis ON audio_analysis.file_id = files.id
+"""
+
+# Columns stored as codes into a per-column dictionary of their distinct values
+DICTIONARY_COLUMNS = ['status', 'artist', 'album', 'genre', 'format', 'key']
+
+# Title and path order would need every title and path in memory, so those searches stay in SQL
+UNSUPPORTED_SORTS = {'title', 'path'}
+
+LOAD_CHUNK = 100000
+
+# A backlog of changes larger than this share of the library is cheaper to apply by reloading
+RELOAD_FRACTION = 0.25
+
+# Applied changes are deleted from the log once this many have piled up
+PRUNE_EVERY = 10000
+
+# Below this share of matching rows, the matches are sorted directly instead of walking the full sort order
+WALK_MIN_FRACTION = 1 / 32
+
+# Facet counts search can return, and the width of the BPM buckets
+FACETS = ['genre', 'key', 'decade', 'format', 'bpm']
+BPM_BUCKET = 10
+
+EPOCH = np.datetime64('1970-01-01T00:00:00', 'us')
+
+class Dictionary:
+    """Integer codes for the distinct values of a column, assigned in first-seen order"""
+    
+    def __init__(self):
+        self.values: List[Any] = []
+        self.codes: Dict[Any, int] = {}
+        self._views: Dict[Any, Any] = {}  # Sorted forms of values, dropped whenever a value is added
+    
+    def encode(self, values) -> np.ndarray:
+        """Codes for a sequence of values, adding the ones not seen before"""
+        # Only the distinct values go through Python; the per-row lookup runs in map()
+        for value in set(values).difference(self.codes):
+            self.codes[value] = len(self.values)
+            self.values.append(value)
+            self._views.clear()
+        return np.fromiter(map(self.codes.__getitem__, values), dtype=np.int32, count=len(values))
+    
+    def code(self, value) -> int:
+        """Code of a value, -1 if it never occurred"""
+        return self.codes.get(value, -1)
+    
+    def keys(self) -> List[Optional[str]]:
+        """
+        Search key of each code, derived from the value the way every writer
+        derives the metadata key columns, so only the values need to be loaded
+        """
+        keys = self._views.get('keys')
+        if keys is None:
+            keys = self._views['keys'] = [normalize_name(value) or None for value in self.values]
+        return keys
+    
+    def matching(self, low: Optional[str] = None, high: Optional[str] = None) -> np.ndarray:
+        """
+        Lookup table of the codes whose search key lies in [low, high)
+        
+        Args:
+            low: Inclusive lower bound; None matches every non-NULL key
+            high: Exclusive upper bound
+        
+        Returns:
+            Boolean array indexed by code
+        """
+        view = self._views.get('sorted_keys')
+        if view is None:
+            pairs = sorted((key, code) for code, key in enumerate(self.keys()) if key is not None)
+            view = self._views['sorted_keys'] = (
+                [key for key, _ in pairs], np.array([code for _, code in pairs], dtype=np.int64)
+            )
+        keys, codes = view
+        
+        table = np.zeros(len(self.values), dtype=bool)
+        if low is None:
+            table[codes] = True
+        else:
+            table[codes[bisect_left(keys, low):bisect_left(keys, high)]] = True
+        return table
+    
+    def without_key(self) -> np.ndarray:
+        """Lookup table of the codes whose search key is NULL"""
+        return np.array([key is None for key in self.keys()], dtype=bool)
+    
+    def ranks(self) -> Tuple[List[str], np.ndarray]:
+        """
+        Sort positions of the codes by value, NULL sorting as ''
+        
+        Returns:
+            Tuple of (distinct values in order, rank of each code); equal values share a rank
+        """
+        view = self._views.get('ranks')
+        if view is None:
+            ordered = sorted({value or '' for value in self.values})
+            position = {value: rank for rank, value in enumerate(ordered)}
+            view = self._views['ranks'] = (
+                ordered, np.array([position[value or ''] for value in self.values], dtype=np.int64)
+            )
+        return view
+
+class LibraryReadModel:
+    """
+    NumPy arrays holding one entry per file for every column the search filters read
+    
+    Loaded once from the tables, then kept current from the change log:
+    when the library generation moves, only the files logged since the last
+    refresh are read back. A search evaluates its filters as vectorized
+    masks and returns the ids of one page, which the caller loads from SQLite.
+    """
+    
+    def __init__(self, engine):
+        self.engine = engine
+        self.columns: Optional[Dict[str, np.ndarray]] = None
+        self.dictionaries: Dict[str, Dictionary] = {}
+        self.seq = 0  # Last change log entry applied
+        self.pruned = 0
+        self.generation = None
+        self._orders: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._lock = threading.Lock()
+    
+    def load(self):
+        """Read every file into fresh arrays, replacing the current ones"""
+        try:
+            start = time.perf_counter()
+            with self.engine.connect() as conn:
+                state = self._read_all(conn)
+                with self._lock:
+                    self._install(*state)
+                self._prune(conn)
+            logger.info(f"Loaded {len(self.columns['id'])} files into the search read model "
+                        f"in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            logger.error(f"Error loading search read model: {e}")
+    
+    def _read_all(self, conn) -> Tuple[Dict[str, np.ndarray], Dict[str, Dictionary], int]:
+        """(columns, dictionaries, change log position) for every file, reading in chunks"""
+        # Changes logged after this point are applied by the next refresh, even if the rows below already show them
+        seq = last_change(conn)
+        dictionaries = {name: Dictionary() for name in DICTIONARY_COLUMNS}
+        
+        # Plain DB-API tuples; result rows would cost more than the encoding
+        chunks = []
+        result = conn.connection.driver_connection.execute(ROWS_SQL + ' ORDER BY files.id')
+        while True:
+            rows = result.fetchmany(LOAD_CHUNK)
+            if not rows:
+                break
+            chunks.append(self._encode(rows, dictionaries))
+        if not chunks:
+            chunks.append(self._encode([], dictionaries))
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}, dictionaries, seq
+    
+    def _install(self, columns: Dict[str, np.ndarray], dictionaries: Dict[str, Dictionary], seq: int):
+        """Replace the arrays; the caller holds the lock"""
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.seq = seq
+        self.generation = None
+        self._orders.clear()
+    
+    def _encode(self, rows, dictionaries: Dict[str, Dictionary]) -> Dict[str, np.ndarray]:
+        """Arrays for a batch of ROWS_SQL rows, in row order"""
+        ids, sizes, statuses, dup_counts, created, artists, albums, genres, years, formats, bpms, keys = (
+            zip(*rows) if rows else ([],) * 12
+        )
+        
+        return {
+            'id': np.array(ids, dtype=np.int64),
+            'size': np.array(sizes, dtype=np.int64),
+            'dup_count': np.array(dup_counts, dtype=np.int32),
+            'created': (np.array(created, dtype='datetime64[us]') - EPOCH).astype(np.int64),
+            # NULL year and bpm become NaN, which fails every comparison the way NULL does in SQL
+            'year': np.array(years, dtype=np.float64),
+            'bpm': np.array(bpms, dtype=np.float64),
+            'status': dictionaries['status'].encode(statuses),
+            'artist': dictionaries['artist'].encode(artists),
+            'album': dictionaries['album'].encode(albums),
+            'genre': dictionaries['genre'].encode(genres),
+            'format': dictionaries['format'].encode(formats),
+            'key': dictionaries['key'].encode(keys)
+        }
+    
+    def _refresh(self, conn):
+        """Bring the arrays up to the newest logged change; the caller holds the lock"""
+        upto = last_change(conn)
+        if upto == self.seq:
+            return
+        
+        changed, complete = read_changes(conn, self.seq, upto)
+        if not complete or len(changed) > RELOAD_FRACTION * max(len(self.columns['id']), LOAD_CHUNK):
+            # The log was pruned past this copy or recreated, or reloading is simply cheaper
+            self._install(*self._read_all(conn))
+            logger.info(f"Reloaded search read model ({len(self.columns['id'])} files)")
+        else:
+            rows = conn.execute(
+                text(ROWS_SQL + ' WHERE files.id IN (SELECT value FROM json_each(:ids)) ORDER BY files.id'),
+                {'ids': json.dumps(changed)}
+            ).fetchall()
+            self._apply(np.array(changed, dtype=np.int64), self._encode(rows, self.dictionaries))
+            self.seq = upto
+        self._prune(conn)
+    
+    def _prune(self, conn):
+        """Delete applied changes from the log once enough have piled up"""
+        if self.seq - self.pruned < PRUNE_EVERY:
+            return
+        try:
+            prune_changes(conn, self.seq)
+            conn.commit()
+            self.pruned = self.seq
+        except Exception as e:
+            # A writer holding the database only delays this to the next refresh
+            conn.rollback()
+            logger.error(f"Error pruning library change log: {e}")
+    
+    def _apply(self, changed: np.ndarray, fresh: Dict[str, np.ndarray]):
+        """Overwrite changed files, drop deleted ones and append new ones, keeping ids sorted"""
+        columns = self.columns
+        ids = columns['id']
+        
+        positions = np.searchsorted(ids, fresh['id'])
+        present = positions < len(ids)
+        present[present] = ids[positions[present]] == fresh['id'][present]
+        for name, column in columns.items():
+            column[positions[present]] = fresh[name][present]
+        
+        deleted = np.setdiff1d(changed, fresh['id'])
+        if len(deleted):
+            keep = ~np.isin(ids, deleted)
+            columns = {name: column[keep] for name, column in columns.items()}
+        
+        if not present.all():
+            added = ~present
+            columns = {name: np.concatenate([column, fresh[name][added]]) for name, column in columns.items()}
+            # New files normally get the highest ids; anything else needs a re-sort
+            if np.any(np.diff(columns['id']) < 0):
+                order = np.argsort(columns['id'], kind='stable')
+                columns = {name: column[order] for name, column in columns.items()}
+        
+        self.columns = columns
+        self._orders.clear()
+    
+    def search(self, filters, after: Optional[Tuple[Any, int]], generation: int) -> Optional[Tuple[List[int], int, List[Any]]]:
+        """
+        One page of matching file ids, answered from the arrays
+        
+        Args:
+            filters: SearchFilters of the request
+            after: (sort value, file id) to continue after, or None to page by filters.offset
+            generation: Current library generation; the arrays catch up with the change log when it moved
+        
+        Returns:
+            Tuple of (ids of up to limit + 1 files in page order, total matches,
+            sort value of each returned file), or None when the model is not
+            loaded or cannot answer the search (text queries, title or path order)
+        """
+        if filters.search_query or filters.sort_by in UNSUPPORTED_SORTS:
+            return None
+        
+        with self._lock:
+            if not self._catch_up(generation):
+                return None
+            
+            mask = self.mask(filters)
+            total = int(np.count_nonzero(mask))
+            field = filters.sort_by if filters.sort_by in ('artist', 'album', 'size', 'bpm') else 'date_added'
+            rows = self._page(mask, total, field, filters.sort_order == 'desc', after,
+                              (0 if after is not None else filters.offset) + filters.limit + 1)
+            if after is None:
+                rows = rows[filters.offset:]
+            
+            return (
+                self.columns['id'][rows].tolist(),
+                total,
+                [self._sort_value(field, key) for key in self._sort_keys(field, rows).tolist()]
+            )
+    
+    def facets(self, filters, generation: int) -> Optional[Dict[str, Dict[Any, int]]]:
+        """
+        Counts of the matching files per genre, key, decade, format and BPM bucket
+        
+        Every facet is a bincount over the one filter mask. Genres group by
+        search key under their lowest spelling among the matches, and files
+        without a value are left out, as in the SQL fallback.
+        
+        Args:
+            filters: SearchFilters of the request
+            generation: Current library generation
+        
+        Returns:
+            Dict of facet name to {value: count}, or None when the model is
+            not loaded or the search has a text query
+        """
+        if filters.search_query:
+            return None
+        
+        with self._lock:
+            if not self._catch_up(generation):
+                return None
+            
+            columns, dictionaries = self.columns, self.dictionaries
+            mask = self.mask(filters)
+            facets = {}
+            
+            for field in ('key', 'format'):
+                values = dictionaries[field].values
+                tally = np.bincount(columns[field][mask], minlength=len(values))
+                facets[field] = {values[code]: int(tally[code]) for code in np.flatnonzero(tally) if values[code] is not None}
+            
+            genres = {}
+            values, keys = dictionaries['genre'].values, dictionaries['genre'].keys()
+            tally = np.bincount(columns['genre'][mask], minlength=len(values))
+            for code in np.flatnonzero(tally):
+                if keys[code] is not None:
+                    name, count = genres.get(keys[code], (values[code], 0))
+                    genres[keys[code]] = (min(name, values[code]), count + int(tally[code]))
+            facets['genre'] = dict(genres.values())
+            
+            # Decades and buckets truncate toward zero like SQLite's integer division and CAST
+            for field, column, width in (('decade', 'year', 10), ('bpm', 'bpm', BPM_BUCKET)):
+                numbers = columns[column][mask]
+                buckets = np.trunc(numbers[~np.isnan(numbers)] / width).astype(np.int64)
+                if len(buckets) == 0:
+                    facets[field] = {}
+                    continue
+                low = buckets.min()
+                tally = np.bincount(buckets - low)
+                facets[field] = {int(low + bucket) * width: int(tally[bucket]) for bucket in np.flatnonzero(tally)}
+            
+            return facets
+    
+    def _catch_up(self, generation: int) -> bool:
+        """Apply the change log if the generation moved; False when there is nothing loaded to search (call under the lock)"""
+        if self.columns is None:
+            return False
+        if generation != self.generation:
+            try:
+                with self.engine.connect() as conn:
+                    self._refresh(conn)
+            except Exception as e:
+                logger.error(f"Error refreshing search read model: {e}")
+                return False
+            self.generation = generation
+        return True
+    
+    def mask(self, filters) -> np.ndarray:
+        """Boolean array of the files passing every filter, with the same semantics as the SQL search"""
+        columns = self.columns
+        mask = np.ones(len(columns['id']), dtype=bool)
+        
+        # Artist and album match as you type, on the normalized key
+        for field in ('artist', 'album'):
+            value = getattr(filters, field)
+            if value:
+                prefix = normalize_name(value)
+                table = self.dictionaries[field].matching(prefix or None, prefix_upper_bound(prefix) if prefix else None)
+                mask &= table[columns[field]]
+        if filters.genre:
+            genre_key = normalize_name(filters.genre)
+            genres = self.dictionaries['genre']
+            # The range [key, key + '\0') holds exactly the key; a blank genre matches files without one, as in SQL
+            table = genres.matching(genre_key, genre_key + '\0') if genre_key else genres.without_key()
+            mask &= table[columns['genre']]
+        
+        if filters.year_from:
+            mask &= columns['year'] >= filters.year_from
+        if filters.year_to:
+            mask &= columns['year'] <= filters.year_to
+        if filters.bpm_min:
+            mask &= columns['bpm'] >= filters.bpm_min
+        if filters.bpm_max:
+            mask &= columns['bpm'] <= filters.bpm_max
+        
+        # A value that never occurred has code -1, which matches nothing
+        if filters.key_signature:
+            mask &= columns['key'] == self.dictionaries['key'].code(filters.key_signature)
+        if filters.status:
+            mask &= columns['status'] == self.dictionaries['status'].code(filters.status)
+        
+        if filters.size_min_mb:
+            mask &= columns['size'] >= filters.size_min_mb * 1024 * 1024
+        if filters.size_max_mb:
+            mask &= (columns['size'] >= 0) & (columns['size'] <= filters.size_max_mb * 1024 * 1024)
+        
+        if filters.has_duplicates is not None:
+            mask &= columns['dup_count'] > 0 if filters.has_duplicates else columns['dup_count'] == 0
+        
+        return mask
+    
+    def _sort_keys(self, field: str, rows=slice(None)) -> np.ndarray:
+        """Numbers ordering the given rows the way the SQL sort column does"""
+        columns = self.columns
+        if field in ('artist', 'album'):
+            _, ranks = self.dictionaries[field].ranks()
+            return ranks[columns[field][rows]]
+        if field == 'size':
+            return columns['size'][rows]
+        if field == 'bpm':
+            # coalesce(bpm, -1)
+            bpm = columns['bpm'][rows]
+            return np.where(np.isnan(bpm), -1.0, bpm)
+        return columns['created'][rows]
+    
+    def _sort_value(self, field: str, key) -> Any:
+        """The SQL sort column's value for a sort key, as cursors carry it"""
+        if field in ('artist', 'album'):
+            ordered, _ = self.dictionaries[field].ranks()
+            return ordered[key]
+        if field == 'date_added':
+            return None if key == np.iinfo(np.int64).min else (EPOCH + np.timedelta64(key, 'us')).astype(datetime)
+        return key
+    
+    def _cursor_key(self, field: str, value: Any) -> float:
+        """Sort key of a cursor's sort value; halfway between ranks if the value is no longer present"""
+        if field in ('artist', 'album'):
+            ordered, _ = self.dictionaries[field].ranks()
+            value = value or ''
+            rank = bisect_left(ordered, value)
+            return rank if rank < len(ordered) and ordered[rank] == value else rank - 0.5
+        if field == 'date_added':
+            return np.iinfo(np.int64).min if value is None else int((np.datetime64(value, 'us') - EPOCH).astype(np.int64))
+        return value
+    
+    def _order(self, field: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(row positions in ascending (key, id) order, keys in that order, ids in that order), cached until a refresh"""
+        order = self._orders.get(field)
+        if order is None:
+            keys = self._sort_keys(field)
+            positions = np.lexsort((self.columns['id'], keys))
+            order = self._orders[field] = (positions, keys[positions], self.columns['id'][positions])
+        return order
+    
+    def _page(self, mask: np.ndarray, total: int, field: str, descending: bool,
+              after: Optional[Tuple[Any, int]], wanted: int) -> np.ndarray:
+        """Row positions of the first `wanted` matches in sort order after the cursor"""
+        if total < WALK_MIN_FRACTION * len(mask):
+            # Few matches: sort just those
+            rows = np.flatnonzero(mask)
+            keys, ids = self._sort_keys(field, rows), self.columns['id'][rows]
+            if after is not None:
+                key, file_id = self._cursor_key(field, after[0]), after[1]
+                if descending:
+                    later = (keys < key) | ((keys == key) & (ids < file_id))
+                else:
+                    later = (keys > key) | ((keys == key) & (ids > file_id))
+                rows, keys, ids = rows[later], keys[later], ids[later]
+            order = np.lexsort((ids, keys))
+            if descending:
+                order = order[::-1]
+            return rows[order[:wanted]]
+        
+        # Many matches: walk the cached full order from the cursor until enough of them pass the mask
+        positions, keys, ids = self._order(field)
+        start, end = 0, len(positions)
+        if after is not None:
+            key, file_id = self._cursor_key(field, after[0]), after[1]
+            low, high = np.searchsorted(keys, key, 'left'), np.searchsorted(keys, key, 'right')
+            # Within a run of equal keys, ids ascend
+            if descending:
+                end = low + np.searchsorted(ids[low:high], file_id, 'left')
+            else:
+                start = low + np.searchsorted(ids[low:high], file_id, 'right')
+        sequence = positions[start:end][::-1] if descending else positions[start:end]
+        
+        found, count, offset, chunk = [], 0, 0, max(wanted * 4, 1024)
+        while count < wanted and offset < len(sequence):
+            block = sequence[offset:offset + chunk]
+            hits = block[mask[block]]
+            found.append(hits)
+            count += len(hits)
+            offset += chunk
+            chunk *= 2
+        return np.concatenate(found)[:wanted] if found else np.empty(0, dtype=np.int64)
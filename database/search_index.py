@@ -0,0 +1,199 @@
+"""SQLite FTS5 full-text index over tags and paths for library search"""
+import re
+from typing import List, Optional
+import logging
+
+from sqlalchemy import Float, Integer, text
+
+from database.directory_tree import joined_path_sql
+
+logger = logging.getLogger(__name__)
+
+# Tag columns in the order of TAG_WEIGHTS, so bm25() ranks an artist hit above a genre hit
+TAG_COLUMNS = ['artist', 'title', 'album', 'genre']
+TAG_WEIGHTS = [4.0, 3.0, 2.0, 1.0]
+
+# Trigram matching needs at least three characters
+MIN_PATH_QUERY = 3
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+def _directory_path(directory_id: str, filename: str) -> str:
+    """Subquery for the full path of a file stored as directory id + name"""
+    return f"(SELECT {joined_path_sql('path', filename)} FROM directories WHERE id = {directory_id})"
+
+SCHEMA = [
+    # External content table: the tag text lives only in metadata, the index is kept in sync by triggers
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS metadata_fts USING fts5(
+        {', '.join(TAG_COLUMNS)},
+        content='metadata', content_rowid='file_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS metadata_fts_insert AFTER INSERT ON metadata BEGIN
+        INSERT INTO metadata_fts(rowid, {', '.join(TAG_COLUMNS)})
+        VALUES (new.file_id, {', '.join('new.' + c for c in TAG_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS metadata_fts_delete AFTER DELETE ON metadata BEGIN
+        INSERT INTO metadata_fts(metadata_fts, rowid, {', '.join(TAG_COLUMNS)})
+        VALUES ('delete', old.file_id, {', '.join('old.' + c for c in TAG_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS metadata_fts_update AFTER UPDATE OF {', '.join(TAG_COLUMNS)} ON metadata BEGIN
+        INSERT INTO metadata_fts(metadata_fts, rowid, {', '.join(TAG_COLUMNS)})
+        VALUES ('delete', old.file_id, {', '.join('old.' + c for c in TAG_COLUMNS)});
+        INSERT INTO metadata_fts(rowid, {', '.join(TAG_COLUMNS)})
+        VALUES (new.file_id, {', '.join('new.' + c for c in TAG_COLUMNS)});
+    END""",
+    # Paths come from two tables, so this index stores its own copy, keyed by file id
+    """CREATE VIRTUAL TABLE IF NOT EXISTS path_fts USING fts5(
+        source_path, target_path,
+        tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS path_fts_file_insert AFTER INSERT ON files BEGIN
+        INSERT INTO path_fts(rowid, source_path) VALUES (new.id, {_directory_path('new.directory_id', 'new.filename')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS path_fts_file_update AFTER UPDATE OF directory_id, filename ON files BEGIN
+        UPDATE path_fts SET source_path = {_directory_path('new.directory_id', 'new.filename')} WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS path_fts_file_delete AFTER DELETE ON files BEGIN
+        DELETE FROM path_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS path_fts_migration_insert AFTER INSERT ON migrations BEGIN
+        UPDATE path_fts SET target_path = {_directory_path('new.target_directory_id', 'new.target_filename')}
+        WHERE rowid = new.file_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS path_fts_migration_update AFTER UPDATE OF target_directory_id, target_filename ON migrations BEGIN
+        UPDATE path_fts SET target_path = {_directory_path('new.target_directory_id', 'new.target_filename')}
+        WHERE rowid = new.file_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS path_fts_migration_delete AFTER DELETE ON migrations BEGIN
+        UPDATE path_fts SET target_path = NULL WHERE rowid = old.file_id;
+    END"""
+]
+
+TRIGGERS = [
+    'metadata_fts_insert', 'metadata_fts_delete', 'metadata_fts_update',
+    'path_fts_file_insert', 'path_fts_file_update', 'path_fts_file_delete',
+    'path_fts_migration_insert', 'path_fts_migration_update', 'path_fts_migration_delete'
+]
+
+DROP = [f'DROP TRIGGER IF EXISTS {name}' for name in TRIGGERS] + [
+    'DROP TABLE IF EXISTS metadata_fts',
+    'DROP TABLE IF EXISTS path_fts'
+]
+
+def create_search_index(conn) -> bool:
+    """
+    Create the FTS tables and their triggers, filling them if they are new
+    
+    Args:
+        conn: Connection inside a transaction
+    
+    Returns:
+        True if the index is available, False if this SQLite lacks FTS5 or the trigram tokenizer
+    """
+    existing = {row[0] for row in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE name IN ('metadata_fts', 'path_fts')"
+    ))}
+    
+    try:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+    except Exception as e:
+        logger.error(f"Full-text search index unavailable, falling back to LIKE search: {e}")
+        return False
+    
+    # Tables created by this call start empty; index the rows that are already there
+    if 'metadata_fts' not in existing:
+        conn.execute(text("INSERT INTO metadata_fts(metadata_fts) VALUES ('rebuild')"))
+        logger.info("Built metadata full-text index")
+    if 'path_fts' not in existing:
+        conn.execute(text(
+            "INSERT INTO path_fts(rowid, source_path, target_path) "
+            f"SELECT files.id, {joined_path_sql('source.path', 'files.filename')}, "
+            f"{joined_path_sql('target.path', 'migrations.target_filename')} "
+            "FROM files JOIN directories AS source ON source.id = files.directory_id "
+            "LEFT JOIN migrations ON migrations.file_id = files.id "
+            "LEFT JOIN directories AS target ON target.id = migrations.target_directory_id"
+        ))
+        logger.info("Built path trigram index")
+    
+    return True
+
+def drop_search_index(conn):
+    """Drop the FTS tables and the triggers that feed them"""
+    for statement in DROP:
+        conn.execute(text(statement))
+
+def tag_match_query(query: str) -> Optional[str]:
+    """
+    FTS5 query that requires every word, each as a prefix term
+    
+    Args:
+        query: Search text as typed
+    
+    Returns:
+        MATCH expression like '"beat"* "abbey"*', or None if there are no words
+    """
+    words = _WORD.findall(query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+def path_match_query(query: str) -> Optional[str]:
+    """
+    FTS5 trigram query matching the text as a substring of a path
+    
+    Args:
+        query: Search text as typed
+    
+    Returns:
+        Quoted MATCH phrase, or None if the text is too short for trigrams
+    """
+    query = query.strip()
+    if len(query) < MIN_PATH_QUERY:
+        return None
+    return '"' + query.replace('"', '""') + '"'
+
+def search_hits(query: str):
+    """
+    Subquery of (file_id, score) for files matching the search text
+    
+    Tag matches and path matches are unioned; score is the best bm25()
+    of either, where lower is more relevant.
+    
+    Args:
+        query: Search text as typed
+    
+    Returns:
+        Aliased selectable with file_id and score columns, or None if the text has nothing to match
+    """
+    branches: List[str] = []
+    params = {}
+    
+    tag_query = tag_match_query(query)
+    if tag_query:
+        weights = ', '.join(str(w) for w in TAG_WEIGHTS)
+        branches.append(
+            f"SELECT rowid AS file_id, bm25(metadata_fts, {weights}) AS score "
+            f"FROM metadata_fts WHERE metadata_fts MATCH :tag_query"
+        )
+        params['tag_query'] = tag_query
+    
+    path_query = path_match_query(query)
+    if path_query:
+        branches.append(
+            "SELECT rowid AS file_id, bm25(path_fts) AS score "
+            "FROM path_fts WHERE path_fts MATCH :path_query"
+        )
+        params['path_query'] = path_query
+    
+    if not branches:
+        return None
+    
+    if len(branches) == 1:
+        sql = branches[0]
+    else:
+        sql = f"SELECT file_id, min(score) AS score FROM ({' UNION ALL '.join(branches)}) GROUP BY file_id"
+    
+    statement = text(sql).bindparams(**params).columns(file_id=Integer, score=Float)
+    return statement.subquery('search_hits')
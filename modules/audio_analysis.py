@@ -300,14 +300,17 @@ class AudioAnalyzer:
         """Get audio analysis statistics from database"""
         try:
             with db_manager.get_session() as session:
-                total_analyzed = session.query(AudioAnalysis).count()
+                # Count and averages in one pass over the covering index
+                total_analyzed, avg_bpm, avg_energy, avg_danceability = session.query(
+                    func.count(AudioAnalysis.file_id),
+                    func.avg(AudioAnalysis.bpm),
+                    func.avg(AudioAnalysis.energy),
+                    func.avg(AudioAnalysis.danceability)
+                ).one()
                 
                 if total_analyzed == 0:
                     return {'total_analyzed': 0}
                 
-                # Average BPM
-                avg_bpm = session.query(func.avg(AudioAnalysis.bpm)).scalar() or 0
-                
                 # Key distribution
                 key_distribution = {}
                 for key, count in session.query(
@@ -317,17 +320,12 @@ class AudioAnalyzer:
                     if key:
                         key_distribution[key] = count
                 
-                # Average metrics
-                avg_energy = session.query(func.avg(AudioAnalysis.energy)).scalar() or 0
-                
-                avg_danceability = session.query(func.avg(AudioAnalysis.danceability)).scalar() or 0
-                
                 return {
                     'total_analyzed': total_analyzed,
-                    'average_bpm': round(avg_bpm, 1),
+                    'average_bpm': round(avg_bpm or 0, 1),
                     'key_distribution': key_distribution,
-                    'average_energy': round(avg_energy, 3),
-                    'average_danceability': round(avg_danceability, 3)
+                    'average_energy': round(avg_energy or 0, 3),
+                    'average_danceability': round(avg_danceability or 0, 3)
                 }
         
         except Exception as e:
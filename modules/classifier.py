@@ -5,10 +5,10 @@ from pathlib import Path
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 
-from sqlalchemy import select
 from database.db import db_manager
-from database.models import File, Metadata, Duplicate, Classification
+from database.models import File, Metadata, Classification
 from config import config
+from utils.pagination import encode_cursor, decode_cursor
 
 logger = logging.getLogger(__name__)
 
@@ -158,28 +158,11 @@ class AudioClassifier:
         try:
             with db_manager.get_session() as session:
                 if use_primary_only:
-                    # Get primary files from duplicate groups
-                    primary_duplicates = session.query(Duplicate).filter(
-                        Duplicate.is_primary == True
-                    ).all()
-                    
-                    primary_file_ids = {d.file_id for d in primary_duplicates}
-                    
-                    # Get non-duplicate files
-                    all_files = session.query(File).filter(
-                        File.status.in_(['indexed', 'analyzed'])
+                    # Non-duplicate files and the primary copy of each duplicate group
+                    files = session.query(File).filter(
+                        File.status.in_(['indexed', 'analyzed']),
+                        (File.dup_count == 0) | (File.is_primary == True)
                     ).all()
-                    
-                    non_dup_files = []
-                    for file in all_files:
-                        # Check if file is in any duplicate group
-                        dup = session.query(Duplicate).filter_by(file_id=file.id).first()
-                        if not dup:
-                            non_dup_files.append(file)
-                        elif file.id in primary_file_ids:
-                            non_dup_files.append(file)
-                    
-                    files = non_dup_files
                 else:
                     # Get all indexed/analyzed files
                     files = session.query(File).filter(
@@ -286,48 +269,72 @@ class AudioClassifier:
             logger.error(f"Error getting classification stats: {e}")
             return {}
     
-    def get_classifications(self, file_type: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    def get_classifications(self, file_type: Optional[str] = None, limit: int = 100,
+                            cursor: Optional[str] = None) -> Dict[str, Any]:
         """
-        Get classified files from database
+        Get a page of classified files from database
+        
+        Classifications are paged by keyset on file_id, and each page is read
+        with its file and metadata in one joined query.
         
         Args:
             file_type: Filter by type ('song', 'sample', 'unknown')
             limit: Maximum number of results
+            cursor: next_cursor from the previous page
         
         Returns:
-            List of classified files with details
+            Dictionary with the classified files and the cursor for the next page
+        
+        Raises:
+            ValueError: If the cursor is malformed
         """
+        after = decode_cursor(cursor)
+        if after is not None and len(after) != 1:
+            raise ValueError("Invalid cursor")
         classifications = []
+        next_cursor = None
         
         try:
             with db_manager.get_session() as session:
-                query = session.query(Classification)
+                query = session.query(
+                    Classification.file_id, Classification.file_type, Classification.confidence,
+                    Classification.classification_method, Classification.classification_details,
+                    File.source_path, File.file_size,
+                    Metadata.file_id.label('metadata_id'), Metadata.artist, Metadata.title,
+                    Metadata.duration_seconds
+                ).join(
+                    File, File.id == Classification.file_id
+                ).outerjoin(
+                    Metadata, Metadata.file_id == Classification.file_id
+                )
                 
                 if file_type:
-                    query = query.filter_by(file_type=file_type)
+                    query = query.filter(Classification.file_type == file_type)
+                if after:
+                    query = query.filter(Classification.file_id > after[0])
                 
-                results = query.limit(limit).all()
+                rows = query.order_by(Classification.file_id).limit(limit).all()
                 
-                for classification in results:
-                    file = session.query(File).get(classification.file_id)
-                    metadata = session.query(Metadata).filter_by(file_id=classification.file_id).first()
-                    
+                for row in rows:
                     classifications.append({
-                        'file_id': classification.file_id,
-                        'path': file.source_path,
-                        'size_mb': file.file_size / 1024 / 1024,
-                        'type': classification.file_type,
-                        'confidence': classification.confidence,
-                        'method': classification.classification_method,
-                        'details': classification.classification_details,
+                        'file_id': row.file_id,
+                        'path': row.source_path,
+                        'size_mb': (row.file_size or 0) / 1024 / 1024,
+                        'type': row.file_type,
+                        'confidence': row.confidence,
+                        'method': row.classification_method,
+                        'details': row.classification_details,
                         'metadata': {
-                            'artist': metadata.artist if metadata else None,
-                            'title': metadata.title if metadata else None,
-                            'duration': metadata.duration if metadata else None
-                        } if metadata else None
+                            'artist': row.artist,
+                            'title': row.title,
+                            'duration': row.duration_seconds
+                        } if row.metadata_id is not None else None
                     })
+                
+                if len(rows) == limit:
+                    next_cursor = encode_cursor([rows[-1].file_id])
         
         except Exception as e:
             logger.error(f"Error getting classifications: {e}")
         
-        return classifications
\ No newline at end of file
+        return {'classifications': classifications, 'next_cursor': next_cursor}
\ No newline at end of file
@@ -1,20 +1,73 @@
 """Duplicate detection module with multi-level detection"""
-import uuid
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from collections import defaultdict
 import logging
 
+from sqlalchemy import func, exists, tuple_
 from database.db import db_manager
-from database.models import File, Duplicate, Metadata
+from database.models import File, Duplicate, DuplicateGroup, DuplicateMatch, Metadata
+from database.directory_tree import subtree_ids
+from modules.fingerprint import AudioFingerprinter
+from modules.fuzzy_matcher import FuzzyDuplicateMatcher
+from utils.pagination import encode_cursor, decode_cursor
 from config import config
 
 logger = logging.getLogger(__name__)
 
+# Exact-key signals: (reason, column, joined model or None, condition on the key or None).
+# Only keys covering the whole file are unioned into groups whose extra copies are skipped
+EXACT_SIGNALS = [
+    ('file_hash', File.file_hash, None, None),
+    # Only the FLAC MD5 of the decoded audio; a LAME CRC16 plus music length is
+    # shared by unrelated equal-length CBR loops, so it only verifies copies
+    ('native_checksum', Metadata.native_checksum, Metadata, Metadata.native_checksum.like('flac:%'))
+]
+
+# Keys matched the same way but kept as near evidence next to fingerprint pairs:
+# equal decoded audio can still be a different file (a WAV and its FLAC), so no copy is skipped
+NEAR_SIGNALS = [
+    ('audio_hash', File.audio_hash, None, None)
+]
+
+class DisjointSet:
+    """Union-find over file ids with union by size and path halving"""
+    
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+    
+    def find(self, item: int) -> int:
+        """Return the representative of the set containing item"""
+        parent = self.parent
+        if item not in parent:
+            parent[item] = item
+            self.size[item] = 1
+            return item
+        
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+    
+    def union(self, a: int, b: int) -> int:
+        """Merge the sets containing a and b and return the new root"""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return root_a
+
 class DuplicateDetector:
     def __init__(self):
         self.min_song_size = config.get('deduplication.min_song_size_mb', 2) * 1024 * 1024
         self.max_sample_size = config.get('deduplication.max_sample_size_mb', 0.5) * 1024 * 1024
+        self.fingerprinter = AudioFingerprinter()
+        self.fuzzy_matcher = FuzzyDuplicateMatcher()
         self.progress_callback = None
     
     def set_progress_callback(self, callback):
@@ -25,27 +78,51 @@ class DuplicateDetector:
         """
         Find duplicate files using multi-level detection
         
+        Every signal (byte hash, FLAC checksum, decoded audio hash,
+        fingerprint, fuzzy tags) contributes evidence edges between files.
+        Exact edges are merged with union-find into final groups, so a file
+        matched by several exact signals still ends up in exactly one group.
+        Audio hash, fingerprint and fuzzy tag edges are near evidence: they
+        are never chained, and a pair they link across groups is saved as a
+        suggested group that migration and classification do not skip.
+        
         Returns:
             Dictionary with duplicate detection results
         """
         logger.info("Starting duplicate detection...")
         
-        # Level 1: Group by file size and hash
-        logger.info("Grouping files by hash...")
-        hash_groups = self._group_by_hash()
-        logger.info(f"Found {len(hash_groups)} unique hash groups")
+        # Level 1: Exact keys shared by several files
+        logger.info("Collecting exact-match edges...")
+        exact_edges = self._collect_key_edges(EXACT_SIGNALS)
+        
+        # Level 2: Near duplicates (same decoded audio, re-encodes by fingerprint, re-tags by fuzzy metadata)
+        near_edges = self._collect_key_edges(NEAR_SIGNALS)
+        if self.fingerprinter.enabled:
+            near_edges.extend(self._pairs_to_edges(self.fingerprinter.find_candidate_pairs(), 'fingerprint'))
+        if self.fuzzy_matcher.enabled:
+            self.fuzzy_matcher.set_progress_callback(self.progress_callback)
+            near_edges.extend(self._pairs_to_edges(self.fuzzy_matcher.find_candidate_pairs(), 'fuzzy_tags'))
         
-        # Level 2: Analyze groups and score quality
+        # Level 3: Merge exact evidence into groups, near evidence into suggested pairs
+        logger.info(f"Merging {len(exact_edges)} exact and {len(near_edges)} near-duplicate edges...")
+        groups = self._merge_edges(exact_edges, near_edges)
+        suggested = sum(1 for group in groups.values() if group['suggested'])
+        logger.info(f"Found {len(groups) - suggested} duplicate groups and {suggested} suggested pairs")
+        
+        # Level 4: Score quality and pick a primary per merged group
         logger.info("Analyzing duplicate groups and scoring quality...")
-        duplicate_groups = self._analyze_duplicate_groups(hash_groups)
+        duplicate_groups = self._analyze_duplicate_groups(groups)
         
         # Save results to database
         logger.info("Saving duplicate groups to database...")
         self._save_duplicate_groups(duplicate_groups)
         
+        confirmed = [group for group in duplicate_groups.values() if not group['suggested']]
         stats = {
-            'total_groups': len(duplicate_groups),
-            'total_duplicates': sum(len(group['files']) for group in duplicate_groups.values()),
+            'total_groups': len(confirmed),
+            'total_duplicates': sum(len(group['files']) for group in confirmed),
+            'suggested_groups': len(duplicate_groups) - len(confirmed),
+            'total_edges': len(exact_edges) + len(near_edges),
             'space_savings': self._calculate_space_savings(duplicate_groups)
         }
         
@@ -54,83 +131,165 @@ class DuplicateDetector:
         
         return stats
     
-    def _group_by_hash(self) -> Dict[str, List[File]]:
-        """Group files by their hash"""
-        hash_groups = defaultdict(list)
+    def _collect_key_edges(self, signals) -> List[Tuple[int, int, str, float]]:
+        """
+        Build edges for files sharing a key of one of the given signals
+        
+        The GROUP BY runs in SQLite and only rows whose key repeats come back.
+        Each run of equal keys becomes a chain of k-1 edges to its first file,
+        which is enough for union-find to connect the whole run.
+        """
+        edges = []
         
         try:
             with db_manager.get_session() as session:
-                # Get all indexed files - no size filtering, we'll classify later
-                files = session.query(File).filter(
-                    File.file_hash.isnot(None)
-                ).all()
-                
-                total_files = len(files)
-                
-                logger.info(f"Processing {total_files} files for duplicate detection")
-                
-                for i, file in enumerate(files):
-                    hash_groups[file.file_hash].append(file)
+                for reason, column, model, condition in signals:
+                    repeated = session.query(column)
+                    if model is not None:
+                        repeated = repeated.select_from(model)
+                    repeated = repeated.filter(column.isnot(None))
+                    if condition is not None:
+                        repeated = repeated.filter(condition)
+                    repeated = repeated.group_by(column).having(func.count() > 1)
+                    
+                    query = session.query(File.id, column)
+                    if model is not None:
+                        query = query.join(model, model.file_id == File.id)
+                    rows = query.filter(column.in_(repeated)).order_by(column, File.id)
+                    
+                    first_id, current_key, count = None, None, 0
+                    for file_id, key in rows.yield_per(10000):
+                        if key != current_key:
+                            first_id, current_key = file_id, key
+                            continue
+                        edges.append((first_id, file_id, reason, 1.0))
+                        count += 1
                     
-                    if self.progress_callback and i % 10 == 0:  # More frequent updates
+                    logger.info(f"{reason}: {count} edges")
+                    
+                    if self.progress_callback:
                         self.progress_callback({
-                            'operation': 'duplicates',  # Fixed: was 'duplicate_detection'
-                            'progress': i + 1,
-                            'total': total_files,
-                            'message': f"Grouping files by hash: {i + 1}/{total_files}"
+                            'operation': 'duplicates',
+                            'progress': len(edges),
+                            'total': len(edges),
+                            'message': f"Matched files by {reason}: {count} edges"
                         })
-                
-                # Send final progress
-                if self.progress_callback:
-                    self.progress_callback({
-                        'operation': 'duplicates',
-                        'progress': total_files,
-                        'total': total_files,
-                        'message': f"Completed grouping {total_files} files"
-                    })
         
         except Exception as e:
-            logger.error(f"Error grouping files by hash: {e}")
+            logger.error(f"Error collecting key-match edges: {e}")
+        
+        return edges
+    
+    def _pairs_to_edges(self, pairs: List[Dict[str, Any]], reason: str) -> List[Tuple[int, int, str, float]]:
+        """Convert candidate pairs from a matcher into evidence edges"""
+        return [
+            (pair['file_a'], pair['file_b'], pair.get('reason', reason), pair['confidence'])
+            for pair in pairs
+        ]
+    
+    def _merge_edges(self, exact_edges: List[Tuple[int, int, str, float]],
+                     near_edges: List[Tuple[int, int, str, float]]) -> Dict[Any, Dict[str, Any]]:
+        """
+        Merge exact evidence into groups with union-find, and near evidence into suggested pairs
+        
+        Runs in O(E * alpha(N)): one union per exact edge, then one find per
+        edge and per file to bucket edges and members by their root. A near
+        edge inside an exact group only adds evidence to it; one between
+        files of different groups becomes a suggested group of just those two
+        files, so a chain of near matches never joins unrelated files.
+        
+        Returns:
+            Groups keyed by root file id, and suggested pairs keyed by (file, file)
+        """
+        components = DisjointSet()
+        for file_a, file_b, _, _ in exact_edges:
+            components.union(file_a, file_b)
+        
+        groups = defaultdict(lambda: {'file_ids': [], 'edges': [], 'suggested': False})
+        for file_id in components.parent:
+            groups[components.find(file_id)]['file_ids'].append(file_id)
+        for edge in exact_edges:
+            groups[components.find(edge[0])]['edges'].append(edge)
+        
+        for edge in near_edges:
+            file_a, file_b = edge[0], edge[1]
+            # find() would add unseen files as new groups of one
+            root_a = components.find(file_a) if file_a in components.parent else file_a
+            root_b = components.find(file_b) if file_b in components.parent else file_b
+            if root_a == root_b:
+                groups[root_a]['edges'].append(edge)
+            else:
+                pair = (min(file_a, file_b), max(file_a, file_b))
+                groups.setdefault(pair, {'file_ids': list(pair), 'edges': [], 'suggested': True})['edges'].append(edge)
         
-        # Filter out non-duplicates
-        return {h: files for h, files in hash_groups.items() if len(files) > 1}
+        return dict(groups)
     
-    def _analyze_duplicate_groups(self, hash_groups: Dict[str, List[File]]) -> Dict[str, Dict[str, Any]]:
+    def _analyze_duplicate_groups(self, groups: Dict[Any, Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
         """Analyze duplicate groups and score quality"""
         duplicate_groups = {}
-        total_groups = len(hash_groups)
+        total_groups = len(groups)
+        group_items = list(groups.values())
         
-        for idx, (hash_value, files) in enumerate(hash_groups.items()):
-            if self.progress_callback and idx % 10 == 0:
+        # Load members with their metadata a few hundred groups at a time
+        for start in range(0, total_groups, 500):
+            chunk = group_items[start:start + 500]
+            file_ids = [file_id for group in chunk for file_id in group['file_ids']]
+            records = self._load_files(file_ids)
+            
+            for group in chunk:
+                # Score each file in the group
+                scored_files = []
+                for file_id in group['file_ids']:
+                    if file_id not in records:
+                        continue
+                    file, metadata = records[file_id]
+                    scored_files.append({
+                        'file': file,
+                        'score': self._calculate_quality_score(file, metadata)
+                    })
+                
+                if len(scored_files) < 2:
+                    continue
+                
+                # Sort by quality score (highest first), larger file breaks ties
+                scored_files.sort(key=lambda x: (x['score'], x['file'].file_size or 0), reverse=True)
+                
+                # Groups are renumbered on every run; the tables are rewritten whole
+                duplicate_groups[len(duplicate_groups) + 1] = {
+                    'files': scored_files,
+                    'primary': scored_files[0]['file'],  # Best quality file
+                    'edges': group['edges'],
+                    'suggested': group['suggested']
+                }
+            
+            if self.progress_callback:
                 self.progress_callback({
                     'operation': 'duplicates',
-                    'progress': idx,
+                    'progress': min(start + 500, total_groups),
                     'total': total_groups,
-                    'message': f"Analyzing duplicate group {idx}/{total_groups}"
-                })
-            group_id = str(uuid.uuid4())
-            
-            # Score each file in the group
-            scored_files = []
-            for file in files:
-                score = self._calculate_quality_score(file)
-                scored_files.append({
-                    'file': file,
-                    'score': score
+                    'message': f"Analyzing duplicate group {min(start + 500, total_groups)}/{total_groups}"
                 })
+        
+        return duplicate_groups
+    
+    def _load_files(self, file_ids: List[int]) -> Dict[int, Tuple[File, Optional[Metadata]]]:
+        """Load files and their metadata in one query, detached from the session"""
+        records = {}
+        
+        with db_manager.get_session() as session:
+            rows = session.query(File, Metadata).outerjoin(
+                Metadata, File.id == Metadata.file_id
+            ).filter(File.id.in_(file_ids)).all()
             
-            # Sort by quality score (highest first)
-            scored_files.sort(key=lambda x: x['score'], reverse=True)
+            for file, metadata in rows:
+                records[file.id] = (file, metadata)
             
-            duplicate_groups[group_id] = {
-                'files': scored_files,
-                'primary': scored_files[0]['file'],  # Best quality file
-                'hash': hash_value
-            }
+            # Keep loaded attributes usable after the session commits
+            session.expunge_all()
         
-        return duplicate_groups
+        return records
     
-    def _calculate_quality_score(self, file: File) -> int:
+    def _calculate_quality_score(self, file: File, metadata: Optional[Metadata]) -> int:
         """
         Calculate quality score for a file
         Higher score = better quality
@@ -138,83 +297,118 @@ class DuplicateDetector:
         score = 0
         
         try:
-            with db_manager.get_session() as session:
-                # Re-attach the file to this session
-                file = session.merge(file)
-                # Get metadata if available
-                metadata = session.query(Metadata).filter_by(file_id=file.id).first()
-                
-                if metadata:
-                    # Bitrate score (higher is better)
-                    if metadata.bitrate:
-                        if metadata.bitrate >= 320:
-                            score += 100
-                        elif metadata.bitrate >= 256:
-                            score += 80
-                        elif metadata.bitrate >= 192:
-                            score += 60
-                        elif metadata.bitrate >= 128:
-                            score += 40
-                        else:
-                            score += 20
-                    
-                    # Format score
-                    if metadata.format:
-                        format_scores = {
-                            'flac': 150,
-                            'wav': 140,
-                            'm4a': 90,
-                            'mp3': 70,
-                            'aac': 60,
-                            'ogg': 50,
-                            'wma': 30
-                        }
-                        score += format_scores.get(metadata.format.lower(), 0)
-                    
-                    # Metadata completeness score
-                    if metadata.artist:
+            if metadata:
+                # Bitrate score (higher is better)
+                if metadata.bitrate:
+                    if metadata.bitrate >= 320:
+                        score += 100
+                    elif metadata.bitrate >= 256:
+                        score += 80
+                    elif metadata.bitrate >= 192:
+                        score += 60
+                    elif metadata.bitrate >= 128:
+                        score += 40
+                    else:
                         score += 20
-                    if metadata.album:
-                        score += 20
-                    if metadata.title:
-                        score += 20
-                    if metadata.year:
-                        score += 10
                 
-                # File path score (prefer organized paths)
-                path = Path(file.source_path)
-                if any(part in path.parts for part in ['Music', 'music', 'Audio']):
+                # Format score
+                if metadata.format:
+                    format_scores = {
+                        'flac': 150,
+                        'wav': 140,
+                        'm4a': 90,
+                        'mp3': 70,
+                        'aac': 60,
+                        'ogg': 50,
+                        'wma': 30
+                    }
+                    score += format_scores.get(metadata.format.lower(), 0)
+                
+                # Metadata completeness score
+                if metadata.artist:
+                    score += 20
+                if metadata.album:
+                    score += 20
+                if metadata.title:
+                    score += 20
+                if metadata.year:
                     score += 10
-                if 'backup' in path.parts or 'Backup' in path.parts:
-                    score -= 20  # Penalize backup copies
+            
+            # File path score (prefer organized paths)
+            path = Path(file.source_path)
+            if any(part in path.parts for part in ['Music', 'music', 'Audio']):
+                score += 10
+            if 'backup' in path.parts or 'Backup' in path.parts:
+                score -= 20  # Penalize backup copies
         
         except Exception as e:
             logger.error(f"Error calculating quality score for {file.source_path}: {e}")
         
         return score
     
-    def _save_duplicate_groups(self, duplicate_groups: Dict[str, Dict[str, Any]]):
-        """Save duplicate groups to database"""
+    def _save_duplicate_groups(self, duplicate_groups: Dict[int, Dict[str, Any]]):
+        """Save duplicate groups and their evidence edges to database"""
         try:
             with db_manager.get_session() as session:
                 # Clear existing duplicate records
+                session.query(DuplicateMatch).delete()
+                session.query(DuplicateGroup).delete()
                 session.query(Duplicate).delete()
+                session.query(File).filter(File.dup_count > 0).update(
+                    {'dup_count': 0, 'is_primary': False}, synchronize_session=False
+                )
+                
+                duplicate_rows = []
+                match_rows = []
+                group_rows = []
+                file_rows = []
                 
                 for group_id, group_data in duplicate_groups.items():
-                    # Re-attach primary file to session to get its ID
-                    primary_file = session.merge(group_data['primary'])
+                    primary_id = group_data['primary'].id
+                    sizes = [item['file'].file_size or 0 for item in group_data['files']]
+                    suggested = group_data['suggested']
+                    
+                    # Materialized summary so browsing never aggregates members
+                    group_rows.append({
+                        'group_id': group_id,
+                        'file_count': len(sizes),
+                        'total_bytes': sum(sizes),
+                        'reclaimable_bytes': sum(sizes[1:]),  # Everything but the primary
+                        'primary_file_id': primary_id,
+                        'reasons': ','.join(sorted({edge[2] for edge in group_data['edges']})),
+                        'suggested': suggested,
+                        'confidence': min(edge[3] for edge in group_data['edges']) if suggested else 1.0
+                    })
                     
                     for item in group_data['files']:
-                        file = session.merge(item['file'])  # Re-attach file to session
-                        is_primary = (file.id == primary_file.id)
-                        
-                        duplicate = Duplicate(
-                            group_id=group_id,
-                            file_id=file.id,
-                            is_primary=is_primary,
-                            quality_score=item['score']
-                        )
-                        session.add(duplicate)
+                        duplicate_rows.append({
+                            'group_id': group_id,
+                            'file_id': item['file'].id,
+                            'is_primary': item['file'].id == primary_id,
+                            'quality_score': item['score']
+                        })
+                        # Denormalized onto the file so filters never join the duplicate tables;
+                        # only exact groups mark copies that migration and classification skip
+                        if not suggested:
+                            file_rows.append({
+                                'id': item['file'].id,
+                                'dup_count': len(sizes),
+                                'is_primary': item['file'].id == primary_id
+                            })
+                    
+                    for file_a, file_b, reason, confidence in group_data['edges']:
+                        match_rows.append({
+                            'group_id': group_id,
+                            'file_id_a': file_a,
+                            'file_id_b': file_b,
+                            'reason': reason,
+                            'confidence': confidence
+                        })
+                
+                session.bulk_insert_mappings(Duplicate, duplicate_rows)
+                session.bulk_insert_mappings(DuplicateMatch, match_rows)
+                session.bulk_insert_mappings(DuplicateGroup, group_rows)
+                session.bulk_update_mappings(File, file_rows)
                 
                 session.commit()
                 logger.info(f"Saved {len(duplicate_groups)} duplicate groups to database")
@@ -222,76 +416,123 @@ class DuplicateDetector:
         except Exception as e:
             logger.error(f"Error saving duplicate groups: {e}")
     
-    def _calculate_space_savings(self, duplicate_groups: Dict[str, Dict[str, Any]]) -> int:
+    def _calculate_space_savings(self, duplicate_groups: Dict[int, Dict[str, Any]]) -> int:
         """Calculate potential space savings from removing duplicates"""
         total_savings = 0
         
-        try:
-            with db_manager.get_session() as session:
-                for group_data in duplicate_groups.values():
-                    # Sum size of all non-primary files
-                    for item in group_data['files'][1:]:  # Skip primary file
-                        file = session.merge(item['file'])  # Re-attach to session
-                        total_savings += file.file_size
-        except Exception as e:
-            logger.error(f"Error calculating space savings: {e}")
+        for group_data in duplicate_groups.values():
+            if group_data['suggested']:
+                continue
+            # Sum size of all non-primary files
+            for item in group_data['files'][1:]:  # Skip primary file
+                total_savings += item['file'].file_size or 0
         
         return total_savings
     
-    def get_duplicate_groups(self, limit: int = 100) -> List[Dict[str, Any]]:
+    def get_duplicate_groups(self, limit: int = 100, cursor: Optional[str] = None,
+                             sort_by: str = 'reclaimable', format: Optional[str] = None,
+                             directory: Optional[str] = None) -> Dict[str, Any]:
         """
-        Get duplicate groups from database
+        Get a page of duplicate groups from database
+        
+        Groups come from the summaries materialized by find_duplicates and are
+        paged by keyset on (sort value, group_id), so deep pages cost the same
+        as the first. Members of the whole page are fetched in one joined query.
         
         Args:
             limit: Maximum number of groups to return
+            cursor: next_cursor from the previous page
+            sort_by: 'reclaimable' (bytes freed by dropping non-primaries) or 'count'
+            format: Only groups with a member in this format (mp3, flac, ...)
+            directory: Only groups with a member under this directory
         
         Returns:
-            List of duplicate groups with file information
+            Dictionary with the groups and the cursor for the next page
+        
+        Raises:
+            ValueError: If the cursor is malformed
         """
-        groups = []
+        sort_column = {
+            'reclaimable': DuplicateGroup.reclaimable_bytes,
+            'count': DuplicateGroup.file_count
+        }.get(sort_by, DuplicateGroup.reclaimable_bytes)
         
-        try:
-            with db_manager.get_session() as session:
-                # Get unique group IDs
-                group_ids = session.query(Duplicate.group_id).distinct().limit(limit).all()
-                
-                for (group_id,) in group_ids:
-                    # Get all files in this group
-                    duplicates = session.query(Duplicate).filter_by(group_id=group_id).all()
-                    
-                    group_files = []
-                    primary_file = None
-                    
-                    for dup in duplicates:
-                        file = session.query(File).get(dup.file_id)
-                        metadata = session.query(Metadata).filter_by(file_id=dup.file_id).first()
-                        
-                        file_info = {
-                            'id': file.id,
-                            'path': file.source_path,
-                            'size': file.file_size,
-                            'is_primary': dup.is_primary,
-                            'quality_score': dup.quality_score,
-                            'metadata': {
-                                'artist': metadata.artist if metadata else None,
-                                'title': metadata.title if metadata else None,
-                                'bitrate': metadata.bitrate if metadata else None,
-                                'format': metadata.format if metadata else None
-                            }
-                        }
-                        
-                        group_files.append(file_info)
-                        if dup.is_primary:
-                            primary_file = file_info
-                    
-                    groups.append({
-                        'group_id': group_id,
-                        'files': group_files,
-                        'primary': primary_file,
-                        'count': len(group_files)
-                    })
+        after = decode_cursor(cursor)
+        if after is not None and len(after) != 2:
+            raise ValueError("Invalid cursor")
+        groups = []
         
-        except Exception as e:
-            logger.error(f"Error getting duplicate groups: {e}")
+        with db_manager.get_session() as session:
+            query = session.query(DuplicateGroup)
+            
+            if format:
+                query = query.filter(exists().where(
+                    Duplicate.group_id == DuplicateGroup.group_id,
+                    Metadata.file_id == Duplicate.file_id,
+                    Metadata.format == format.lower()
+                ))
+            if directory:
+                query = query.filter(exists().where(
+                    Duplicate.group_id == DuplicateGroup.group_id,
+                    File.id == Duplicate.file_id,
+                    File.directory_id.in_(subtree_ids(directory))
+                ))
+            
+            # Largest first, group_id breaks ties so the order is total
+            if after:
+                query = query.filter(tuple_(sort_column, DuplicateGroup.group_id) < tuple_(*after))
+            summaries = query.order_by(
+                sort_column.desc(), DuplicateGroup.group_id.desc()
+            ).limit(limit).all()
+            
+            if not summaries:
+                return {'groups': [], 'next_cursor': None}
+            
+            # One joined query for every member on the page
+            group_ids = [summary.group_id for summary in summaries]
+            members = defaultdict(list)
+            rows = session.query(Duplicate, File, Metadata).join(
+                File, File.id == Duplicate.file_id
+            ).outerjoin(
+                Metadata, Metadata.file_id == Duplicate.file_id
+            ).filter(
+                Duplicate.group_id.in_(group_ids)
+            ).order_by(
+                Duplicate.is_primary.desc(), Duplicate.quality_score.desc()
+            )
+            
+            for dup, file, metadata in rows:
+                members[dup.group_id].append({
+                    'id': file.id,
+                    'path': file.source_path,
+                    'size': file.file_size,
+                    'is_primary': dup.is_primary,
+                    'quality_score': dup.quality_score,
+                    'metadata': {
+                        'artist': metadata.artist if metadata else None,
+                        'title': metadata.title if metadata else None,
+                        'bitrate': metadata.bitrate if metadata else None,
+                        'format': metadata.format if metadata else None
+                    }
+                })
+            
+            for summary in summaries:
+                group_files = members[summary.group_id]
+                groups.append({
+                    'group_id': summary.group_id,
+                    'files': group_files,
+                    'primary': next((f for f in group_files if f['is_primary']), None),
+                    'count': summary.file_count,
+                    'total_bytes': summary.total_bytes,
+                    'reclaimable_bytes': summary.reclaimable_bytes,
+                    'reasons': summary.reasons.split(',') if summary.reasons else [],
+                    'suggested': bool(summary.suggested),
+                    'confidence': summary.confidence
+                })
+            
+            next_cursor = None
+            if len(summaries) == limit:
+                last = summaries[-1]
+                next_cursor = encode_cursor([getattr(last, sort_column.key), last.group_id])
         
-        return groups
\ No newline at end of file
+        return {'groups': groups, 'next_cursor': next_cursor}
@@ -0,0 +1,305 @@
+"""Metadata enrichment from MusicBrainz and AcoustID"""
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+from database.db import db_manager
+from database.models import File, Metadata
+from utils.lookup_client import LookupClient, ResponseCache
+from utils.normalize import add_search_keys, normalize_name
+from config import config
+
+try:
+    import acoustid
+    ACOUSTID_AVAILABLE = True
+except ImportError:
+    ACOUSTID_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+LUCENE_SPECIAL = re.compile(r'([\\"])')
+
+class MetadataEnricher:
+    """
+    Looks up recordings on MusicBrainz (by artist and title) or AcoustID (by
+    Chromaprint fingerprint, for untagged files) and fills empty fields
+    
+    Lookups run on a thread pool so requests overlap network latency, while
+    each service's client keeps request starts at its published rate limit
+    (MusicBrainz 1/s, AcoustID 3/s). Tracks with the same normalized artist
+    and title share one lookup, and responses are cached on disk with a TTL,
+    so re-running enrichment only asks about new tracks.
+    """
+    
+    def __init__(self):
+        self.enabled = config.get('enrichment.enabled', False)
+        self.concurrency = config.get('enrichment.concurrency', 4)
+        self.min_score = config.get('enrichment.min_score', 90)
+        self.duration_tolerance = config.get('enrichment.duration_tolerance_seconds', 5)
+        self.use_acoustid = config.get('enrichment.use_acoustid', False)
+        self.acoustid_key = config.get('api_keys.acoustid', '')
+        self.batch_size = config.get('metadata.write_batch_size', 1000)
+        self.progress_callback = None
+        self.should_stop = False
+        
+        user_agent = config.get('api_keys.musicbrainz_user_agent', 'MusicSorter/1.0')
+        cache = ResponseCache(
+            config.get('enrichment.cache_path', 'lookup_cache.db'),
+            config.get('enrichment.cache_ttl_days', 30) * 86400
+        )
+        self.musicbrainz = LookupClient(
+            config.get('enrichment.musicbrainz_url', 'https://musicbrainz.org'),
+            user_agent,
+            config.get('enrichment.musicbrainz_rate', 1.0),
+            cache
+        )
+        self.acoustid = LookupClient(
+            config.get('enrichment.acoustid_url', 'https://api.acoustid.org'),
+            user_agent,
+            config.get('enrichment.acoustid_rate', 3.0),
+            cache
+        )
+    
+    def set_progress_callback(self, callback):
+        """Set callback for progress updates"""
+        self.progress_callback = callback
+    
+    def stop(self):
+        """Signal to stop enrichment"""
+        self.should_stop = True
+    
+    def enrich_library(self) -> Dict[str, Any]:
+        """
+        Look up every file that has not been matched to a recording yet
+        
+        Returns:
+            Dictionary with lookup, match and request counts
+        """
+        logger.info("Starting metadata enrichment...")
+        self.should_stop = False
+        
+        jobs = self._build_jobs()
+        total_jobs = len(jobs)
+        logger.info(f"Enriching metadata with {total_jobs} distinct lookups")
+        
+        matched = 0
+        failed = 0
+        updates = []
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {
+                executor.submit(self._run_job, key, job['query']): job['rows']
+                for key, job in jobs.items()
+            }
+            
+            for i, future in enumerate(as_completed(futures)):
+                rows = futures[future]
+                
+                try:
+                    candidates = future.result()
+                except Exception as e:
+                    logger.error(f"Lookup failed for file {rows[0]['file_id']}: {e}")
+                    failed += 1
+                    candidates = []
+                
+                for row in rows:
+                    update = self._build_update(row, self._best_candidate(row, candidates))
+                    if update:
+                        updates.append(update)
+                        matched += 1
+                
+                if len(updates) >= self.batch_size:
+                    self._write_updates(updates)
+                    updates = []
+                
+                if self.progress_callback and (i % 10 == 0 or i == total_jobs - 1):
+                    self.progress_callback({
+                        'operation': 'enrichment',
+                        'progress': i + 1,
+                        'total': total_jobs,
+                        'message': f"Looking up metadata: {i + 1}/{total_jobs}"
+                    })
+        
+        self._write_updates(updates)
+        logger.info(f"Enrichment complete: {matched} files matched, {failed} lookups failed")
+        
+        return {
+            'lookups': total_jobs,
+            'matched': matched,
+            'failed': failed,
+            'musicbrainz': dict(self.musicbrainz.stats),
+            'acoustid': dict(self.acoustid.stats)
+        }
+    
+    def _build_jobs(self) -> Dict[Tuple, Dict[str, Any]]:
+        """
+        Group unmatched files by the lookup that answers them
+        
+        Returns:
+            Dictionary of lookup key to {'query': lookup arguments, 'rows': files it answers}
+        """
+        jobs = {}
+        acoustid_ready = self.use_acoustid and self.acoustid_key and ACOUSTID_AVAILABLE
+        
+        with db_manager.get_session() as session:
+            rows = session.query(
+                Metadata.file_id,
+                File.source_path,
+                Metadata.artist,
+                Metadata.title,
+                Metadata.album,
+                Metadata.year,
+                Metadata.duration_seconds
+            ).join(File, File.id == Metadata.file_id).filter(
+                Metadata.musicbrainz_id.is_(None)
+            ).yield_per(10000)
+            
+            for file_id, source_path, artist, title, album, year, duration in rows:
+                if artist and title:
+                    # Spelling variants of the same song share one query
+                    key = ('search', normalize_name(artist), normalize_name(title))
+                    query = (artist, title)
+                elif acoustid_ready:
+                    key = ('acoustid', source_path)
+                    query = (source_path,)
+                else:
+                    continue
+                
+                job = jobs.setdefault(key, {'query': query, 'rows': []})
+                job['rows'].append({
+                    'file_id': file_id,
+                    'artist': artist,
+                    'title': title,
+                    'album': album,
+                    'year': year,
+                    'duration': duration
+                })
+        
+        return jobs
+    
+    def _run_job(self, key: Tuple, query: Tuple) -> List[Dict[str, Any]]:
+        """Run one lookup and return normalized candidate recordings"""
+        if self.should_stop:
+            return []
+        
+        if key[0] == 'search':
+            return self.search_recording(*query)
+        return self.lookup_fingerprint(*query)
+    
+    def search_recording(self, artist: str, title: str) -> List[Dict[str, Any]]:
+        """
+        Search MusicBrainz recordings by artist and title
+        
+        Args:
+            artist: Artist name
+            title: Track title
+        
+        Returns:
+            Candidate recordings with mbid, title, artist, album, year, length and score
+        """
+        query = f'recording:"{self._escape(title)}" AND artist:"{self._escape(artist)}"'
+        body = self.musicbrainz.get_json('/ws/2/recording', {'query': query, 'fmt': 'json', 'limit': 5})
+        
+        candidates = []
+        for recording in body.get('recordings', []):
+            releases = recording.get('releases') or [{}]
+            candidates.append({
+                'mbid': recording.get('id'),
+                'title': recording.get('title'),
+                'artist': ''.join(
+                    credit.get('name', '') + credit.get('joinphrase', '')
+                    for credit in recording.get('artist-credit', [])
+                ) or None,
+                'album': releases[0].get('title'),
+                'year': self._parse_year(releases[0].get('date')),
+                'length': recording['length'] / 1000 if recording.get('length') else None,
+                'score': int(recording.get('score', 0))
+            })
+        
+        return candidates
+    
+    def lookup_fingerprint(self, file_path: str) -> List[Dict[str, Any]]:
+        """
+        Identify a file on AcoustID from its Chromaprint fingerprint
+        
+        Args:
+            file_path: Path to audio file (fingerprinted with fpcalc/libchromaprint)
+        
+        Returns:
+            Candidate recordings in the same shape as search_recording
+        """
+        duration, fingerprint = acoustid.fingerprint_file(file_path)
+        if isinstance(fingerprint, bytes):
+            fingerprint = fingerprint.decode('ascii')
+        
+        body = self.acoustid.get_json('/v2/lookup', {
+            'client': self.acoustid_key,
+            'meta': 'recordings releases',
+            'duration': int(duration),
+            'fingerprint': fingerprint,
+            'format': 'json'
+        })
+        
+        candidates = []
+        for result in body.get('results', []):
+            for recording in result.get('recordings', []):
+                releases = recording.get('releases') or [{}]
+                candidates.append({
+                    'mbid': recording.get('id'),
+                    'acoustid': result.get('id'),
+                    'title': recording.get('title'),
+                    'artist': ', '.join(a.get('name', '') for a in recording.get('artists', [])) or None,
+                    'album': releases[0].get('title'),
+                    'year': (releases[0].get('date') or {}).get('year'),
+                    'length': recording.get('duration'),
+                    'score': int(result.get('score', 0) * 100)
+                })
+        
+        return candidates
+    
+    def _best_candidate(self, row: Dict[str, Any], candidates: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Highest scoring candidate whose length agrees with the file"""
+        for candidate in sorted(candidates, key=lambda c: c['score'], reverse=True):
+            if candidate['score'] < self.min_score or not candidate['mbid']:
+                break
+            if row['duration'] and candidate['length'] and abs(row['duration'] - candidate['length']) > self.duration_tolerance:
+                continue
+            return candidate
+        return None
+    
+    def _build_update(self, row: Dict[str, Any], candidate: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Mapping that records the match and fills only empty fields"""
+        if candidate is None:
+            return None
+        
+        update = {'file_id': row['file_id'], 'musicbrainz_id': candidate['mbid']}
+        if candidate.get('acoustid'):
+            update['fingerprint_id'] = candidate['acoustid']
+        
+        for field in ('artist', 'title', 'album', 'year'):
+            if row[field] is None and candidate.get(field):
+                update[field] = candidate[field]
+        
+        return update
+    
+    def _write_updates(self, updates: List[Dict[str, Any]]):
+        """Apply update mappings in bulk"""
+        if not updates:
+            return
+        
+        try:
+            with db_manager.get_session() as session:
+                session.bulk_update_mappings(Metadata, [add_search_keys(update) for update in updates])
+        except Exception as e:
+            logger.error(f"Error saving enrichment results for {len(updates)} files: {e}")
+    
+    def _escape(self, value: str) -> str:
+        """Escape a value for a quoted Lucene phrase"""
+        return LUCENE_SPECIAL.sub(r'\\\1', value)
+    
+    def _parse_year(self, date: Optional[str]) -> Optional[int]:
+        """Year from a MusicBrainz 'YYYY[-MM[-DD]]' date"""
+        if date and date[:4].isdigit():
+            return int(date[:4])
+        return None
@@ -0,0 +1,342 @@
+"""Local audio fingerprinting with LSH-based near-duplicate search"""
+import hashlib
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime
+import logging
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from database.db import db_manager
+from database.models import File, Fingerprint
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Fixed seed so MinHash signatures stay comparable between runs
+MINHASH_SEED = 0x5EED
+
+# Frames decoded per block while hashing the whole track
+HASH_BLOCK_FRAMES = 65536
+
+class AudioFingerprinter:
+    """
+    Computes compact spectral fingerprints and finds near-duplicate audio offline
+    
+    Each frame yields one 32-bit sub-fingerprint: the sign of the energy
+    difference between 33 adjacent log-spaced bands, differenced again in time
+    (Haitsma/Kalker style). Re-encoding flips only a few bits, so a 128 kbps
+    MP3 and a FLAC of the same song keep a low bit error rate while unrelated
+    tracks sit around 0.5.
+    
+    Candidate pairs come from MinHash over each track's set of sub-fingerprints,
+    banded for locality-sensitive hashing, so only tracks that share a bucket
+    are ever compared.
+    
+    Fingerprints cover only the first max_seconds and ignore gain, so two
+    tracks sharing an intro can match. files.audio_hash is hashed separately
+    from the whole decoded PCM instead.
+    """
+    
+    def __init__(self):
+        self.enabled = config.get('fingerprint.enabled', False)
+        self.sample_rate = config.get('fingerprint.sample_rate', 11025)
+        self.max_seconds = config.get('fingerprint.max_seconds', 60)
+        self.frame_size = config.get('fingerprint.frame_size', 4096)
+        self.hop_size = config.get('fingerprint.hop_size', 1024)
+        self.num_hashes = config.get('fingerprint.num_hashes', 32)
+        self.rows_per_band = config.get('fingerprint.rows_per_band', 1)
+        self.max_bucket_size = config.get('fingerprint.max_bucket_size', 50)
+        self.max_offset_frames = config.get('fingerprint.max_offset_frames', 8)
+        self.ber_threshold = config.get('fingerprint.ber_threshold', 0.25)
+        self.batch_size = config.get('fingerprint.batch_size', 50)
+        self.progress_callback = None
+        self.should_stop = False
+        
+        # 33 log-spaced bands between 300 Hz and 2 kHz give 32 difference bits
+        freqs = np.fft.rfftfreq(self.frame_size, 1 / self.sample_rate)
+        self._band_starts = np.searchsorted(freqs, np.geomspace(300, 2000, 34))
+        self._window = np.hanning(self.frame_size)
+        
+        # Multiply-shift hash family for MinHash
+        rng = np.random.default_rng(MINHASH_SEED)
+        self._hash_a = rng.integers(1, 2**63, size=self.num_hashes, dtype=np.uint64) | np.uint64(1)
+        self._hash_b = rng.integers(0, 2**63, size=self.num_hashes, dtype=np.uint64)
+    
+    def set_progress_callback(self, callback):
+        """Set callback for progress updates"""
+        self.progress_callback = callback
+    
+    def stop(self):
+        """Signal to stop fingerprinting"""
+        self.should_stop = True
+    
+    def fingerprint_library(self) -> Dict[str, Any]:
+        """
+        Fingerprint all files that do not have a fingerprint yet
+        
+        Returns:
+            Dictionary with fingerprinting results
+        """
+        logger.info("Starting audio fingerprinting...")
+        
+        fingerprinted = 0
+        failed = 0
+        errors = []
+        
+        try:
+            with db_manager.get_session() as session:
+                files = session.query(File.id, File.source_path).outerjoin(Fingerprint).filter(
+                    Fingerprint.file_id.is_(None)
+                ).all()
+                
+                total_files = len(files)
+                logger.info(f"Fingerprinting {total_files} files")
+                
+                for i, (file_id, source_path) in enumerate(files):
+                    if self.should_stop:
+                        logger.info("Fingerprinting stopped by user")
+                        break
+                    
+                    try:
+                        sub_fingerprints = self.fingerprint_file(source_path)
+                        
+                        if sub_fingerprints is not None and len(sub_fingerprints):
+                            audio = self.hash_audio(source_path)
+                            session.add(Fingerprint(
+                                file_id=file_id,
+                                sub_fingerprints=sub_fingerprints.astype('<u4').tobytes(),
+                                frame_count=len(sub_fingerprints),
+                                minhash=self.compute_minhash(sub_fingerprints).astype('<u4').tobytes(),
+                                pcm_frames=audio[1] if audio else None,
+                                created_at=datetime.utcnow()
+                            ))
+                            
+                            # Identical decoded audio (e.g. WAV and FLAC of the same PCM) shares this
+                            if audio:
+                                session.query(File).filter_by(id=file_id).update({'audio_hash': audio[0]})
+                            fingerprinted += 1
+                        else:
+                            failed += 1
+                    
+                    except Exception as e:
+                        logger.error(f"Error fingerprinting {source_path}: {e}")
+                        errors.append(source_path)
+                        failed += 1
+                    
+                    if i % self.batch_size == 0:
+                        session.commit()
+                    
+                    if self.progress_callback:
+                        self.progress_callback({
+                            'operation': 'fingerprint',
+                            'progress': i + 1,
+                            'total': total_files,
+                            'message': f"Fingerprinting audio: {i + 1}/{total_files}"
+                        })
+                
+                session.commit()
+        
+        except Exception as e:
+            logger.error(f"Fatal error during fingerprinting: {e}")
+            raise
+        
+        logger.info(f"Fingerprinting complete: {fingerprinted} fingerprinted, {failed} failed")
+        
+        return {
+            'fingerprinted': fingerprinted,
+            'failed': failed,
+            'errors': len(errors),
+            'error_files': errors[:10]
+        }
+    
+    def fingerprint_file(self, file_path: str) -> Optional[np.ndarray]:
+        """
+        Decode the start of a file and compute its sub-fingerprints
+        
+        Args:
+            file_path: Path to audio file
+        
+        Returns:
+            uint32 array with one sub-fingerprint per frame, or None on failure
+        """
+        path = Path(file_path)
+        
+        if not path.exists():
+            return None
+        
+        try:
+            y, _ = librosa.load(str(path), sr=self.sample_rate, mono=True, duration=self.max_seconds)
+            return self.compute_sub_fingerprints(y)
+        except Exception as e:
+            logger.debug(f"Error decoding {file_path}: {e}")
+            return None
+    
+    def hash_audio(self, file_path: str) -> Optional[Tuple[bytes, int]]:
+        """
+        Hash the whole decoded PCM of a file, a block at a time
+        
+        Sample rate and channel count are part of the hash, and samples are
+        read as 32-bit integers, so a WAV and a FLAC of the same PCM match while
+        a gain change or a different edit of the track does not.
+        
+        Args:
+            file_path: Path to audio file
+        
+        Returns:
+            (SHA-256 digest, decoded frame count), or None when libsndfile cannot decode the file
+        """
+        try:
+            with sf.SoundFile(file_path) as audio:
+                digest = hashlib.sha256(f"{audio.samplerate}:{audio.channels}".encode())
+                frames = 0
+                for block in audio.blocks(blocksize=HASH_BLOCK_FRAMES, dtype='int32'):
+                    digest.update(block.astype('<i4').tobytes())
+                    frames += len(block)
+            return digest.digest(), frames
+        except Exception as e:
+            logger.debug(f"Error hashing audio of {file_path}: {e}")
+            return None
+    
+    def compute_sub_fingerprints(self, y: np.ndarray) -> np.ndarray:
+        """Compute packed 32-bit sub-fingerprints from mono samples"""
+        if len(y) < self.frame_size + self.hop_size:
+            return np.zeros(0, dtype=np.uint32)
+        
+        frames = np.lib.stride_tricks.sliding_window_view(y, self.frame_size)[::self.hop_size]
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2
+        
+        # Band energies, then sign of the band difference changing over time
+        energy = np.add.reduceat(power, self._band_starts, axis=1)[:, :33]
+        band_diff = energy[:, :-1] - energy[:, 1:]
+        bits = (band_diff[1:] - band_diff[:-1]) > 0
+        
+        weights = np.left_shift(np.uint64(1), np.arange(32, dtype=np.uint64))
+        return (bits.astype(np.uint64) * weights).sum(axis=1).astype(np.uint32)
+    
+    def compute_minhash(self, sub_fingerprints: np.ndarray) -> np.ndarray:
+        """Compute the MinHash signature of a track's sub-fingerprint set"""
+        values = np.unique(sub_fingerprints)
+        
+        # Silence and clipping produce near-constant words shared by everything
+        popcount = np.unpackbits(values.astype('<u4').view(np.uint8).reshape(-1, 4), axis=1).sum(axis=1)
+        values = values[(popcount > 2) & (popcount < 30)].astype(np.uint64)
+        
+        if len(values) == 0:
+            return np.full(self.num_hashes, 0xFFFFFFFF, dtype=np.uint32)
+        
+        hashed = (self._hash_a[:, None] * values[None, :] + self._hash_b[:, None]) >> np.uint64(32)
+        return hashed.min(axis=1).astype(np.uint32)
+    
+    def bit_error_rate(self, a: np.ndarray, b: np.ndarray) -> float:
+        """Lowest bit error rate between two fingerprints over small alignment offsets"""
+        best = 1.0
+        
+        for offset in range(-self.max_offset_frames, self.max_offset_frames + 1):
+            if offset >= 0:
+                x, y = a[offset:], b
+            else:
+                x, y = a, b[-offset:]
+            
+            length = min(len(x), len(y))
+            if length < 16:
+                continue
+            
+            diff = np.bitwise_xor(x[:length], y[:length])
+            ber = np.unpackbits(diff.astype('<u4').view(np.uint8)).mean()
+            best = min(best, float(ber))
+        
+        return best
+    
+    def find_candidate_pairs(self) -> List[Dict[str, Any]]:
+        """
+        Find near-duplicate file pairs using the LSH index
+        
+        Returns:
+            List of pairs with file ids, bit error rate and confidence
+        """
+        logger.info("Searching fingerprints for near duplicates...")
+        
+        with db_manager.get_session() as session:
+            rows = session.query(Fingerprint.file_id, Fingerprint.minhash).all()
+        
+        if len(rows) < 2:
+            return []
+        
+        file_ids = np.array([file_id for file_id, _ in rows], dtype=np.int64)
+        signatures = np.stack([np.frombuffer(minhash, dtype='<u4') for _, minhash in rows])
+        
+        # Tracks with nothing but silence would all collide with each other
+        informative = ~(signatures == 0xFFFFFFFF).all(axis=1)
+        file_ids, signatures = file_ids[informative], signatures[informative]
+        
+        candidates = self._lsh_candidates(signatures)
+        logger.info(f"LSH produced {len(candidates)} candidate pairs from {len(rows)} fingerprints")
+        
+        pairs = []
+        for start in range(0, len(candidates), 500):
+            chunk = candidates[start:start + 500]
+            needed = set(file_ids[chunk.ravel()].tolist())
+            
+            with db_manager.get_session() as session:
+                fingerprints = {
+                    file_id: np.frombuffer(data, dtype='<u4')
+                    for file_id, data in session.query(
+                        Fingerprint.file_id, Fingerprint.sub_fingerprints
+                    ).filter(Fingerprint.file_id.in_(needed))
+                }
+            
+            for i, j in chunk:
+                a_id, b_id = int(file_ids[i]), int(file_ids[j])
+                ber = self.bit_error_rate(fingerprints[a_id], fingerprints[b_id])
+                
+                if ber <= self.ber_threshold:
+                    pairs.append({
+                        'file_a': a_id,
+                        'file_b': b_id,
+                        'ber': round(ber, 4),
+                        # Random audio sits at 0.5, identical audio at 0.0
+                        'confidence': round(1.0 - 2 * ber, 3)
+                    })
+        
+        logger.info(f"Verified {len(pairs)} near-duplicate pairs")
+        return pairs
+    
+    def _lsh_candidates(self, signatures: np.ndarray) -> np.ndarray:
+        """
+        Band MinHash signatures and return index pairs that share a bucket
+        
+        Each band is sorted once and equal runs become candidate pairs, so the
+        cost is O(n log n) per band instead of comparing every pair of tracks.
+        Buckets larger than max_bucket_size are skipped as uninformative.
+        """
+        n = len(signatures)
+        pair_codes = []
+        
+        for start in range(0, self.num_hashes, self.rows_per_band):
+            # Fold the band's rows into one 64-bit bucket key
+            keys = np.zeros(n, dtype=np.uint64)
+            for column in signatures[:, start:start + self.rows_per_band].T:
+                keys = keys * np.uint64(0x9E3779B97F4A7C15) + column.astype(np.uint64)
+            
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+            boundaries = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+            run_starts = np.concatenate(([0], boundaries))
+            run_ends = np.concatenate((boundaries, [n]))
+            run_sizes = run_ends - run_starts
+            
+            for run_start, run_size in zip(run_starts[run_sizes > 1], run_sizes[run_sizes > 1]):
+                if run_size > self.max_bucket_size:
+                    continue
+                members = np.sort(order[run_start:run_start + run_size])
+                i, j = np.triu_indices(run_size, k=1)
+                pair_codes.append(members[i] * n + members[j])
+        
+        if not pair_codes:
+            return np.zeros((0, 2), dtype=np.int64)
+        
+        codes = np.unique(np.concatenate(pair_codes))
+        return np.stack([codes // n, codes % n], axis=1)
@@ -0,0 +1,267 @@
+"""Directory-level metadata inference from folder and file names"""
+import os
+import re
+from collections import defaultdict
+from pathlib import PurePath
+from typing import Dict, Any, Iterable, List
+import logging
+
+from database.db import db_manager
+from database.models import Directory, File, Metadata
+from utils.normalize import add_search_keys
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Release noise in folder names: "[FLAC]", "(320 kbps)", "[WEB]", "(Deluxe Edition)"
+FOLDER_NOISE = re.compile(
+    r'\s*[\(\[][^\)\]]*\b(flac|mp3|aac|alac|wav|\d{3}\s*k(bps)?|v0|v2|web|cd|vinyl|lossless|24\s*bit|deluxe|edition)\b[^\)\]]*[\)\]]',
+    re.IGNORECASE
+)
+
+# "Artist - Album (Year)", "Artist - Year - Album", "Year - Album", "Album [Year]", "Album"
+FOLDER_PATTERN = re.compile(
+    r'^(?:(?P<artist>(?!(?:19|20)\d{2}\b)[^-]+?)\s+-\s+)?'
+    r'(?:[\(\[]?(?P<year>(?:19|20)\d{2})[\)\]]?\s*(?:-\s*)?)?'
+    r'(?P<album>.+?)'
+    r'(?:\s*[\(\[](?P<trailing_year>(?:19|20)\d{2})[\)\]])?$'
+)
+
+# Multi-disc subfolders whose parent is the album folder
+DISC_FOLDER = re.compile(r'^(cd|disc|disk)\s*\d+$', re.IGNORECASE)
+
+# Every filename is parsed with one combined pattern: "[track][sep][artist - ]title"
+FILENAME_PATTERN = re.compile(
+    r'^(?:(?P<track>\d{1,3})(?:\s*[-._)]\s*|\s+))?'
+    r'(?:(?P<artist>.+?)\s+-\s+)?'
+    r'(?P<title>.+?)\s*$'
+)
+
+# Shared prefixes are cut back to their last " - " separator
+PREFIX_SEPARATOR = re.compile(r'.*(\s-\s|_-_)')
+
+INFERRED_FIELDS = ('artist', 'album', 'year', 'track_number', 'title')
+
+class FolderMetadataInferrer:
+    """
+    Fills missing tag fields from the folder a file sits in and its siblings
+    
+    Each directory name is parsed once, the filename prefix shared by all
+    siblings (e.g. "Artist - Album - ") is detected and stripped, and the rest
+    of every filename goes through one combined regex. A value that all
+    siblings agree on, such as the artist in "Artist - Title" names, becomes
+    the directory's value. Only fields that are still empty are written, and
+    metadata.inferred_fields records which ones, so matching on real tags
+    (see FuzzyDuplicateMatcher) can leave guessed values out.
+    """
+    
+    def __init__(self):
+        self.enabled = config.get('metadata.folder_inference', True)
+        self.min_numbered_ratio = 0.8
+        self.batch_size = config.get('metadata.write_batch_size', 1000)
+    
+    def infer_directories(self, directory_ids: Iterable[int]) -> Dict[str, Any]:
+        """
+        Infer missing metadata in the directories that gained files this run
+        
+        Only those directories are read, so a run costs what its new files
+        cost, however large the library. Each one is read whole: numbering and
+        the shared filename prefix are decided over all of its files, so a
+        later run infers the same values for the same directory.
+        
+        Args:
+            directory_ids: Directories of the files written in this run
+        
+        Returns:
+            Dictionary with the number of directories and files updated
+        """
+        directory_ids = sorted(set(directory_ids))
+        if not self.enabled or not directory_ids:
+            return {'directories': 0, 'updated': 0}
+        
+        logger.info(f"Inferring metadata for {len(directory_ids)} directories")
+        
+        updates = []
+        updated = 0
+        
+        for start in range(0, len(directory_ids), 500):
+            for directory, rows in self._load_directories(directory_ids[start:start + 500]).items():
+                updates.extend(self.infer_directory(directory, rows))
+                
+                if len(updates) >= self.batch_size:
+                    updated += self._write_updates(updates)
+                    updates = []
+        
+        updated += self._write_updates(updates)
+        logger.info(f"Folder inference filled metadata for {updated} files")
+        
+        return {'directories': len(directory_ids), 'updated': updated}
+    
+    def infer_directory(self, directory: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Work out missing fields for the files of one directory
+        
+        Args:
+            directory: Directory path
+            rows: One dict per file in the directory with file_id, stem, whether
+                it has a metadata row, and its current field values
+        
+        Returns:
+            Update mappings holding file_id, the fields that were empty and inferred_fields
+        """
+        folder = self.parse_folder(directory)
+        stems = [row['stem'] for row in rows]
+        prefix = self._shared_prefix(stems)
+        
+        remainders = [stem[len(prefix):] for stem in stems]
+        parsed = [FILENAME_PATTERN.match(remainder).groupdict() for remainder in remainders]
+        
+        # Leading numbers are track numbers only when the siblings agree ("2 Become 1" is a title)
+        numbered = sum(1 for p in parsed if p['track']) >= self.min_numbered_ratio * len(parsed)
+        if not numbered:
+            parsed = [
+                {'track': None, 'artist': None, 'title': remainder} if p['track'] else p
+                for p, remainder in zip(parsed, remainders)
+            ]
+        
+        # A bare folder name ("Downloads", "Misc") is only an album if its files are numbered tracks
+        if folder.pop('plain', False) and not numbered:
+            folder.pop('album', None)
+        
+        # A shared "Artist - Album - " filename prefix is more specific than the folder name
+        prefix_parts = [part.strip() for part in re.split(r'\s+-\s+|_-_', prefix) if part.strip()]
+        for field, value in zip(('artist', 'album'), prefix_parts):
+            folder[field] = value
+        
+        # An artist every sibling shares is the directory's artist, otherwise a compilation
+        file_artists = {p['artist'].strip() for p in parsed if p['artist']}
+        if len(file_artists) == 1 and len(parsed) > 1 and all(p['artist'] for p in parsed):
+            folder.setdefault('artist', file_artists.pop())
+        
+        updates = []
+        for row, p in zip(rows, parsed):
+            if not row['tagged']:
+                continue
+            
+            inferred = {
+                'artist': (p['artist'] or '').strip() or folder.get('artist'),
+                'album': folder.get('album'),
+                'year': folder.get('year'),
+                'track_number': int(p['track']) if p['track'] else None,
+                'title': (p['title'] or '').strip() or row['stem']
+            }
+            
+            update = {
+                field: value for field, value in inferred.items()
+                if value is not None and row.get(field) is None
+            }
+            if update:
+                earlier = set((row.get('inferred_fields') or '').split(','))
+                update['inferred_fields'] = ','.join(
+                    field for field in INFERRED_FIELDS if field in update or field in earlier
+                )
+                update['file_id'] = row['file_id']
+                updates.append(update)
+        
+        return updates
+    
+    def parse_folder(self, directory: str) -> Dict[str, Any]:
+        """
+        Parse artist, album and year from a directory name
+        
+        Args:
+            directory: Directory path
+        
+        Returns:
+            Dictionary with whichever of artist, album and year were found
+        """
+        path = PurePath(directory)
+        
+        # CD1/Disc 2 subfolders describe the disc, the album is one level up
+        if DISC_FOLDER.match(path.name) and path.parent.name:
+            path = path.parent
+        
+        name = FOLDER_NOISE.sub('', path.name).strip()
+        match = FOLDER_PATTERN.match(name)
+        if not name or not match:
+            return {}
+        
+        groups = match.groupdict()
+        folder = {}
+        
+        if groups['artist']:
+            folder['artist'] = groups['artist'].strip()
+        elif groups['year'] and path.parent.name:
+            # "Artist/1999 - Album" layout
+            folder['artist'] = FOLDER_NOISE.sub('', path.parent.name).strip()
+        
+        if groups['album']:
+            folder['album'] = groups['album'].strip()
+        
+        year = groups['year'] or groups['trailing_year']
+        if year:
+            folder['year'] = int(year)
+        
+        folder['plain'] = not (groups['artist'] or year)
+        
+        return folder
+    
+    def _shared_prefix(self, stems: List[str]) -> str:
+        """Filename prefix common to all siblings, cut back to the last separator"""
+        if len(stems) < 2:
+            return ''
+        
+        common = os.path.commonprefix(stems)
+        match = PREFIX_SEPARATOR.match(common)
+        if not match:
+            return ''
+        
+        return match.group(0)
+    
+    def _load_directories(self, directory_ids: List[int]) -> Dict[str, List[Dict[str, Any]]]:
+        """Load every file of the given directories with its current metadata, grouped by directory path"""
+        directories = defaultdict(list)
+        
+        with db_manager.get_session() as session:
+            rows = session.query(
+                File.id,
+                Directory.path,
+                File.filename,
+                Metadata.file_id,
+                Metadata.artist,
+                Metadata.album,
+                Metadata.year,
+                Metadata.track_number,
+                Metadata.title,
+                Metadata.inferred_fields
+            ).join(Directory, Directory.id == File.directory_id).outerjoin(
+                Metadata, Metadata.file_id == File.id
+            ).filter(File.directory_id.in_(directory_ids)).order_by(File.directory_id, File.filename)
+            
+            for file_id, directory, filename, metadata_id, artist, album, year, track_number, title, inferred_fields in rows:
+                directories[directory].append({
+                    'file_id': file_id,
+                    'stem': PurePath(filename).stem,
+                    'tagged': metadata_id is not None,
+                    'artist': artist,
+                    'album': album,
+                    'year': year,
+                    'track_number': track_number,
+                    'title': title,
+                    'inferred_fields': inferred_fields
+                })
+        
+        return directories
+    
+    def _write_updates(self, updates: List[Dict[str, Any]]) -> int:
+        """Apply update mappings in one bulk statement per field combination"""
+        if not updates:
+            return 0
+        
+        try:
+            with db_manager.get_session() as session:
+                session.bulk_update_mappings(Metadata, [add_search_keys(update) for update in updates])
+            return len(updates)
+        except Exception as e:
+            logger.error(f"Error saving inferred metadata for {len(updates)} files: {e}")
+            return 0
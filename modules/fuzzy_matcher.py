@@ -0,0 +1,169 @@
+"""Fuzzy metadata duplicate detection using blocking to avoid O(n^2) comparisons"""
+import re
+from typing import Dict, Any, List, Tuple, FrozenSet
+from collections import defaultdict
+import logging
+
+from database.db import db_manager
+from database.models import Metadata
+from utils.normalize import normalize_name
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Bracketed qualifiers that do not change the recording
+QUALIFIER_PATTERN = re.compile(
+    r'[\(\[][^\)\]]*\b(remaster(ed)?|explicit|clean|album version|bonus track|lp version|mono|stereo)\b[^\)\]]*[\)\]]',
+    re.IGNORECASE
+)
+TRAILING_QUALIFIER = re.compile(r'\s+-\s+(\d{4}\s+)?remaster(ed)?(\s+\d{4})?(\s+version)?\s*$', re.IGNORECASE)
+
+class FuzzyDuplicateMatcher:
+    """
+    Finds the same song tagged slightly differently, e.g. "Artist - Title (Remastered)"
+    vs "Artist - Title"
+    
+    Records are blocked by a normalized title prefix and a duration bucket, and
+    only records in the same or the adjacent bucket of a block are scored, so
+    the work grows with block sizes rather than with the square of the library.
+    """
+    
+    def __init__(self):
+        self.enabled = config.get('fuzzy_matching.enabled', True)
+        self.prefix_length = config.get('fuzzy_matching.prefix_length', 4)
+        self.duration_tolerance = config.get('fuzzy_matching.duration_tolerance_seconds', 2)
+        self.min_similarity = config.get('fuzzy_matching.min_similarity', 0.85)
+        self.max_block_size = config.get('fuzzy_matching.max_block_size', 200)
+        self.progress_callback = None
+    
+    def set_progress_callback(self, callback):
+        """Set callback for progress updates"""
+        self.progress_callback = callback
+    
+    def normalize_title(self, title: str) -> str:
+        """Normalize a title and strip qualifiers such as '(Remastered 2011)'"""
+        if not title:
+            return ''
+        title = QUALIFIER_PATTERN.sub(' ', title)
+        title = TRAILING_QUALIFIER.sub('', title)
+        return normalize_name(title)
+    
+    def token_set_similarity(self, a: FrozenSet[str], b: FrozenSet[str]) -> float:
+        """
+        Token-set (Dice) similarity between two token sets
+        
+        Word order and duplicated words are ignored, so 'Title, The' and
+        'The Title' match, while an extra word such as 'live' still costs.
+        """
+        if not a or not b:
+            return 0.0
+        return 2 * len(a & b) / (len(a) + len(b))
+    
+    def find_candidate_pairs(self) -> List[Dict[str, Any]]:
+        """
+        Find likely duplicate pairs by artist/title similarity
+        
+        Returns:
+            List of pairs with file ids, confidence and reason
+        """
+        logger.info("Starting fuzzy metadata duplicate detection...")
+        
+        blocks = self._build_blocks()
+        logger.info(f"Built {len(blocks)} blocks for fuzzy matching")
+        
+        pairs = []
+        compared = 0
+        skipped_blocks = 0
+        total_blocks = len(blocks)
+        
+        for idx, ((prefix, bucket), records) in enumerate(blocks.items()):
+            # Compare within the block and against the next duration bucket
+            neighbours = blocks.get((prefix, bucket + 1), [])
+            
+            if len(records) + len(neighbours) > self.max_block_size:
+                skipped_blocks += 1
+                continue
+            
+            for i, record in enumerate(records):
+                for other in records[i + 1:] + neighbours:
+                    compared += 1
+                    confidence = self._score(record, other)
+                    if confidence >= self.min_similarity:
+                        pairs.append({
+                            'file_a': record[0],
+                            'file_b': other[0],
+                            'confidence': round(confidence, 3),
+                            'reason': 'fuzzy_tags'
+                        })
+            
+            if self.progress_callback and idx % 1000 == 0:
+                self.progress_callback({
+                    'operation': 'duplicates',
+                    'progress': idx,
+                    'total': total_blocks,
+                    'message': f"Fuzzy matching block {idx}/{total_blocks}"
+                })
+        
+        if skipped_blocks:
+            logger.info(f"Skipped {skipped_blocks} blocks larger than {self.max_block_size} records")
+        logger.info(f"Fuzzy matching compared {compared} pairs, found {len(pairs)} candidates")
+        
+        return pairs
+    
+    def _build_blocks(self) -> Dict[Tuple[str, int], List[Tuple]]:
+        """Load tagged metadata once and group records by (title prefix, duration bucket)"""
+        blocks = defaultdict(list)
+        bucket_width = max(self.duration_tolerance, 1)
+        
+        with db_manager.get_session() as session:
+            rows = session.query(
+                Metadata.file_id,
+                Metadata.artist,
+                Metadata.title,
+                Metadata.duration_seconds,
+                Metadata.inferred_fields
+            ).filter(
+                Metadata.artist.isnot(None),
+                Metadata.title.isnot(None),
+                Metadata.duration_seconds.isnot(None)
+            ).yield_per(10000)
+            
+            for file_id, artist, title, duration, inferred_fields in rows:
+                # Folder inference guesses these from names: every volume of a
+                # "Vendor - Drum Kit" folder would pair its "Kick 01" files
+                inferred = set((inferred_fields or '').split(','))
+                if 'artist' in inferred or 'title' in inferred:
+                    continue
+                
+                title_key = self.normalize_title(title)
+                if not title_key:
+                    continue
+                
+                artist_tokens = frozenset(normalize_name(artist).split())
+                if not artist_tokens:
+                    continue
+                title_tokens = frozenset(title_key.split())
+                bucket = int(duration // bucket_width)
+                
+                blocks[(title_key[:self.prefix_length], bucket)].append(
+                    (file_id, artist_tokens, title_tokens, duration)
+                )
+        
+        return blocks
+    
+    def _score(self, a: Tuple, b: Tuple) -> float:
+        """Score two records, 0.0 if their durations are too far apart or either lacks an artist"""
+        if abs(a[3] - b[3]) > self.duration_tolerance:
+            return 0.0
+        
+        title_similarity = self.token_set_similarity(a[2], b[2])
+        if title_similarity < self.min_similarity:
+            return 0.0
+        
+        # Without an artist on both sides, title and duration alone match
+        # every 'Kick 01' one-shot across sample packs
+        if not a[1] or not b[1]:
+            return 0.0
+        artist_similarity = self.token_set_similarity(a[1], b[1])
+        
+        return 0.6 * title_similarity + 0.4 * artist_similarity
@@ -8,9 +8,13 @@ import logging
 
 from sqlalchemy import func
 from database.db import db_manager
-from database.models import File, Checkpoint
-from utils.io_optimizer import get_files_sorted_by_location, batch_files, estimate_file_count
-from utils.hashing import calculate_file_hash
+from database.models import File, Metadata, Checkpoint
+from database.directory_tree import add_files, locate_paths
+from modules.metadata import MetadataExtractor, METADATA_COLUMNS
+from utils.io_optimizer import get_files_sorted_by_location, batch_files, estimate_file_count, read_head_and_tail, HeadTailFile
+from utils.hashing import calculate_file_hash, calculate_head_hash
+from utils.normalize import add_search_keys
+from utils.tag_cache import file_key
 from config import config
 
 logger = logging.getLogger(__name__)
@@ -20,9 +24,13 @@ class FileIndexer:
         self.batch_size = config.get('source.batch_size', 100)
         self.checkpoint_interval = config.get('checkpoint.interval', 100)
         self.checkpoint_enabled = config.get('checkpoint.enabled', True)
+        self.hash_chunk_size = config.get('deduplication.hash_chunk_size_mb', 1) * 1024 * 1024
+        self.index_tags = config.get('source.index_tags', False)
+        self.tail_read_size = config.get('source.tail_read_kb', 128) * 1024
+        self.metadata_extractor = MetadataExtractor() if self.index_tags else None
         self.progress_callback = None
         self.should_stop = False
-        
+    
     def set_progress_callback(self, callback):
         """Set callback for progress updates"""
         self.progress_callback = callback
@@ -68,6 +76,9 @@ class FileIndexer:
         # Start indexing
         files_added = 0
         files_skipped = 0
+        tags_indexed = 0
+        extra_reads = 0
+        touched_directories = set()
         errors = []
         last_checkpoint = time.time()
         
@@ -82,6 +93,9 @@ class FileIndexer:
                     break
                 
                 with db_manager.get_session() as session:
+                    batch_added = []
+                    # Directory ids for the whole batch in one pass; files store only their name
+                    locations = locate_paths(session, [str(p) for p in batch if str(p) not in processed_files])
                     for file_path in batch:
                         if self.should_stop:
                             break
@@ -93,7 +107,10 @@ class FileIndexer:
                         
                         try:
                             # Check if file already exists in database
-                            existing = session.query(File).filter_by(source_path=str(file_path)).first()
+                            directory_id, filename = locations[str(file_path)]
+                            existing = session.query(File.id).filter_by(
+                                directory_id=directory_id, filename=filename
+                            ).first()
                             if existing:
                                 files_skipped += 1
                                 processed_files.add(str(file_path))
@@ -102,31 +119,41 @@ class FileIndexer:
                             # Get file stats
                             stat = file_path.stat()
                             
-                            # Calculate hash for duplicate detection
-                            file_hash = calculate_file_hash(
-                                file_path, 
-                                config.get('deduplication.hash_chunk_size_mb', 1)
-                            )
-                            
                             # Create file record
                             file_record = File(
-                                source_path=str(file_path),
+                                directory_id=directory_id,
+                                filename=filename,
                                 file_size=stat.st_size,
                                 modified_date=datetime.fromtimestamp(stat.st_mtime),
-                                file_hash=file_hash,
                                 status='indexed'
                             )
                             
+                            if self.index_tags:
+                                # Hash and parse tags from the same reads
+                                metadata, reads = self._index_with_tags(file_path, file_record)
+                                extra_reads += reads
+                                if metadata is not None:
+                                    tags_indexed += 1
+                                    touched_directories.add(directory_id)
+                            else:
+                                # Calculate hash for duplicate detection
+                                file_record.file_hash = calculate_file_hash(
+                                    file_path, 
+                                    config.get('deduplication.hash_chunk_size_mb', 1)
+                                )
+                            
                             session.add(file_record)
+                            batch_added.append((str(file_path), stat.st_size))
                             files_added += 1
                             files_processed += 1
                             processed_files.add(str(file_path))
-                            
+                        
                         except Exception as e:
                             logger.error(f"Error indexing {file_path}: {e}")
                             errors.append(str(file_path))
                     
-                    # Commit batch
+                    # Roll the new files into the folder totals, then commit the batch
+                    add_files(session, batch_added)
                     session.commit()
                 
                 # Update progress
@@ -168,9 +195,16 @@ class FileIndexer:
         
         elapsed_time = time.time() - start_time
         
+        if self.index_tags:
+            logger.info(f"Indexed tags for {tags_indexed} files, {extra_reads} reads outside the head/tail buffers")
+            if self.metadata_extractor.tag_cache:
+                self.metadata_extractor.tag_cache.flush()
+            self.metadata_extractor.folder_inferrer.infer_directories(touched_directories)
+        
         return {
             'files_added': files_added,
             'files_skipped': files_skipped,
+            'tags_indexed': tags_indexed,
             'errors': len(errors),
             'error_files': errors[:10],  # Return first 10 errors
             'total_processed': files_processed,
@@ -178,6 +212,47 @@ class FileIndexer:
             'files_per_second': files_processed / elapsed_time if elapsed_time > 0 else 0
         }
     
+    def _index_with_tags(self, file_path: Path, file_record: File):
+        """
+        Fill in the hash and metadata of a new file from one head and one tail read
+        
+        The head that is hashed also holds ID3v2, FLAC and (usually) MP4
+        headers, and the tail holds ID3v1/APE tags, so mutagen parses a view
+        over those buffers instead of seeking around the file a second time.
+        
+        Args:
+            file_path: Path to audio file
+            file_record: Unsaved File row to attach hash and metadata to
+        
+        Returns:
+            Tuple of (metadata dict or None, reads that had to go back to disk)
+        """
+        tag_cache = self.metadata_extractor.tag_cache
+        key = file_key(file_path) if tag_cache else None
+        metadata = tag_cache.get(key) if key else None
+        reads = 0
+        
+        if metadata is not None:
+            # Tags known from an earlier scan, only the head is needed for the hash
+            file_record.file_hash = calculate_file_hash(file_path, config.get('deduplication.hash_chunk_size_mb', 1))
+        else:
+            head, tail, size = read_head_and_tail(file_path, self.hash_chunk_size, self.tail_read_size)
+            file_record.file_hash = calculate_head_hash(head, size)
+            
+            with HeadTailFile(file_path, head, tail, size) as view:
+                metadata = self.metadata_extractor.extract_metadata(str(file_path), fileobj=view)
+                reads = view.disk_reads
+            
+            if metadata is not None and key:
+                tag_cache.put(key, metadata)
+        
+        if metadata is not None:
+            # Written in the same batch commit as the file row
+            file_record.file_metadata = Metadata(**add_search_keys({column: metadata.get(column) for column in METADATA_COLUMNS}))
+            file_record.status = 'analyzed'
+        
+        return metadata, reads
+    
     def _save_checkpoint(self, operation: str, directory: str, data: Dict[str, Any]):
         """Save checkpoint to database"""
         try:
@@ -220,7 +295,7 @@ class FileIndexer:
                 if checkpoint:
                     logger.info(f"Found checkpoint: {checkpoint.progress}/{checkpoint.total}")
                     return checkpoint.checkpoint_data
-                
+        
         except Exception as e:
             logger.error(f"Error loading checkpoint: {e}")
         
@@ -1,7 +1,8 @@
 """Metadata extraction and enhancement module"""
-import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple
 import logging
 from mutagen import File as MutagenFile
 from mutagen.id3 import ID3, TIT2, TPE1, TALB, TDRC, TCON, TRCK
@@ -9,95 +10,283 @@ from mutagen.mp3 import MP3
 from mutagen.flac import FLAC
 from mutagen.mp4 import MP4
 from mutagen.oggvorbis import OggVorbis
+from mutagen.aac import AAC
+from mutagen.wave import WAVE
+from mutagen.asf import ASF
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from database.db import db_manager
 from database.models import File, Metadata
+from modules.folder_inference import FolderMetadataInferrer
+from utils.artwork import ArtworkStore, extract_embedded_art
+from utils.hashing import get_native_checksum
+from utils.normalize import SEARCH_KEY_COLUMNS, add_search_keys
+from utils.tag_cache import TagCache, file_key
 from config import config
 
 logger = logging.getLogger(__name__)
 
+# Parser class per extension, so mutagen never has to probe the format
+FORMAT_PARSERS = {
+    '.mp3': MP3,
+    '.flac': FLAC,
+    '.m4a': MP4,
+    '.aac': AAC,
+    '.ogg': OggVorbis,
+    '.wav': WAVE,
+    '.wma': ASF
+}
+
+# Metadata columns written by the batched writer
+METADATA_COLUMNS = [
+    'artist', 'album', 'title', 'track_number', 'year', 'genre', 'duration_seconds',
+    'bitrate', 'sample_rate', 'format', 'native_checksum', 'art_hash'
+]
+
+_worker_extractor = None
+
+def _extract_worker(job: Tuple[int, str]) -> Tuple[int, Optional[Dict[str, Any]], Optional[str]]:
+    """Process pool entry point: parse one file and return its metadata"""
+    global _worker_extractor
+    if _worker_extractor is None:
+        _worker_extractor = MetadataExtractor()
+    
+    file_id, source_path = job
+    try:
+        return file_id, _worker_extractor.extract_metadata(source_path), None
+    except Exception as e:
+        return file_id, None, str(e)
+
 class MetadataExtractor:
     def __init__(self):
         self.progress_callback = None
-        self.filename_patterns = [
-            # Artist - Title
-            re.compile(r'^(?P<artist>[^-]+?)\s*-\s*(?P<title>[^\.]+)'),
-            # Artist - Album - Track - Title
-            re.compile(r'^(?P<artist>[^-]+?)\s*-\s*(?P<album>[^-]+?)\s*-\s*(?P<track>\d+)\s*-\s*(?P<title>[^\.]+)'),
-            # Track. Artist - Title
-            re.compile(r'^(?P<track>\d+)\.?\s*(?P<artist>[^-]+?)\s*-\s*(?P<title>[^\.]+)'),
-            # Track - Title
-            re.compile(r'^(?P<track>\d+)\s*-\s*(?P<title>[^\.]+)')
-        ]
+        self.workers = config.get('metadata.workers', 4)
+        self.write_batch_size = config.get('metadata.write_batch_size', 1000)
+        self.folder_inferrer = FolderMetadataInferrer()
+        self.artwork_store = ArtworkStore(
+            config.get('artwork.store_path', 'artwork'),
+            config.get('artwork.thumbnail_size', 300)
+        ) if config.get('artwork.enabled', True) else None
+        self.tag_cache = TagCache(config.get('metadata.tag_cache_path', 'tag_cache.db')) if config.get('metadata.tag_cache', True) else None
     
     def set_progress_callback(self, callback):
         """Set callback for progress updates"""
         self.progress_callback = callback
     
-    def extract_all_metadata(self) -> Dict[str, Any]:
+    def extract_all_metadata(self, workers: Optional[int] = None) -> Dict[str, Any]:
         """
         Extract metadata for all indexed files
         
+        Files whose (device, inode, size, mtime) is in the tag cache are not
+        opened at all. The rest are parsed in a process pool while this
+        process is the only writer: results are bulk-upserted into metadata
+        and the files are flipped to 'analyzed' in one transaction per write
+        batch.
+        
+        Args:
+            workers: Number of parser processes (default metadata.workers, 1 = in-process)
+        
         Returns:
             Dictionary with extraction results
         """
         logger.info("Starting metadata extraction...")
         
+        workers = workers or self.workers
         extracted = 0
         failed = 0
         errors = []
+        start_time = time.time()
         
         try:
             with db_manager.get_session() as session:
                 # Get all files without metadata
-                files = session.query(File).outerjoin(Metadata).filter(
+                rows = session.query(File.id, File.source_path, File.directory_id).outerjoin(Metadata).filter(
                     Metadata.file_id.is_(None),
                     File.status == 'indexed'
                 ).all()
+            
+            jobs = [(file_id, source_path) for file_id, source_path, _ in rows]
+            # Folder inference afterwards only revisits these directories
+            directory_ids = {directory_id for _, _, directory_id in rows}
+            total_files = len(jobs)
+            paths = dict(jobs)
+            
+            cached, jobs, keys = self._split_cached(jobs)
+            logger.info(f"Extracting metadata for {total_files} files ({len(cached)} cached) with {workers} worker(s)")
+            
+            # Only start the pool for files that still have to be parsed
+            if workers > 1 and len(jobs) > 1:
+                executor = ProcessPoolExecutor(max_workers=workers)
+                results = executor.map(_extract_worker, jobs, chunksize=32)
+            else:
+                executor = None
+                results = map(self._extract_job, jobs)
+            
+            batch = []
+            to_cache = {}
+            
+            def flush():
+                """Write the pending batch, then count and cache only what was committed"""
+                nonlocal extracted, failed
+                if not batch:
+                    return
+                if self._write_batch(batch):
+                    extracted += len(batch)
+                    for file_id, metadata in batch:
+                        if file_id in to_cache:
+                            self.tag_cache.put(to_cache[file_id], metadata)
+                else:
+                    failed += len(batch)
+                    errors.extend(paths[file_id] for file_id, _ in batch)
+                batch.clear()
+                to_cache.clear()
+            
+            try:
+                for file_id, metadata in cached:
+                    batch.append((file_id, metadata))
+                    
+                    if len(batch) >= self.write_batch_size:
+                        flush()
                 
-                total_files = len(files)
-                logger.info(f"Extracting metadata for {total_files} files")
+                if self.progress_callback and cached:
+                    self.progress_callback({
+                        'operation': 'metadata_extraction',
+                        'progress': len(cached),
+                        'total': total_files,
+                        'message': f"Extracting metadata: {len(cached)}/{total_files} (cached)"
+                    })
                 
-                for i, file in enumerate(files):
-                    try:
-                        metadata = self.extract_metadata(file.source_path)
-                        if metadata:
-                            self._save_metadata(file.id, metadata)
-                            extracted += 1
-                        else:
-                            failed += 1
-                    
-                    except Exception as e:
-                        logger.error(f"Error extracting metadata for {file.source_path}: {e}")
-                        errors.append(file.source_path)
+                for i, (file_id, metadata, error) in enumerate(results, start=len(cached)):
+                    if error:
+                        logger.error(f"Error extracting metadata for file {file_id}: {error}")
+                        errors.append(paths[file_id])
                         failed += 1
+                    elif metadata is not None:
+                        batch.append((file_id, metadata))
+                        
+                        if self.tag_cache and keys.get(file_id):
+                            to_cache[file_id] = keys[file_id]
+                    else:
+                        failed += 1
+                    
+                    if len(batch) >= self.write_batch_size:
+                        flush()
                     
-                    # Update progress for each file
-                    if self.progress_callback:
+                    if self.progress_callback and (i % 50 == 0 or i == total_files - 1):
                         self.progress_callback({
                             'operation': 'metadata_extraction',
                             'progress': i + 1,
                             'total': total_files,
                             'message': f"Extracting metadata: {i + 1}/{total_files}"
                         })
+                
+                flush()
+            
+            finally:
+                if executor:
+                    executor.shutdown()
+                if self.tag_cache:
+                    self.tag_cache.flush()
+            
+            inferred = self.folder_inferrer.infer_directories(directory_ids)
         
         except Exception as e:
             logger.error(f"Fatal error during metadata extraction: {e}")
             raise
         
+        elapsed_time = time.time() - start_time
+        
         return {
             'extracted': extracted,
             'failed': failed,
             'errors': len(errors),
-            'error_files': errors[:10]
+            'error_files': errors[:10],
+            'cached': len(cached),
+            'inferred': inferred['updated'],
+            'workers': workers,
+            'elapsed_time': elapsed_time,
+            'files_per_second': total_files / elapsed_time if elapsed_time > 0 else 0
         }
     
-    def extract_metadata(self, file_path: str) -> Optional[Dict[str, Any]]:
+    def _split_cached(self, jobs: List[Tuple[int, str]]):
+        """
+        Separate files whose tags are already in the tag cache
+        
+        Args:
+            jobs: (file_id, source_path) pairs
+        
+        Returns:
+            Tuple of (cached (file_id, metadata) pairs, jobs still to parse, file_id -> cache key)
+        """
+        if not self.tag_cache:
+            return [], jobs, {}
+        
+        keys = {file_id: file_key(source_path) for file_id, source_path in jobs}
+        found = self.tag_cache.get_many([key for key in keys.values() if key])
+        
+        cached = []
+        remaining = []
+        for file_id, source_path in jobs:
+            key = keys[file_id]
+            if key in found:
+                cached.append((file_id, found[key]))
+            else:
+                remaining.append((file_id, source_path))
+        
+        return cached, remaining, keys
+    
+    def _extract_job(self, job: Tuple[int, str]) -> Tuple[int, Optional[Dict[str, Any]], Optional[str]]:
+        """In-process equivalent of _extract_worker"""
+        file_id, source_path = job
+        try:
+            return file_id, self.extract_metadata(source_path), None
+        except Exception as e:
+            return file_id, None, str(e)
+    
+    def _write_batch(self, batch: List[Tuple[int, Dict[str, Any]]]) -> int:
+        """
+        Bulk-upsert a batch of metadata rows and mark their files analyzed
+        
+        Returns:
+            Number of files written, 0 if the batch was rolled back
+        """
+        if not batch:
+            return 0
+        
+        rows = [
+            add_search_keys({'file_id': file_id, **{column: metadata.get(column) for column in METADATA_COLUMNS}})
+            for file_id, metadata in batch
+        ]
+        columns = METADATA_COLUMNS + list(SEARCH_KEY_COLUMNS.values())
+        
+        stmt = sqlite_insert(Metadata)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Metadata.file_id],
+            # Keep existing values where this parse found nothing
+            set_={column: func.coalesce(stmt.excluded[column], getattr(Metadata, column)) for column in columns}
+        )
+        
+        try:
+            with db_manager.get_session() as session:
+                session.execute(stmt, rows)
+                session.query(File).filter(
+                    File.id.in_([file_id for file_id, _ in batch])
+                ).update({'status': 'analyzed'}, synchronize_session=False)
+        
+        except Exception as e:
+            logger.error(f"Error saving metadata batch of {len(batch)} files: {e}")
+            return 0
+        
+        return len(batch)
+    
+    def extract_metadata(self, file_path: str, fileobj=None) -> Optional[Dict[str, Any]]:
         """
         Extract metadata from a single file
         
         Args:
             file_path: Path to audio file
+            fileobj: Already-buffered view of the file (see HeadTailFile) to parse instead of reopening it
         
         Returns:
             Dictionary with metadata or None if extraction fails
@@ -107,26 +296,15 @@ class MetadataExtractor:
         if not path.exists():
             return None
         
-        # Try to extract from file tags
-        metadata = self._extract_from_tags(path)
-        
-        # If tags are incomplete, try filename parsing
-        if not metadata or not all([metadata.get('artist'), metadata.get('title')]):
-            filename_metadata = self._extract_from_filename(path)
-            if filename_metadata:
-                # Merge with existing metadata (filename has lower priority)
-                for key, value in filename_metadata.items():
-                    if not metadata.get(key):
-                        metadata[key] = value
-        
-        return metadata
+        # Gaps are filled per directory from folder and file names afterwards
+        return self._extract_from_tags(path, fileobj)
     
-    def _extract_from_tags(self, file_path: Path) -> Dict[str, Any]:
+    def _extract_from_tags(self, file_path: Path, fileobj=None) -> Dict[str, Any]:
         """Extract metadata from file tags using mutagen"""
         metadata = {}
         
         try:
-            audio_file = MutagenFile(str(file_path))
+            audio_file = self._open_audio(file_path, fileobj)
             
             if audio_file is None:
                 return metadata
@@ -151,10 +329,18 @@ class MetadataExtractor:
             if hasattr(audio_file.info, 'length'):
                 metadata['duration_seconds'] = audio_file.info.length
             
+            # Format-native integrity signature (no audio decoding needed)
+            metadata['native_checksum'] = get_native_checksum(file_path, audio_file, fileobj)
+            
+            # Cover art goes to the thumbnail store once per distinct image
+            if self.artwork_store:
+                art = extract_embedded_art(audio_file)
+                if art:
+                    metadata['art_hash'] = self.artwork_store.store(art)
+            
             # Extract tags based on format
-            if isinstance(audio_file, MP3):
-                if audio_file.tags:
-                    metadata.update(self._extract_id3_tags(audio_file.tags))
+            if isinstance(audio_file.tags, ID3):
+                metadata.update(self._extract_id3_tags(audio_file.tags))
             
             elif isinstance(audio_file, FLAC) or isinstance(audio_file, OggVorbis):
                 if audio_file.tags:
@@ -205,6 +391,23 @@ class MetadataExtractor:
         # Clean up None values
         return {k: v for k, v in metadata.items() if v is not None}
     
+    def _open_audio(self, file_path: Path, fileobj=None):
+        """Open a file with the parser for its extension, probing only as a fallback"""
+        source = fileobj if fileobj is not None else str(file_path)
+        
+        parser = FORMAT_PARSERS.get(file_path.suffix.lower())
+        if parser:
+            try:
+                if fileobj is not None:
+                    fileobj.seek(0)
+                return parser(source)
+            except Exception as e:
+                logger.debug(f"{parser.__name__} could not parse {file_path}: {e}")
+        
+        if fileobj is not None:
+            fileobj.seek(0)
+        return MutagenFile(source)
+    
     def _extract_id3_tags(self, tags: ID3) -> Dict[str, Any]:
         """Extract metadata from ID3 tags"""
         metadata = {}
@@ -241,76 +444,3 @@ class MetadataExtractor:
                 pass
         
         return metadata
-    
-    def _extract_from_filename(self, file_path: Path) -> Dict[str, Any]:
-        """Extract metadata from filename using patterns"""
-        metadata = {}
-        filename = file_path.stem  # Filename without extension
-        
-        # Try each pattern
-        for pattern in self.filename_patterns:
-            match = pattern.match(filename)
-            if match:
-                groups = match.groupdict()
-                
-                if 'artist' in groups and groups['artist']:
-                    metadata['artist'] = groups['artist'].strip()
-                
-                if 'title' in groups and groups['title']:
-                    metadata['title'] = groups['title'].strip()
-                
-                if 'album' in groups and groups['album']:
-                    metadata['album'] = groups['album'].strip()
-                
-                if 'track' in groups and groups['track']:
-                    try:
-                        metadata['track_number'] = int(groups['track'])
-                    except:
-                        pass
-                
-                break  # Use first matching pattern
-        
-        # If no pattern matched, use filename as title
-        if not metadata:
-            metadata['title'] = filename
-        
-        return metadata
-    
-    def _save_metadata(self, file_id: int, metadata: Dict[str, Any]):
-        """Save metadata to database"""
-        try:
-            with db_manager.get_session() as session:
-                # Check if metadata already exists
-                existing = session.query(Metadata).filter_by(file_id=file_id).first()
-                
-                if existing:
-                    # Update existing metadata
-                    for key, value in metadata.items():
-                        if hasattr(existing, key):
-                            setattr(existing, key, value)
-                else:
-                    # Create new metadata record
-                    metadata_record = Metadata(
-                        file_id=file_id,
-                        artist=metadata.get('artist'),
-                        album=metadata.get('album'),
-                        title=metadata.get('title'),
-                        track_number=metadata.get('track_number'),
-                        year=metadata.get('year'),
-                        genre=metadata.get('genre'),
-                        duration_seconds=metadata.get('duration_seconds'),
-                        bitrate=metadata.get('bitrate'),
-                        sample_rate=metadata.get('sample_rate'),
-                        format=metadata.get('format')
-                    )
-                    session.add(metadata_record)
-                
-                # Update file status
-                file = session.query(File).get(file_id)
-                if file:
-                    file.status = 'analyzed'
-                
-                session.commit()
-        
-        except Exception as e:
-            logger.error(f"Error saving metadata for file {file_id}: {e}")
\ No newline at end of file
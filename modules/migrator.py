@@ -7,10 +7,10 @@ from typing import Dict, Any, Optional, List
 import logging
 import re
 
-from sqlalchemy import select
 from database.db import db_manager
-from database.models import File, Migration, Metadata, Duplicate
-from utils.hashing import verify_file_copy
+from database.models import File, Migration, Metadata
+from database.directory_tree import add_files, locate_paths
+from utils.hashing import verify_file_copy, verify_native_checksum
 from utils.io_optimizer import optimize_path_for_windows
 from config import config
 
@@ -20,6 +20,7 @@ class FileMigrator:
     def __init__(self):
         self.target_base = Path(config.get('target.base_path', 'F:/music production'))
         self.io_threads = config.get('target.io_threads', 4)
+        self.verify_mode = config.get('migration.verify_mode', 'full')  # full, native
         self.progress_callback = None
         self.should_stop = False
         self.test_mode = False
@@ -72,19 +73,10 @@ class FileMigrator:
                 )
                 
                 if skip_duplicates:
-                    # Get primary file IDs from duplicates
-                    primary_ids = select(Duplicate.file_id).filter(
-                        Duplicate.is_primary == True
-                    )
-                    
-                    # Get non-duplicate files and primary duplicates
-                    non_dup_files = query.outerjoin(
-                        Duplicate, File.id == Duplicate.file_id
-                    ).filter(
-                        (Duplicate.file_id.is_(None)) | (File.id.in_(primary_ids))
+                    # Non-duplicate files and the primary copy of each duplicate group
+                    files = query.filter(
+                        (File.dup_count == 0) | (File.is_primary == True)
                     ).all()
-                    
-                    files = non_dup_files
                 else:
                     files = query.all()
                 
@@ -120,19 +112,24 @@ class FileMigrator:
                         migrated += 1
                     else:
                         # Perform actual migration
-                        success = self._migrate_file(file, target_path)
+                        success = self._migrate_file(
+                            file, target_path,
+                            native_checksum=metadata.native_checksum if metadata else None
+                        )
                         
                         if success:
                             # Record migration in database
+                            target_directory_id, target_filename = locate_paths(session, [str(target_path)])[str(target_path)]
                             migration = Migration(
                                 file_id=file.id,
-                                source_path=file.source_path,
-                                target_path=str(target_path),
+                                target_directory_id=target_directory_id,
+                                target_filename=target_filename,
                                 status='completed',
                                 started_at=datetime.utcnow(),
                                 completed_at=datetime.utcnow()
                             )
                             session.add(migration)
+                            add_files(session, [(str(target_path), file.file_size)], 'target')
                             
                             # Update file status
                             file.status = 'migrated'
@@ -223,13 +220,14 @@ class FileMigrator:
         
         return name
     
-    def _migrate_file(self, file: File, target_path: Path) -> bool:
+    def _migrate_file(self, file: File, target_path: Path, native_checksum: Optional[str] = None) -> bool:
         """
         Copy file to target location with verification
         
         Args:
             file: File record
             target_path: Target path
+            native_checksum: Format-native signature used for cheap verification
         
         Returns:
             True if successful, False otherwise
@@ -265,7 +263,13 @@ class FileMigrator:
             
             # Verify copy if configured
             if config.get('migration.verify', True):
-                if not verify_file_copy(source_path, target_path):
+                if self.verify_mode == 'native' and native_checksum:
+                    # Header-only check, avoids re-reading the source from the HDD
+                    verified = verify_native_checksum(source_path, target_path, native_checksum)
+                else:
+                    verified = verify_file_copy(source_path, target_path)
+                
+                if not verified:
                     logger.error(f"File verification failed: {target_path}")
                     # Remove corrupted copy
                     try:
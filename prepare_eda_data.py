@@ -101,6 +101,9 @@ def prepare_eda_data(source_dir: str, target_dir: str, reset_db: bool = True):
     migration_result = file_migrator.migrate_library(skip_duplicates=True)
     logger.info(f"Migration complete: {migration_result.get('files_copied', 0)} files migrated")
     
+    # No read model runs here to prune the change log
+    db_manager.trim_change_log()
+    
     # Summary
     logger.info("\n" + "="*60)
     logger.info("EDA DATA PREPARATION COMPLETE")
@@ -353,7 +353,9 @@ async function loadDuplicates() {
             const primary = group.files.find(f => f.is_primary);
             groupDiv.innerHTML = `
                 <div class="duplicate-header">
-                    <strong>Group (${group.count} files)</strong>
+                    <strong>${group.suggested
+                        ? `Possible duplicate (${Math.round(group.confidence * 100)}% match, not skipped)`
+                        : `Group (${group.count} files)`}</strong>
                     <span>Primary: ${primary.metadata.artist || 'Unknown'} - ${primary.metadata.title || 'Unknown'}</span>
                 </div>
                 <div class="duplicate-files">
@@ -6,6 +6,7 @@ let currentPage = 1;
 let pageSize = 50;
 let searchResults = [];
 let totalPages = 1;
+let pageCursors = {};  // page number -> cursor that fetches it
 let charts = {};
 
 // Initialize on page load
@@ -13,6 +14,8 @@ document.addEventListener('DOMContentLoaded', () => {
     loadStatistics();
     performSearch();
     loadGenres();
+    setupAutocomplete('filter-artist', 'artist');
+    setupAutocomplete('filter-album', 'album');
 });
 
 // Statistics
@@ -49,6 +52,8 @@ function handleSearchKeyup(event) {
 }
 
 async function performSearch(page = 1) {
+    // A fresh search starts a new cursor chain
+    if (page === 1) pageCursors = {};
     currentPage = page;
     
     const searchQuery = document.getElementById('search-input').value;
@@ -60,7 +65,9 @@ async function performSearch(page = 1) {
         sort_by: document.getElementById('sort-by').value,
         sort_order: document.getElementById('sort-order').value,
         limit: pageSize,
-        offset: (page - 1) * pageSize
+        offset: (page - 1) * pageSize,
+        cursor: pageCursors[page] || null,
+        facets: page === 1  // Counts under these filters only change with a new search
     };
     
     try {
@@ -73,10 +80,12 @@ async function performSearch(page = 1) {
         const data = await response.json();
         searchResults = data.results;
         totalPages = data.total_pages;
+        if (data.next_cursor) pageCursors[page + 1] = data.next_cursor;
+        if (data.facets) updateFacetCounts(data.facets);
         
         displaySearchResults();
         updatePagination(data);
-        
+    
     } catch (error) {
         console.error('Error performing search:', error);
     }
@@ -162,7 +171,7 @@ function displaySearchResults() {
 }
 
 function updatePagination(data) {
-    document.getElementById('current-page').textContent = data.page;
+    document.getElementById('current-page').textContent = currentPage;
     document.getElementById('total-pages').textContent = data.total_pages;
     
     document.getElementById('prev-page').disabled = currentPage === 1;
@@ -296,6 +305,7 @@ async function loadAlbums() {
         const grid = document.getElementById('albums-grid');
         grid.innerHTML = data.albums.map(album => `
             <div class="grid-item" onclick="filterByAlbum('${album.album}', '${album.artist}')">
+                ${album.art_hash ? `<img class="album-art" src="/api/library/art/${album.art_hash}" alt="" loading="lazy">` : ''}
                 <h3>${album.album}</h3>
                 <p>${album.artist}</p>
                 <p>${album.track_count} tracks${album.year ? ` • ${album.year}` : ''}</p>
@@ -314,42 +324,86 @@ function filterByAlbum(album, artist) {
     performSearch(1);
 }
 
-// Folders view
+// Folders view: the tree is fetched one level at a time as folders are expanded
 async function loadFolders() {
+    const tree = document.getElementById('folder-tree');
+    tree.innerHTML = '<p>Loading...</p>';
+    await loadFolderLevel(tree, null, 0);
+}
+
+async function loadFolderLevel(container, parentId, level) {
     try {
-        const response = await fetch('/api/library/folders');
+        const params = new URLSearchParams();
+        if (parentId !== null) params.set('parent_id', parentId);
+        
+        const response = await fetch(`/api/library/folders?${params}`);
         const data = await response.json();
         
-        const tree = document.getElementById('folder-tree');
-        tree.innerHTML = renderFolderTree(data.folders);
+        container.innerHTML = '';
+        const nodes = data.folders.map(folder => {
+            const node = renderFolderNode(folder, level);
+            container.appendChild(node);
+            return node;
+        });
+        
+        // A lone folder is the only way down, so open it straight away
+        if (nodes.length === 1 && data.folders[0].has_children) {
+            await toggleFolder(nodes[0], data.folders[0], level);
+        }
     } catch (error) {
         console.error('Error loading folders:', error);
     }
 }
 
-function renderFolderTree(folders, level = 0) {
-    return folders.map(folder => {
-        const padding = level * 20;
-        let html = `
-            <div class="folder-item" style="padding-left: ${padding}px" 
-                 onclick="selectFolder('${folder.path}')">
-                📁 ${folder.name}
-            </div>
-        `;
-        
-        if (folder.children && folder.children.length > 0) {
-            html += renderFolderTree(folder.children, level + 1);
+function renderFolderNode(folder, level) {
+    const padding = level * 20;
+    const node = document.createElement('div');
+    node.className = 'folder-node';
+    node.innerHTML = `
+        <div class="folder-item" style="padding-left: ${padding}px">
+            <span class="folder-toggle">${folder.has_children ? '▸' : ''}</span>
+            📁 ${folder.name}
+            <span class="folder-count">${folder.file_count} files · ${folder.size_mb} MB</span>
+        </div>
+        <div class="folder-children" style="display: none;"></div>
+    `;
+    
+    const item = node.querySelector('.folder-item');
+    item.addEventListener('click', () => {
+        selectFolder(item, folder.path);
+        if (folder.has_children) {
+            toggleFolder(node, folder, level);
         }
+    });
+    
+    return node;
+}
+
+async function toggleFolder(node, folder, level) {
+    const children = node.querySelector('.folder-children');
+    const toggle = node.querySelector('.folder-toggle');
+    
+    if (children.style.display === 'none') {
+        children.style.display = 'block';
+        toggle.textContent = '▾';
         
-        return html;
-    }).join('');
+        // Children are fetched on first expansion only
+        if (!children.dataset.loaded) {
+            children.dataset.loaded = 'true';
+            children.innerHTML = `<div class="folder-item" style="padding-left: ${(level + 1) * 20}px">Loading...</div>`;
+            await loadFolderLevel(children, folder.id, level + 1);
+        }
+    } else {
+        children.style.display = 'none';
+        toggle.textContent = '▸';
+    }
 }
 
-function selectFolder(path) {
+function selectFolder(item, path) {
     document.querySelectorAll('.folder-item').forEach(item => {
         item.classList.remove('selected');
     });
-    event.target.classList.add('selected');
+    item.classList.add('selected');
     
     // Load folder contents
     loadFolderContents(path);
@@ -387,7 +441,9 @@ async function loadDuplicates() {
         const list = document.getElementById('duplicates-list');
         list.innerHTML = data.duplicates.map((group, index) => `
             <div class="duplicate-group">
-                <h4>Duplicate Group ${index + 1} (${group.files.length} files)</h4>
+                <h4>${group.suggested
+                    ? `Possible Duplicate ${index + 1} (${Math.round(group.confidence * 100)}% match, not skipped)`
+                    : `Duplicate Group ${index + 1} (${group.files.length} files)`}</h4>
                 ${group.files.map((file, idx) => `
                     <div class="duplicate-file ${idx === 0 ? 'best' : ''}">
                         ${idx === 0 ? '✓ Best Quality: ' : ''}
@@ -552,6 +608,54 @@ async function loadGenres() {
     }
 }
 
+// Show how many of the current matches fall in each genre
+function updateFacetCounts(facets) {
+    const counts = {};
+    facets.genre.forEach(genre => counts[genre.value.toLowerCase()] = genre.count);
+    
+    document.querySelectorAll('#filter-genre option').forEach(option => {
+        if (option.value) {
+            option.textContent = `${option.value} (${counts[option.value.toLowerCase()] || 0})`;
+        }
+    });
+}
+
+// Typeahead suggestions for filter inputs
+function setupAutocomplete(inputId, field) {
+    const input = document.getElementById(inputId);
+    const list = document.createElement('datalist');
+    list.id = `${inputId}-suggestions`;
+    input.setAttribute('list', list.id);
+    input.setAttribute('autocomplete', 'off');
+    input.after(list);
+    
+    let timer = null;
+    let controller = null;
+    
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(async () => {
+            // Only the latest keystroke's request matters
+            if (controller) controller.abort();
+            controller = new AbortController();
+            
+            try {
+                const params = new URLSearchParams({ field, q: input.value, limit: 10 });
+                const response = await fetch(`/api/library/autocomplete?${params}`, { signal: controller.signal });
+                const data = await response.json();
+                
+                list.innerHTML = data.suggestions.map(suggestion =>
+                    `<option value="${suggestion.value}">${suggestion.track_count} tracks</option>`
+                ).join('');
+            } catch (error) {
+                if (error.name !== 'AbortError') {
+                    console.error('Error loading suggestions:', error);
+                }
+            }
+        }, 150);
+    });
+}
+
 // File details modal
 async function showFileDetails(fileId) {
     // This would fetch and display detailed file information
@@ -563,6 +667,9 @@ async function showFileDetails(fileId) {
     
     if (file) {
         details.innerHTML = `
+            ${file.metadata && file.metadata.art_hash ? `
+                <img class="detail-art" src="/api/library/art/${file.metadata.art_hash}" alt="Cover art">
+            ` : ''}
             <div class="detail-row">
                 <div class="detail-label">Source Path:</div>
                 <div class="detail-value">${file.source_path}</div>
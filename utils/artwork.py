@@ -0,0 +1,139 @@
+"""Embedded cover art extraction and a content-addressed thumbnail store"""
+import base64
+import hashlib
+import io
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional
+import logging
+
+from mutagen.flac import FLAC, Picture
+from mutagen.id3 import ID3
+from mutagen.mp4 import MP4
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ART_HASH_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+
+# ID3/FLAC picture type for the front cover
+FRONT_COVER = 3
+
+def extract_embedded_art(audio_file) -> Optional[bytes]:
+    """
+    Get the raw bytes of the best embedded picture of a parsed file
+    
+    Handles ID3 APIC frames, FLAC PICTURE blocks, MP4 covr atoms and
+    Vorbis METADATA_BLOCK_PICTURE comments, preferring the front cover.
+    
+    Args:
+        audio_file: Loaded mutagen file
+    
+    Returns:
+        Image bytes, or None if the file has no artwork
+    """
+    pictures = []
+    
+    try:
+        tags = audio_file.tags
+        
+        if isinstance(tags, ID3):
+            pictures = [(frame.type, frame.data) for frame in tags.getall('APIC')]
+        
+        elif isinstance(audio_file, FLAC):
+            pictures = [(picture.type, picture.data) for picture in audio_file.pictures]
+        
+        elif isinstance(audio_file, MP4):
+            # covr has no picture type, the first image is the cover
+            pictures = [(FRONT_COVER, bytes(cover)) for cover in (tags or {}).get('covr', [])]
+        
+        elif tags is not None and 'metadata_block_picture' in tags:
+            for encoded in tags['metadata_block_picture']:
+                picture = Picture(base64.b64decode(encoded))
+                pictures.append((picture.type, picture.data))
+    
+    except Exception as e:
+        logger.debug(f"Error reading embedded art: {e}")
+        return None
+    
+    pictures = [(picture_type, data) for picture_type, data in pictures if data]
+    if not pictures:
+        return None
+    
+    front = [data for picture_type, data in pictures if picture_type == FRONT_COVER]
+    return front[0] if front else pictures[0][1]
+
+class ArtworkStore:
+    """
+    Thumbnails stored once per distinct image, named by the image's SHA-1
+    
+    One album's cover is embedded in every track, so hashing the raw bytes
+    first means each cover is decoded and resized only once. Writes go
+    through a temporary file and a rename, so parallel extractors can race
+    on the same hash safely.
+    """
+    
+    def __init__(self, base_path: str, size: int = 300, quality: int = 85):
+        self.base_path = Path(base_path)
+        self.size = size
+        self.quality = quality
+    
+    def path_for(self, art_hash: str) -> Optional[Path]:
+        """
+        Location of a stored thumbnail
+        
+        Args:
+            art_hash: Hash returned by store
+        
+        Returns:
+            Thumbnail path, or None if the hash is malformed
+        """
+        if not ART_HASH_PATTERN.match(art_hash):
+            return None
+        return self.base_path / art_hash[:2] / f"{art_hash}.jpg"
+    
+    def store(self, data: bytes) -> Optional[str]:
+        """
+        Store a thumbnail of an image unless it is already present
+        
+        Args:
+            data: Raw embedded image bytes
+        
+        Returns:
+            Content hash of the image, or None if it could not be decoded
+        """
+        if not PIL_AVAILABLE:
+            return None
+        
+        art_hash = hashlib.sha1(data).hexdigest()
+        path = self.path_for(art_hash)
+        
+        if path.exists():
+            return art_hash
+        
+        temp_path = None
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.thumbnail((self.size, self.size))
+                thumbnail = image.convert('RGB')
+            
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                thumbnail.save(f, format='JPEG', quality=self.quality)
+            os.replace(temp_path, path)
+        
+        except Exception as e:
+            logger.debug(f"Error storing artwork {art_hash}: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            return None
+        
+        return art_hash
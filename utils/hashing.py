@@ -1,12 +1,17 @@
 """File hashing utilities for duplicate detection"""
 import hashlib
+from contextlib import nullcontext
 from pathlib import Path
 from typing import Optional
 import logging
+from mutagen import File as MutagenFile
+from mutagen.flac import FLAC
+from mutagen.mp3 import MP3
+from mutagen.mp3._util import XingHeader, XingHeaderError
 
 logger = logging.getLogger(__name__)
 
-def calculate_file_hash(file_path: Path, chunk_size_mb: int = 1) -> Optional[str]:
+def calculate_file_hash(file_path: Path, chunk_size_mb: int = 1) -> Optional[bytes]:
     """
     Calculate MD5 hash of first N MB of file for quick duplicate detection
     
@@ -15,25 +20,38 @@ def calculate_file_hash(file_path: Path, chunk_size_mb: int = 1) -> Optional[str
         chunk_size_mb: Size in MB to read for hashing (default 1MB)
     
     Returns:
-        MD5 hash string or None if error
+        16-byte MD5 digest or None if error
     """
     try:
         chunk_size = chunk_size_mb * 1024 * 1024  # Convert to bytes
-        hasher = hashlib.md5()
         
         with open(file_path, 'rb') as f:
             # Read only first chunk for performance
             chunk = f.read(chunk_size)
-            if chunk:
-                hasher.update(chunk)
-                # Add file size to hash for better uniqueness
-                hasher.update(str(file_path.stat().st_size).encode())
         
-        return hasher.hexdigest()
+        return calculate_head_hash(chunk, file_path.stat().st_size)
     except Exception as e:
         logger.error(f"Error hashing file {file_path}: {e}")
         return None
 
+def calculate_head_hash(head: bytes, file_size: int) -> bytes:
+    """
+    Hash an already-read file head the same way as calculate_file_hash
+    
+    Args:
+        head: First chunk of the file
+        file_size: Total file size in bytes
+    
+    Returns:
+        16-byte MD5 digest
+    """
+    hasher = hashlib.md5()
+    if head:
+        hasher.update(head)
+        # Add file size to hash for better uniqueness
+        hasher.update(str(file_size).encode())
+    return hasher.digest()
+
 def calculate_full_file_hash(file_path: Path) -> Optional[str]:
     """
     Calculate MD5 hash of entire file (slower but more accurate)
@@ -77,4 +95,77 @@ def verify_file_copy(source: Path, target: Path) -> bool:
         return False
     except Exception as e:
         logger.error(f"Error verifying file copy: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def get_native_checksum(file_path: Path, audio_file=None, fileobj=None) -> Optional[str]:
+    """
+    Read the integrity signature a format already carries in its headers
+
+    FLAC stores an MD5 of the decoded PCM in STREAMINFO and LAME writes a
+    CRC16 of the music data (plus its length) into the Info/Xing frame.
+    Neither needs the audio to be decoded. The FLAC MD5 makes a near-free
+    dedup key: two FLACs with the same PCM match even at different
+    compression levels. The 16-bit LAME CRC is too small to key duplicates
+    on and is only used to verify a copy against its source.
+
+    Args:
+        file_path: Path to audio file
+        audio_file: Already loaded mutagen file to avoid parsing it again
+        fileobj: Open file object to read the LAME header from instead of reopening
+
+    Returns:
+        Prefixed signature ('flac:<md5>' or 'lame:<crc>:<length>') or None
+    """
+    try:
+        if audio_file is None:
+            audio_file = MutagenFile(str(file_path))
+        
+        if isinstance(audio_file, FLAC):
+            # An all-zero MD5 means the encoder did not compute one
+            if audio_file.info.md5_signature:
+                return f"flac:{audio_file.info.md5_signature:032x}"
+        
+        elif isinstance(audio_file, MP3):
+            info = audio_file.info
+            if info.layer != 3:
+                return None
+            
+            # mutagen parses the LAME tag but does not keep it, re-read the first frame
+            with nullcontext(fileobj) if fileobj is not None else open(file_path, 'rb') as f:
+                f.seek(info.frame_offset + XingHeader.get_offset(info))
+                try:
+                    lame = XingHeader(f).lame_header
+                except XingHeaderError:
+                    return None
+            
+            if lame is not None and lame.music_length > 0:
+                return f"lame:{lame.music_crc:04x}:{lame.music_length}"
+    
+    except Exception as e:
+        logger.debug(f"Error reading native checksum from {file_path}: {e}")
+    
+    return None
+
+def verify_native_checksum(source: Path, target: Path, expected: str) -> bool:
+    """
+    Cheap copy verification using the format-native signature
+    
+    Only the target's headers are parsed, so the HDD source is not read again.
+    This catches truncated or mismatched copies but not bit flips inside the
+    audio data; use verify_file_copy when that matters.
+    
+    Args:
+        source: Source file path
+        target: Target file path
+        expected: Signature recorded for the source during metadata extraction
+    
+    Returns:
+        True if sizes and signatures match, False otherwise
+    """
+    try:
+        if source.stat().st_size != target.stat().st_size:
+            return False
+        return get_native_checksum(target) == expected
+    except Exception as e:
+        logger.error(f"Error verifying native checksum: {e}")
+        return False
@@ -1,4 +1,5 @@
 """I/O optimization utilities for HDD operations"""
+import io
 import os
 from pathlib import Path
 from typing import List, Generator, Tuple
@@ -114,4 +115,110 @@ def optimize_path_for_windows(path: str) -> str:
         ext = Path(path).suffix
         path = path[:250 - len(ext)] + ext
     
-    return path
\ No newline at end of file
+    return path
+
+def read_head_and_tail(file_path: Path, head_size: int, tail_size: int) -> Tuple[bytes, bytes, int]:
+    """
+    Read the start and end of a file with one open and at most two reads
+    
+    Args:
+        file_path: Path to file
+        head_size: Bytes to read from the start
+        tail_size: Bytes to read from the end (ID3v1, APEv2, trailing MP4 atoms)
+    
+    Returns:
+        Tuple of (head, tail, file_size); tail is empty when the head covers the file
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        head = f.read(head_size)
+        tail = b''
+        
+        if size > len(head):
+            f.seek(max(len(head), size - tail_size))
+            tail = f.read()
+    
+    return head, tail, size
+
+class HeadTailFile(io.RawIOBase):
+    """
+    Read-only file object over an already-read head and tail buffer
+    
+    Lets parsers such as mutagen work on the bytes the indexer read for
+    hashing instead of reopening the file. Reads that fall outside both
+    buffers (e.g. artwork larger than the head) go to disk, so parsing is
+    always correct; disk_reads counts how often that happened.
+    """
+    
+    # Gaps are read in blocks of at least this size, parsers read in small steps
+    READ_AHEAD = 256 * 1024
+    
+    def __init__(self, file_path: Path, head: bytes, tail: bytes, size: int):
+        super().__init__()
+        self.name = str(file_path)
+        self.head = head
+        self.tail = tail
+        self.size = size
+        self.tail_start = size - len(tail)
+        self.disk_reads = 0
+        self._position = 0
+        self._file = None
+        self._window = b''
+        self._window_start = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._position = offset
+        return offset
+    
+    def readinto(self, buffer) -> int:
+        start = self._position
+        length = max(0, min(len(buffer), self.size - start))
+        end = start + length
+        
+        if end <= len(self.head):
+            data = self.head[start:end]
+        elif start >= self.tail_start:
+            data = self.tail[start - self.tail_start:end - self.tail_start]
+        else:
+            data = self._read_from_disk(start, length)
+        
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+    
+    def _read_from_disk(self, start: int, length: int) -> bytes:
+        """Serve a range the buffers do not cover"""
+        offset = start - self._window_start
+        if 0 <= offset and offset + length <= len(self._window):
+            return self._window[offset:offset + length]
+        
+        if self._file is None:
+            self._file = open(self.name, 'rb')
+        
+        self.disk_reads += 1
+        self._file.seek(start)
+        self._window = self._file.read(max(length, self.READ_AHEAD))
+        self._window_start = start
+        return self._window[:length]
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        super().close()
@@ -0,0 +1,187 @@
+"""HTTP client for metadata web services with rate limiting, coalescing and a disk cache"""
+import json
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """
+    Spaces requests so that at most `rate` start per second
+    
+    Callers reserve the next free slot under a lock and sleep outside it, so
+    several threads can have requests in flight while the start times stay
+    at the service's limit.
+    """
+    
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until this caller may start a request"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        
+        if slot > now:
+            time.sleep(slot - now)
+
+class ResponseCache:
+    """Sidecar SQLite store of JSON responses that expire after a TTL"""
+    
+    def __init__(self, path: str, ttl_seconds: float):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the cache file on first use"""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, fetched_at REAL, body TEXT)'
+            )
+            self._conn.commit()
+        return self._conn
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached response for a key, or None if missing or expired"""
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT fetched_at, body FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+        
+        if row is None or time.time() - row[0] > self.ttl_seconds:
+            return None
+        return json.loads(row[1])
+    
+    def put(self, key: str, body: Dict[str, Any]):
+        """Store a response"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?)',
+                (key, time.time(), json.dumps(body))
+            )
+            conn.commit()
+    
+    def purge_expired(self) -> int:
+        """Delete expired entries and return how many were removed"""
+        with self._lock:
+            conn = self._connect()
+            removed = conn.execute(
+                'DELETE FROM responses WHERE fetched_at < ?', (time.time() - self.ttl_seconds,)
+            ).rowcount
+            conn.commit()
+        return removed
+
+class LookupClient:
+    """
+    JSON GET client for one web service
+    
+    Identical requests are answered from the disk cache, or joined onto a
+    request that is already in flight, before a rate-limited HTTP call is
+    made. 503 and 429 responses (the services' "slow down" replies) are
+    retried with backoff.
+    """
+    
+    def __init__(self, base_url: str, user_agent: str, rate: float, cache: Optional[ResponseCache] = None,
+                 timeout: float = 10.0, max_retries: int = 3):
+        self.base_url = base_url.rstrip('/')
+        self.user_agent = user_agent
+        self.rate_limiter = RateLimiter(rate)
+        self.cache = cache
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.stats = {'requests': 0, 'cache_hits': 0, 'coalesced': 0, 'retries': 0}
+        self._inflight = {}
+        self._lock = threading.Lock()
+    
+    def get_json(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        GET a JSON document
+        
+        Args:
+            path: Path below the base URL
+            params: Query parameters
+        
+        Returns:
+            Decoded response body
+        
+        Raises:
+            urllib.error.URLError: If the request still fails after retries
+        """
+        query = urllib.parse.urlencode(sorted(params.items()))
+        key = f"{path}?{query}"
+        
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                with self._lock:
+                    self.stats['cache_hits'] += 1
+                return cached
+        
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.stats['coalesced'] += 1
+        
+        if not owner:
+            return future.result()
+        
+        try:
+            # The previous owner of this key may have finished in the meantime
+            body = self.cache.get(key) if self.cache else None
+            if body is None:
+                body = self._fetch(f"{self.base_url}{path}?{query}")
+                if self.cache:
+                    self.cache.put(key, body)
+            future.set_result(body)
+            return body
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+    
+    def _fetch(self, url: str) -> Dict[str, Any]:
+        """Rate-limited GET with retries on 503/429"""
+        request = urllib.request.Request(url, headers={
+            'User-Agent': self.user_agent,
+            'Accept': 'application/json'
+        })
+        
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            with self._lock:
+                self.stats['requests'] += 1
+            
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    return json.loads(response.read().decode('utf-8'))
+            
+            except urllib.error.HTTPError as e:
+                if e.code not in (429, 503) or attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self.stats['retries'] += 1
+                time.sleep(max(self.rate_limiter.interval, 0.1) * 2 ** attempt)
@@ -0,0 +1,79 @@
+"""Text normalization utilities for matching and searching tag values"""
+import re
+import unicodedata
+from typing import Any, Dict, Optional
+
+_NON_WORD = re.compile(r'[\W_]+', re.UNICODE)
+_LEADING_THE = re.compile(r'^the\s+')
+
+# Tag columns that have a normalized, indexed search key column
+SEARCH_KEY_COLUMNS = {
+    'artist': 'artist_key',
+    'album': 'album_key',
+    'genre': 'genre_key'
+}
+
+def fold_text(value: Optional[str]) -> str:
+    """
+    Fold text for case and accent insensitive comparison
+    
+    Applies NFKC, removes diacritics and casefolds, so 'Beyoncé', 'BEYONCE'
+    and 'beyonce' all compare equal.
+    
+    Args:
+        value: Raw tag value
+    
+    Returns:
+        Folded string ('' for None)
+    """
+    if not value:
+        return ''
+    
+    decomposed = unicodedata.normalize('NFKD', unicodedata.normalize('NFKC', value))
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return stripped.casefold()
+
+def normalize_name(value: Optional[str]) -> str:
+    """
+    Normalize an artist, album or title into a comparison key
+    
+    Folds case and accents, turns punctuation into single spaces and drops
+    a leading 'The ' so 'The Beatles' and 'Beatles' share a key.
+    
+    Args:
+        value: Raw tag value
+    
+    Returns:
+        Normalized key ('' for None)
+    """
+    folded = _NON_WORD.sub(' ', fold_text(value)).strip()
+    return _LEADING_THE.sub('', folded)
+
+def add_search_keys(values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Add normalized search keys for the tag fields present in a row mapping
+    
+    Args:
+        values: Column values about to be written to the metadata table
+    
+    Returns:
+        The same mapping with artist_key/album_key/genre_key set alongside their fields
+    """
+    for field, key_column in SEARCH_KEY_COLUMNS.items():
+        if field in values:
+            values[key_column] = normalize_name(values[field]) or None
+    return values
+
+def prefix_upper_bound(prefix: str) -> str:
+    """
+    Smallest string greater than every string starting with prefix
+    
+    Lets a prefix match run as an index range: key >= prefix AND key < bound.
+    
+    Args:
+        prefix: Non-empty normalized prefix
+    
+    Returns:
+        Exclusive upper bound for the range
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
@@ -0,0 +1,43 @@
+"""Opaque cursor helpers for keyset pagination"""
+import base64
+import json
+from typing import Any, List, Optional
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    Encode the sort key of the last row on a page into an opaque token
+    
+    Args:
+        values: Sort column values followed by the unique tiebreaker
+    
+    Returns:
+        URL-safe token to pass back as the next page cursor
+    """
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token: Optional[str]) -> Optional[List[Any]]:
+    """
+    Decode a cursor produced by encode_cursor
+    
+    Args:
+        token: Cursor token from a previous response, or None for the first page
+    
+    Returns:
+        List of sort key values, or None for the first page
+    
+    Raises:
+        ValueError: If the token is malformed
+    """
+    if not token:
+        return None
+    
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
@@ -0,0 +1,149 @@
+"""Persistent cache of parsed tags keyed by file identity"""
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when the extracted fields change so stale entries are dropped
+CACHE_VERSION = 2
+
+FileKey = Tuple[int, int, int, int]
+
+def file_key(file_path) -> Optional[FileKey]:
+    """
+    Identity of a file's current contents: (st_dev, st_ino, size, mtime_ns)
+    
+    Survives database resets and renames within a volume, and changes as
+    soon as the file is rewritten.
+    
+    Args:
+        file_path: Path to file
+    
+    Returns:
+        Key tuple, or None if the file cannot be stat'ed
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+class TagCache:
+    """
+    Sidecar SQLite store of extracted tag dicts
+    
+    Lives outside the library database so reset_database and re-scans do
+    not throw it away. Writes are buffered and committed in batches.
+    """
+    
+    def __init__(self, path: str, flush_size: int = 500):
+        self.path = Path(path)
+        self.flush_size = flush_size
+        self.hits = 0
+        self.misses = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._conn = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the cache file on first use"""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            
+            if self._conn.execute('PRAGMA user_version').fetchone()[0] != CACHE_VERSION:
+                self._conn.execute('DROP TABLE IF EXISTS tags')
+                self._conn.execute(f'PRAGMA user_version={CACHE_VERSION}')
+            
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS tags ('
+                'dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, data TEXT, '
+                'PRIMARY KEY (dev, ino, size, mtime_ns)) WITHOUT ROWID'
+            )
+            self._conn.commit()
+        return self._conn
+    
+    def get_many(self, keys: List[FileKey]) -> Dict[FileKey, Dict[str, Any]]:
+        """
+        Look up many files at once
+        
+        Args:
+            keys: File keys from file_key
+        
+        Returns:
+            Dictionary of key to cached tag dict for the keys that were found
+        """
+        found = {}
+        
+        with self._lock:
+            conn = self._connect()
+            unique = list(set(keys))
+            
+            # Row-value IN keeps it to one indexed query per chunk
+            for start in range(0, len(unique), 200):
+                chunk = unique[start:start + 200]
+                placeholders = ','.join(['(?,?,?,?)'] * len(chunk))
+                params = [value for key in chunk for value in key]
+                
+                for dev, ino, size, mtime_ns, data in conn.execute(
+                    f'SELECT dev, ino, size, mtime_ns, data FROM tags '
+                    f'WHERE (dev, ino, size, mtime_ns) IN (VALUES {placeholders})',
+                    params
+                ):
+                    found[(dev, ino, size, mtime_ns)] = json.loads(data)
+        
+        self.hits += len(found)
+        self.misses += len(unique) - len(found)
+        return found
+    
+    def get(self, key: FileKey) -> Optional[Dict[str, Any]]:
+        """Look up a single file"""
+        return self.get_many([key]).get(key)
+    
+    def put(self, key: FileKey, metadata: Dict[str, Any]):
+        """Queue a tag dict for storage, committing once flush_size entries are pending"""
+        with self._lock:
+            self._pending.append((*key, json.dumps(metadata)))
+            if len(self._pending) >= self.flush_size:
+                self._flush_locked()
+    
+    def flush(self):
+        """Commit pending entries"""
+        with self._lock:
+            self._flush_locked()
+    
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        
+        try:
+            conn = self._connect()
+            conn.executemany('INSERT OR REPLACE INTO tags VALUES (?, ?, ?, ?, ?)', self._pending)
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error writing tag cache: {e}")
+        
+        self._pending = []
+    
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._pending = []
+            conn = self._connect()
+            conn.execute('DELETE FROM tags')
+            conn.commit()
+    
+    def close(self):
+        """Flush and close the cache file"""
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None